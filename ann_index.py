@@ -0,0 +1,375 @@
+"""近似最近邻索引模块
+
+IVFIndex: 倒排文件索引。用KMeans把段落向量划分为 nlist 个簇（粗量化器），
+查询时只在与查询最相近的 nprobe 个簇内做精确内积计算。
+ProductQuantizer: 乘积量化编码。把向量切成 m 个子空间，每个子空间用256个中心编码为1字节，
+查询时通过查找表做非对称距离计算（ADC），再用全精度向量精排少量候选。
+measure_recall: 以暴力检索为基准评估召回率与耗时，用于选择 nprobe。
+"""
+
+import os
+import time
+from typing import List, Tuple, Dict, Any
+
+import numpy as np
+from sklearn.cluster import KMeans
+
+from dense_index import DenseIndex, l2_normalize, save_npy
+
+
+def default_nlist(num_vectors: int) -> int:
+    """经验簇数：约 4 * sqrt(n)"""
+    return max(1, int(4 * np.sqrt(num_vectors)))
+
+
+class IVFIndex:
+    def __init__(self, nlist: int, nprobe: int = 8, train_sample: int = 100000, random_state: int = 42):
+        """
+        初始化IVF索引
+
+        Args:
+            nlist: 簇数量
+            nprobe: 查询时默认探测的簇数量
+            train_sample: 训练KMeans时最多使用的向量数
+            random_state: 随机种子
+        """
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_sample = train_sample
+        self.random_state = random_state
+        self.centroids = None     # (nlist, dim) 归一化簇中心
+        self.list_ids = None      # 按簇排列的段落编号
+        self.list_offsets = None  # (nlist + 1,) 每个簇在 list_ids 中的起止位置
+
+    def assign(self, embeddings: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        """按内积把向量分配到最近的簇"""
+        assignments = np.empty(embeddings.shape[0], dtype=np.int32)
+        for start in range(0, embeddings.shape[0], batch_size):
+            block = np.asarray(embeddings[start:start + batch_size], dtype=np.float32)
+            assignments[start:start + batch_size] = np.argmax(block @ self.centroids.T, axis=1)
+        return assignments
+
+    def train(self, embeddings: np.ndarray) -> "IVFIndex":
+        """
+        训练粗量化器并建立倒排表
+
+        Args:
+            embeddings: (n, dim) 的归一化段落向量
+
+        Returns:
+            索引自身
+        """
+        num_vectors = embeddings.shape[0]
+        self.nlist = max(1, min(self.nlist, num_vectors))
+
+        rng = np.random.default_rng(self.random_state)
+        if num_vectors > self.train_sample:
+            sample = np.sort(rng.choice(num_vectors, self.train_sample, replace=False))
+            training = np.asarray(embeddings[sample], dtype=np.float32)
+        else:
+            training = np.asarray(embeddings, dtype=np.float32)
+
+        kmeans = KMeans(n_clusters=self.nlist, n_init=1, max_iter=25, random_state=self.random_state)
+        kmeans.fit(training)
+        self.centroids = np.ascontiguousarray(l2_normalize(kmeans.cluster_centers_.astype(np.float32)))
+
+        self._build_lists(self.assign(embeddings))
+        return self
+
+    def _build_lists(self, assignments: np.ndarray):
+        """按簇编号重排段落编号，簇编号为-1的段落（已删除）不进入倒排表"""
+        ids = np.flatnonzero(assignments >= 0)
+        kept = assignments[ids]
+        self.list_ids = ids[np.argsort(kept, kind='stable')].astype(np.int64)
+        self.list_offsets = np.zeros(self.nlist + 1, dtype=np.int64)
+        self.list_offsets[1:] = np.cumsum(np.bincount(kept, minlength=self.nlist))
+
+    def assignments(self, num_vectors: int) -> np.ndarray:
+        """从倒排表还原每个段落的簇编号（不在表中的记为-1）"""
+        assignments = np.full(num_vectors, -1, dtype=np.int32)
+        for c in range(self.nlist):
+            assignments[self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]]] = c
+        return assignments
+
+    def update(self, new_embeddings: np.ndarray, first_id: int, removed_ids: np.ndarray) -> "IVFIndex":
+        """
+        增量更新：新向量分配到已有簇，删除的段落移出倒排表，不重新训练
+
+        Args:
+            new_embeddings: 追加的向量，编号从 first_id 开始
+            first_id: 第一个新向量的段落编号
+            removed_ids: 被删除的段落编号
+
+        Returns:
+            索引自身
+        """
+        assignments = self.assignments(first_id + new_embeddings.shape[0])
+        if new_embeddings.shape[0]:
+            assignments[first_id:] = self.assign(new_embeddings)
+        assignments[np.asarray(removed_ids, dtype=np.int64)] = -1
+        self._build_lists(assignments)
+        return self
+
+    def candidates(self, query_vector: np.ndarray, nprobe: int = None) -> np.ndarray:
+        """返回查询在最近 nprobe 个簇中的全部候选段落编号"""
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        centroid_scores = self.centroids @ query_vector
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        return np.concatenate([
+            self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes
+        ])
+
+    def search(self, embeddings: np.ndarray, query_vectors: np.ndarray, top_k: int = 10,
+               nprobe: int = None) -> List[List[Tuple[int, float]]]:
+        """
+        近似检索
+
+        Args:
+            embeddings: 建索引时使用的段落向量（可为内存映射）
+            query_vectors: (dim,) 或 (n_queries, dim) 的归一化查询向量
+            top_k: 每个查询返回的结果数量
+            nprobe: 探测簇数，默认使用 self.nprobe
+
+        Returns:
+            每个查询一个 (段落编号, 相似度) 列表，按相似度降序
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        results = []
+        for query in queries:
+            ids = np.sort(self.candidates(query, nprobe))
+            if len(ids) == 0:
+                results.append([])
+                continue
+            scores = embeddings[ids] @ query
+            k = min(top_k, len(ids))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top], kind='stable')]
+            results.append([(int(ids[i]), float(scores[i])) for i in top])
+        return results
+
+    def save(self, directory: str):
+        """保存为 ivf_centroids.npy / ivf_ids.npy / ivf_offsets.npy"""
+        save_npy(os.path.join(directory, 'ivf_centroids.npy'), self.centroids)
+        save_npy(os.path.join(directory, 'ivf_ids.npy'), self.list_ids)
+        save_npy(os.path.join(directory, 'ivf_offsets.npy'), self.list_offsets)
+
+    @classmethod
+    def load(cls, directory: str, nprobe: int = 8, mmap_mode: str = "r") -> "IVFIndex":
+        """以内存映射方式加载已保存的IVF索引"""
+        centroids = np.load(os.path.join(directory, 'ivf_centroids.npy'), mmap_mode=mmap_mode)
+        index = cls(nlist=centroids.shape[0], nprobe=nprobe)
+        index.centroids = centroids
+        index.list_ids = np.load(os.path.join(directory, 'ivf_ids.npy'), mmap_mode=mmap_mode)
+        index.list_offsets = np.load(os.path.join(directory, 'ivf_offsets.npy'), mmap_mode=mmap_mode)
+        return index
+
+
+class ProductQuantizer:
+    def __init__(self, m: int = 32, ksub: int = 256, train_sample: int = 100000, random_state: int = 42):
+        """
+        初始化乘积量化编码器
+
+        Args:
+            m: 子空间数量，即每个向量编码后的字节数
+            ksub: 每个子空间的中心数量（不超过256，编码为uint8）
+            train_sample: 训练时最多使用的向量数
+            random_state: 随机种子
+        """
+        self.m = m
+        self.ksub = min(ksub, 256)
+        self.train_sample = train_sample
+        self.random_state = random_state
+        self.dim = 0
+        self.sub_dim = 0
+        self.codebooks = None  # (m, ksub, sub_dim)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        """补零到 m * sub_dim 维后切分为 (n, m, sub_dim)，补零不改变内积"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        padded = np.zeros((vectors.shape[0], self.m * self.sub_dim), dtype=np.float32)
+        padded[:, :vectors.shape[1]] = vectors
+        return padded.reshape(vectors.shape[0], self.m, self.sub_dim)
+
+    def train(self, embeddings: np.ndarray) -> "ProductQuantizer":
+        """
+        在每个子空间上训练KMeans码本
+
+        Args:
+            embeddings: (n, dim) 的段落向量
+
+        Returns:
+            编码器自身
+        """
+        num_vectors, self.dim = embeddings.shape
+        self.sub_dim = -(-self.dim // self.m)
+
+        rng = np.random.default_rng(self.random_state)
+        if num_vectors > self.train_sample:
+            sample = np.sort(rng.choice(num_vectors, self.train_sample, replace=False))
+            training = self._split(embeddings[sample])
+        else:
+            training = self._split(embeddings)
+
+        ksub = min(self.ksub, training.shape[0])
+        self.codebooks = np.zeros((self.m, ksub, self.sub_dim), dtype=np.float32)
+        for j in range(self.m):
+            kmeans = KMeans(n_clusters=ksub, n_init=1, max_iter=25, random_state=self.random_state)
+            kmeans.fit(training[:, j, :])
+            self.codebooks[j] = kmeans.cluster_centers_
+        return self
+
+    def encode(self, embeddings: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+        """
+        把向量编码为 (n, m) 的uint8码字
+
+        Args:
+            embeddings: (n, dim) 的向量
+            batch_size: 每批处理的向量数
+
+        Returns:
+            uint8码字矩阵
+        """
+        codes = np.empty((embeddings.shape[0], self.m), dtype=np.uint8)
+        squared_norms = (self.codebooks ** 2).sum(axis=2)  # (m, ksub)
+        for start in range(0, embeddings.shape[0], batch_size):
+            sub_vectors = self._split(embeddings[start:start + batch_size])
+            for j in range(self.m):
+                # 最近中心：argmin ||x - c||^2 = argmin (||c||^2 - 2 x·c)
+                distances = squared_norms[j] - 2 * sub_vectors[:, j, :] @ self.codebooks[j].T
+                codes[start:start + batch_size, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def lookup_tables(self, query_vector: np.ndarray) -> np.ndarray:
+        """计算查询各子向量与全部中心的内积，得到 (m, ksub) 查找表"""
+        sub_query = self._split(query_vector)[0]
+        return np.einsum('jd,jkd->jk', sub_query, self.codebooks)
+
+    def adc_scores(self, codes: np.ndarray, query_vector: np.ndarray) -> np.ndarray:
+        """
+        非对称距离计算：按码字查表累加，得到近似内积
+
+        Args:
+            codes: (n, m) uint8码字（可为内存映射或候选子集）
+            query_vector: (dim,) 查询向量
+
+        Returns:
+            (n,) 近似内积分数
+        """
+        tables = self.lookup_tables(query_vector)
+        scores = np.zeros(codes.shape[0], dtype=np.float32)
+        for j in range(self.m):
+            scores += tables[j][codes[:, j]]
+        return scores
+
+    def search(self, codes: np.ndarray, embeddings: np.ndarray, query_vectors: np.ndarray, top_k: int = 10,
+               rerank_k: int = 100, candidate_ids: List[np.ndarray] = None,
+               excluded_ids: np.ndarray = None) -> List[List[Tuple[int, float]]]:
+        """
+        先用ADC选出 rerank_k 个候选，再用全精度向量精排
+
+        Args:
+            codes: 全部段落的码字
+            embeddings: 全精度段落向量（通常为内存映射存储，只会读取候选行）
+            query_vectors: (dim,) 或 (n_queries, dim) 的查询向量
+            top_k: 每个查询返回的结果数量
+            rerank_k: 参与精排的候选数量，0表示直接返回ADC分数
+            candidate_ids: 每个查询的候选段落编号（如IVF的探测结果），None表示全部段落
+            excluded_ids: 不参与检索的段落编号（已删除），仅在 candidate_ids 为None时使用
+
+        Returns:
+            每个查询一个 (段落编号, 相似度) 列表，按相似度降序
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        results = []
+        for qi, query in enumerate(queries):
+            ids = None if candidate_ids is None else np.sort(candidate_ids[qi])
+            approx = self.adc_scores(codes if ids is None else codes[ids], query)
+            if ids is None and excluded_ids is not None and len(excluded_ids):
+                approx[excluded_ids] = -np.inf
+            if len(approx) == 0:
+                results.append([])
+                continue
+
+            k = min(max(top_k, rerank_k), len(approx))
+            top = np.argpartition(-approx, k - 1)[:k]
+            top = top[np.isfinite(approx[top])]
+            if len(top) == 0:
+                results.append([])
+                continue
+            top_ids = top if ids is None else ids[top]
+            if rerank_k > 0:
+                top_ids = np.sort(top_ids)
+                scores = np.asarray(embeddings[top_ids] @ query, dtype=np.float32)
+            else:
+                scores = approx[top]
+
+            k = min(top_k, len(top_ids))
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best], kind='stable')]
+            results.append([(int(top_ids[i]), float(scores[i])) for i in best])
+        return results
+
+    def memory_bytes(self, num_vectors: int) -> int:
+        """编码 num_vectors 个向量所需的内存（码字 + 码本）"""
+        return num_vectors * self.m + self.codebooks.nbytes
+
+    def save(self, directory: str, codes: np.ndarray):
+        """保存为 pq_codebooks.npy / pq_codes.npy"""
+        save_npy(os.path.join(directory, 'pq_codebooks.npy'), self.codebooks)
+        save_npy(os.path.join(directory, 'pq_codes.npy'), codes)
+
+    @classmethod
+    def load(cls, directory: str, dim: int, mmap_mode: str = "r"):
+        """
+        加载码本和码字（码字以内存映射方式打开）
+
+        Returns:
+            (ProductQuantizer, 码字矩阵)
+        """
+        codebooks = np.load(os.path.join(directory, 'pq_codebooks.npy'))
+        pq = cls(m=codebooks.shape[0], ksub=codebooks.shape[1])
+        pq.codebooks = codebooks
+        pq.dim = dim
+        pq.sub_dim = codebooks.shape[2]
+        codes = np.load(os.path.join(directory, 'pq_codes.npy'), mmap_mode=mmap_mode)
+        return pq, codes
+
+
+def measure_recall(ivf: IVFIndex, embeddings: np.ndarray, query_vectors: np.ndarray,
+                   top_k: int = 10, nprobe_values: List[int] = None) -> List[Dict[str, Any]]:
+    """
+    以暴力检索为基准评估IVF在不同 nprobe 下的召回率与耗时
+
+    Args:
+        ivf: 已训练的IVF索引
+        embeddings: 段落向量
+        query_vectors: (n_queries, dim) 的查询向量
+        top_k: 评估的结果数量
+        nprobe_values: 待评估的 nprobe 列表
+
+    Returns:
+        每个 nprobe 一条记录：nprobe、recall@k、每查询平均耗时（ivf_ms / exact_ms）
+    """
+    if nprobe_values is None:
+        nprobe_values = [1, 2, 4, 8, 16, 32]
+
+    exact_index = DenseIndex(embeddings)
+    start = time.perf_counter()
+    exact = exact_index.search(query_vectors, top_k)
+    exact_ms = (time.perf_counter() - start) * 1000 / max(len(query_vectors), 1)
+    exact_sets = [set(i for i, _ in hits) for hits in exact]
+
+    report = []
+    for nprobe in nprobe_values:
+        start = time.perf_counter()
+        approx = ivf.search(embeddings, query_vectors, top_k, nprobe=nprobe)
+        ivf_ms = (time.perf_counter() - start) * 1000 / max(len(query_vectors), 1)
+        found = sum(len(truth & set(i for i, _ in hits)) for truth, hits in zip(exact_sets, approx))
+        expected = sum(len(truth) for truth in exact_sets)
+        report.append({
+            "nprobe": nprobe,
+            "recall": found / expected if expected else 1.0,
+            "ivf_ms": ivf_ms,
+            "exact_ms": exact_ms
+        })
+    return report
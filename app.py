@@ -15,6 +15,13 @@ from rag_backend import (
     evaluate_answer
 )
 
+# 进程内共享的JSON读取缓存
+from json_cache import load_json
+from text_matcher import get_matcher
+from context_packer import estimate_tokens, pack_context
+from llm_errors import LlmError
+from config import RAG_CONFIG
+
 # 导入第四阶段功能
 from stage4_coding_game import stage4_coding_game
 
@@ -236,7 +243,7 @@ def stage1_retrieval_storm():
                 # 评估答案并更新分数
                 if query_input is None:
                     st.error("请先执行检索!!")
-                score = evaluate_stage1_answer(selected_paragraphs, query_input)
+                score = evaluate_stage1_answer(selected_paragraphs, st.session_state.search_results)
                 st.session_state.game_state['total_score'] += score
                 st.session_state.game_state['stage1_results'] = {
                     'selected': selected_paragraphs,
@@ -430,15 +437,21 @@ def stage3_generation_war():
             )
             
             if st.button("🚀 提交prompt并生成答案") and defense_prompt:
-                with st.spinner("正在调用DeepSeek生成答案..."):
-                    generated_answer = generate_answer_with_deepseek(selected_bomb, retrieval_docs, defense_prompt)
-                    st.session_state.generated_answer = generated_answer
-                    st.session_state.selected_query = selected_bomb
-                    st.session_state.defense_prompt = defense_prompt
+                from deepseek_utils import find_blocked_terms
+                blocked_terms = find_blocked_terms(defense_prompt)
+                if blocked_terms:
+                    # 只提示和记录，不阻止生成
+                    print(f"第三阶段防御prompt包含屏蔽词: {blocked_terms}")
+                    st.warning(f"⚠️ 防御prompt中包含屏蔽词：{'、'.join(blocked_terms)}（已记录）")
+                # 答案在右侧结果区域流式生成
+                st.session_state.pending_generation = (selected_bomb, retrieval_docs, defense_prompt)
+                st.session_state.selected_query = selected_bomb
+                st.session_state.defense_prompt = defense_prompt
     
     with col2:
         st.subheader("📊 生成结果")
-        if 'generated_answer' in st.session_state:
+        pending_generation = st.session_state.pop('pending_generation', None)
+        if 'generated_answer' in st.session_state or pending_generation:
             st.write("**查询问题**:")
             st.info(st.session_state.get('selected_query', ''))
             
@@ -470,34 +483,48 @@ def stage3_generation_war():
             )
             
             st.write("**DeepSeek生成的答案**:")
+            if pending_generation:
+                prompt_stats = estimate_answer_prompt(*pending_generation)
+                st.caption(
+                    f"预计提示词约 {prompt_stats['prompt_tokens']} tokens（文档 {prompt_stats['included']} 篇，"
+                    f"截断 {prompt_stats['truncated']}，去重 {prompt_stats['deduplicated']}，超出预算 {prompt_stats['dropped']}）"
+                )
+                # 边生成边显示，首个token到达即开始渲染
+                try:
+                    st.session_state.generated_answer = st.write_stream(stream_answer_with_deepseek(*pending_generation))
+                except LlmError as e:
+                    # 错误信息不作为答案保存
+                    st.session_state.generated_answer = ""
+                    st.error(f"生成答案失败：{e}")
             generated_answer = st.session_state.generated_answer
-            st.markdown(
-                f"""
-                <div style="
-                    background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
-                    padding: 15px;
-                    border-radius: 10px;
-                    border-left: 4px solid #FF6B6B;
-                    box-shadow: 0 4px 15px rgba(0,0,0,0.1);
-                    margin: 10px 0;
-                ">
+            if not pending_generation:
+                st.markdown(
+                    f"""
                     <div style="
-                        background: rgba(255,255,255,0.95);
+                        background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%);
                         padding: 15px;
-                        border-radius: 8px;
-                        color: #333;
-                        font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                        line-height: 1.0;
-                        min-height: 200px;
-                        max-height: 400px;
-                        overflow-y: auto;
-                        white-space: pre-wrap;
-                        word-wrap: break-word;
-                    ">{generated_answer.strip() if generated_answer else '暂无生成答案'}</div>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+                        border-radius: 10px;
+                        border-left: 4px solid #FF6B6B;
+                        box-shadow: 0 4px 15px rgba(0,0,0,0.1);
+                        margin: 10px 0;
+                    ">
+                        <div style="
+                            background: rgba(255,255,255,0.95);
+                            padding: 15px;
+                            border-radius: 8px;
+                            color: #333;
+                            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                            line-height: 1.0;
+                            min-height: 200px;
+                            max-height: 400px;
+                            overflow-y: auto;
+                            white-space: pre-wrap;
+                            word-wrap: break-word;
+                        ">{generated_answer.strip() if generated_answer else '暂无生成答案'}</div>
+                    </div>
+                    """,
+                    unsafe_allow_html=True
+                )
             
             # if st.button("🏆 提交最终答案"):
             #     # 保存结果到session state
@@ -588,9 +615,7 @@ def show_game_results():
                             
                         elif file_path.endswith('.json'):
                             st.write("**JSON文件内容:**")
-                            with open(file_path, 'r', encoding='utf-8') as f:
-                                json_data = json.load(f)
-                            st.json(json_data)
+                            st.json(load_json(file_path))
                             
                         elif file_path.endswith(('.txt', '.md')):
                             st.write("**文本文件内容:**")
@@ -615,23 +640,15 @@ def show_game_results():
                 st.error(f"访问文件夹时出错: {str(e)}")
 
 # 辅助函数
-def evaluate_stage1_answer(selected_paragraphs, query):
-    """评估第一阶段答案"""
-    result = 0
-    if query.strip() == "找出敏感肌可用的玻尿酸面膜核心成分":
-        for selected_paragraph in selected_paragraphs:
-            if selected_paragraph in [0, 1, 2, 4, 5]:
-                result += 1
-        st.success(f"回答得分: {result}分。这里面段落4为混淆的文档。其他都有一定的关联。")
-    elif query.strip() == "识别孕妇可安全使用的口红配方要求":
-        result = 3
-        if result == 3:
-            st.success(f"回答得分: {result}分。在这个使用用例中，所有的文档都有一定的关联。")
-    elif query.strip() == "确定抗衰老精华中的有效活性成分":
-        for selected_paragraph in selected_paragraphs:
-            if selected_paragraph in [0, 1, 3, 4, 5]:
-                result += 1
-        st.success(f"回答得分: {result}分。这里面段落3为混淆的文档。其他都有一定的关联。")
+def evaluate_stage1_answer(selected_paragraphs, search_results):
+    """评估第一阶段答案：每个来自真实文档的段落得1分，来自虚假文档（is_fake）的段落为混淆段落"""
+    confusing = [i for i in selected_paragraphs if search_results[i].get('is_fake')]
+    result = len(selected_paragraphs) - len(confusing)
+    if confusing:
+        confusing_names = "、".join(f"段落{i+1}" for i in confusing)
+        st.success(f"回答得分: {result}分。这里面{confusing_names}为混淆的文档。其他都有一定的关联。")
+    else:
+        st.success(f"回答得分: {result}分。所选段落都有一定的关联。")
     return result
 
 def evaluate_stage2_answer(removed_paragraphs, reason, external_knowledge):
@@ -649,6 +666,25 @@ def evaluate_defense(defense_answer, attack):
         return 8
     return 0
 
+# 查询关键词 -> 任务JSON文件名（不含扩展名），按顺序优先匹配
+QUERY_TASK_FILES = {
+    '敏感肌': '找出敏感肌可用的玻尿酸面膜核心成分',
+    '玻尿酸': '找出敏感肌可用的玻尿酸面膜核心成分',
+    '面膜': '找出敏感肌可用的玻尿酸面膜核心成分',
+    '抗衰老': '确定抗衰老精华中的有效活性成分',
+    '精华': '确定抗衰老精华中的有效活性成分',
+    '孕妇': '识别孕妇可安全使用的口红配方要求',
+    '口红': '识别孕妇可安全使用的口红配方要求'
+}
+_QUERY_TASK_MATCHER = get_matcher(list(QUERY_TASK_FILES))
+
+def task_file_for_query(query):
+    """根据查询中出现的关键词确定任务JSON文件名（不含扩展名），没有匹配时使用第一个任务"""
+    keyword = _QUERY_TASK_MATCHER.first_by_priority(query)
+    if keyword is None:
+        return '找出敏感肌可用的玻尿酸面膜核心成分'
+    return QUERY_TASK_FILES[keyword]
+
 def get_initial_results_with_noise():
     """从JSON文件获取初始结果"""
     import json
@@ -657,46 +693,24 @@ def get_initial_results_with_noise():
     # 获取当前查询 - 优先使用第二阶段的query选择，如果没有则使用第一阶段的
     query = st.session_state.game_state.get('stage2_query', '') or st.session_state.game_state.get('stage1_results', {}).get('query', '')
     # 根据查询映射到对应的JSON文件
-    query_mapping = {
-        '敏感肌': '找出敏感肌可用的玻尿酸面膜核心成分.json',
-        '玻尿酸': '找出敏感肌可用的玻尿酸面膜核心成分.json',
-        '面膜': '找出敏感肌可用的玻尿酸面膜核心成分.json',
-        '抗衰老': '确定抗衰老精华中的有效活性成分.json',
-        '精华': '确定抗衰老精华中的有效活性成分.json',
-        '孕妇': '识别孕妇可安全使用的口红配方要求.json',
-        '口红': '识别孕妇可安全使用的口红配方要求.json'
-    }
-    
-    # 查找匹配的JSON文件
-    json_file = None
-    for keyword, filename in query_mapping.items():
-        if keyword in query:
-            json_file = filename
-            break
-    
-    if not json_file:
-        # 默认使用第一个文件
-        json_file = '找出敏感肌可用的玻尿酸面膜核心成分.json'
-    
-    json_path = os.path.join('json', json_file)
+    json_path = os.path.join('json', f'{task_file_for_query(query)}.json')
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            documents = data.get('documents', [])
-            
-            # 转换为统一格式
-            results = []
-            for i, doc in enumerate(documents):
-                results.append({
-                    'index': i+1,
-                    'text': doc.get('text', ''),
-                    'score': doc.get('score', 0.0),
-                    'quality': doc.get('score', 0.0),  # 使用score作为quality
-                    'metadata': doc.get('metadata', {}),
-                    'uid': doc.get('uid', '')
-                })
-            return results[:10]  # 限制返回前10个结果
-            
+        data = load_json(json_path)
+        documents = data.get('documents', [])
+        
+        # 转换为统一格式
+        results = []
+        for i, doc in enumerate(documents):
+            results.append({
+                'index': i+1,
+                'text': doc.get('text', ''),
+                'score': doc.get('score', 0.0),
+                'quality': doc.get('score', 0.0),  # 使用score作为quality
+                'metadata': dict(doc.get('metadata', {})),
+                'uid': doc.get('uid', '')
+            })
+        return results[:10]  # 限制返回前10个结果
+        
     except Exception as e:
         st.error(f"读取JSON文件失败: {e}")
         # 返回默认结果
@@ -718,25 +732,7 @@ def save_reranked_results(reranked_results, current_order, to_remove):
     query = st.session_state.game_state.get('stage2_query', '') or st.session_state.game_state.get('stage1_results', {}).get('query', '')
     
     # 根据查询确定原始文件名
-    query_mapping = {
-        '敏感肌': '找出敏感肌可用的玻尿酸面膜核心成分',
-        '玻尿酸': '找出敏感肌可用的玻尿酸面膜核心成分',
-        '面膜': '找出敏感肌可用的玻尿酸面膜核心成分',
-        '抗衰老': '确定抗衰老精华中的有效活性成分',
-        '精华': '确定抗衰老精华中的有效活性成分',
-        '孕妇': '识别孕妇可安全使用的口红配方要求',
-        '口红': '识别孕妇可安全使用的口红配方要求'
-    }
-    
-    # 查找匹配的文件名
-    base_filename = None
-    for keyword, filename in query_mapping.items():
-        if keyword in query:
-            base_filename = filename
-            break
-    
-    if not base_filename:
-        base_filename = '找出敏感肌可用的玻尿酸面膜核心成分'
+    base_filename = task_file_for_query(query)
     
     # 创建新的文件名
     new_filename = f"{base_filename}_rerank.json"
@@ -782,16 +778,10 @@ def load_retrieval_documents(query):
     import json
     import os
     
-    # 查询到文件名的映射
-    query_mapping = {
-        '找出敏感肌可用的玻尿酸面膜核心成分': '找出敏感肌可用的玻尿酸面膜核心成分',
-        '识别孕妇可安全使用的口红配方要求': '识别孕妇可安全使用的口红配方要求',
-        '确定抗衰老精华中的有效活性成分': '确定抗衰老精华中的有效活性成分'
-    }
-    
-    base_filename = query_mapping.get(query)
-    if not base_filename:
+    # 只接受任务全名（文件名与任务名相同）
+    if query not in set(QUERY_TASK_FILES.values()):
         return []
+    base_filename = query
     
     # 优先尝试加载_rerank.json文件
     rerank_filepath = os.path.join('json', f'{base_filename}_rerank.json')
@@ -800,14 +790,10 @@ def load_retrieval_documents(query):
     try:
         # 首先尝试加载_rerank文件
         if os.path.exists(rerank_filepath):
-            with open(rerank_filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('documents', [])
+            return load_json(rerank_filepath).get('documents', [])
         # 如果没有_rerank文件，加载原始文件
         elif os.path.exists(original_filepath):
-            with open(original_filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('documents', [])
+            return load_json(original_filepath).get('documents', [])
         else:
             st.error(f"未找到相关文档文件: {base_filename}")
             return []
@@ -815,10 +801,8 @@ def load_retrieval_documents(query):
         st.error(f"加载文档失败: {e}")
         return []
 
-def generate_answer_with_deepseek(query, retrieval_docs, defense_prompt):
-    """使用DeepSeek生成答案"""
-    from deepseek_utils import ChatBot
-    
+def _build_answer_prompts(query, retrieval_docs, defense_prompt):
+    """构建生成答案所用的system prompt、user prompt及检索文档打包统计（含估算的提示词token数）"""
     # 构建system prompt
     system_prompt = f"""
 你是一个专业助手。你的任务是基于提供的检索文档来回答用户的问题。
@@ -833,11 +817,10 @@ def generate_answer_with_deepseek(query, retrieval_docs, defense_prompt):
 用户的防御指导：{defense_prompt}
 """
     
-    # 构建检索文档内容
-    docs_content = ""
-    for i, doc in enumerate(retrieval_docs):
-        doc_name = doc.get('metadata', {}).get('document_display_name', f'文档{i+1}')
-        docs_content += f"\n=== {doc_name} ===\n{doc['text']}\n"
+    # 按token预算打包检索文档：排名靠前的优先，去掉重复句子，放不下时在句子边界截断
+    docs_content, packing_stats = pack_context(
+        retrieval_docs, RAG_CONFIG["generation"]["context_token_budget"]
+    )
     
     # 构建user prompt
     user_prompt = f"""
@@ -849,17 +832,32 @@ def generate_answer_with_deepseek(query, retrieval_docs, defense_prompt):
 
 请基于上述文档内容，提供详细、准确的回答。
 """
+    packing_stats["prompt_tokens"] = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+    return system_prompt, user_prompt, packing_stats
+
+def estimate_answer_prompt(query, retrieval_docs, defense_prompt):
+    """返回生成答案前的提示词估算统计（prompt_tokens / included / truncated / deduplicated / dropped）"""
+    return _build_answer_prompts(query, retrieval_docs, defense_prompt)[2]
+
+def stream_answer_with_deepseek(query, retrieval_docs, defense_prompt):
+    """使用DeepSeek流式生成答案，逐段返回回答正文（不含推理内容）；调用失败时抛出 LlmError"""
+    from deepseek_utils import ChatBot, ReasoningDelta, stage_deadline_seconds
     
-    try:
-        # 创建ChatBot实例
-        chatbot = ChatBot(system_prompt=system_prompt, temperature=0.5)
-        
-        # 生成回答
-        answer = chatbot.chat(user_prompt)
-        
-        return answer
-    except Exception as e:
-        return f"生成答案时出错: {str(e)}"
+    system_prompt, user_prompt, _ = _build_answer_prompts(query, retrieval_docs, defense_prompt)
+    
+    # 创建ChatBot实例
+    # 相同的检索文档和防御prompt经常重复提交，开启响应缓存；截止时间按第三阶段时长计算
+    # 答案要计分，只复用完全相同的提示词的答案，不使用语义缓存
+    chatbot = ChatBot(system_prompt=system_prompt, temperature=0.5, use_cache=True, use_semantic_cache=False,
+                      deadline_seconds=stage_deadline_seconds(3))
+    
+    for delta in chatbot.chat_stream(user_prompt):
+        if not isinstance(delta, ReasoningDelta):
+            yield delta
+
+def generate_answer_with_deepseek(query, retrieval_docs, defense_prompt):
+    """使用DeepSeek生成答案，调用失败时抛出 LlmError"""
+    return "".join(stream_answer_with_deepseek(query, retrieval_docs, defense_prompt))
 
 def get_context_from_previous_stages():
     """从前两阶段获取上下文"""
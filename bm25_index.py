@@ -0,0 +1,257 @@
+"""BM25倒排索引模块
+
+在内存中维护 词元 -> (文档编号数组, 词频数组) 的倒排表，
+查询时只访问查询词对应的倒排链，用NumPy向量化累加BM25分数。
+批量查询时把倒排表展开为 文档×词元 的稀疏权重矩阵，用一次稀疏矩阵乘法为全部查询打分。
+支持增量追加文档和删除（墓碑化）文档，文档编号保持不变。
+"""
+
+from collections import Counter
+from typing import List, Tuple, Dict
+
+import numpy as np
+from scipy import sparse
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        """
+        初始化空的BM25索引
+
+        Args:
+            k1: 词频饱和参数
+            b: 文档长度归一化参数
+        """
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self._length_norm = np.zeros(0, dtype=np.float32)
+        self._matrix = None  # 批量查询用的 (词元->列号, 文档×词元权重矩阵)，索引变化时清空
+
+    @property
+    def num_docs(self) -> int:
+        """文档编号空间大小（含已删除文档）"""
+        return len(self.doc_lengths)
+
+    @property
+    def num_alive(self) -> int:
+        return int(self.alive.sum())
+
+    def build(self, tokenized_docs: List[List[str]], alive: np.ndarray = None) -> "BM25Index":
+        """
+        从分词后的文档构建倒排索引
+
+        Args:
+            tokenized_docs: 每个文档的词元列表
+            alive: 可选的存活标记，False的文档占位但不进入倒排表
+
+        Returns:
+            索引自身
+        """
+        self.postings = {}
+        self.doc_lengths = np.zeros(0, dtype=np.float32)
+        self.alive = np.zeros(0, dtype=bool)
+        self.add(tokenized_docs, alive)
+        return self
+
+    def add(self, tokenized_docs: List[List[str]], alive: np.ndarray = None) -> List[int]:
+        """
+        追加文档，新文档编号从当前 num_docs 开始连续分配
+
+        Args:
+            tokenized_docs: 新文档的词元列表
+            alive: 可选的存活标记
+
+        Returns:
+            新文档的编号列表
+        """
+        first_id = self.num_docs
+        if alive is None:
+            alive = np.ones(len(tokenized_docs), dtype=bool)
+
+        doc_ids: Dict[str, List[int]] = {}
+        term_freqs: Dict[str, List[int]] = {}
+        lengths = np.zeros(len(tokenized_docs), dtype=np.float32)
+        for offset, tokens in enumerate(tokenized_docs):
+            if not alive[offset]:
+                continue
+            lengths[offset] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                doc_ids.setdefault(term, []).append(first_id + offset)
+                term_freqs.setdefault(term, []).append(tf)
+
+        for term, ids in doc_ids.items():
+            new_ids = np.asarray(ids, dtype=np.int32)
+            new_tfs = np.asarray(term_freqs[term], dtype=np.float32)
+            posting = self.postings.get(term)
+            if posting is not None:
+                new_ids = np.concatenate([posting[0], new_ids])
+                new_tfs = np.concatenate([posting[1], new_tfs])
+            self.postings[term] = (new_ids, new_tfs)
+
+        self.doc_lengths = np.concatenate([self.doc_lengths, lengths])
+        self.alive = np.concatenate([self.alive, np.asarray(alive, dtype=bool)])
+        self._update_length_norm()
+        return list(range(first_id, self.num_docs))
+
+    def remove(self, doc_id: int, tokens: List[str]):
+        """
+        删除文档：从其词元的倒排链中剔除，并标记为墓碑
+
+        Args:
+            doc_id: 文档编号
+            tokens: 该文档建索引时的词元列表
+        """
+        if not self.alive[doc_id]:
+            return
+        for term in set(tokens):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            keep = posting[0] != doc_id
+            if keep.all():
+                continue
+            if keep.any():
+                self.postings[term] = (posting[0][keep], posting[1][keep])
+            else:
+                del self.postings[term]
+        self.alive[doc_id] = False
+        self.doc_lengths[doc_id] = 0
+        self._update_length_norm()
+
+    def _update_length_norm(self):
+        """预计算每个文档的长度归一化项 k1 * (1 - b + b * dl / avgdl)，avgdl只统计存活文档"""
+        self._matrix = None
+        if self.num_alive == 0:
+            self._length_norm = np.full(self.num_docs, self.k1, dtype=np.float32)
+            return
+        avgdl = max(float(self.doc_lengths[self.alive].mean()), 1.0)
+        self._length_norm = (self.k1 * (1 - self.b + self.b * self.doc_lengths / avgdl)).astype(np.float32)
+
+    def idf(self, term: str) -> float:
+        """计算词元的IDF（Lucene平滑形式，始终非负）"""
+        posting = self.postings.get(term)
+        df = len(posting[0]) if posting is not None else 0
+        return float(np.log(1 + (self.num_alive - df + 0.5) / (df + 0.5)))
+
+    def score(self, query_tokens: List[str]) -> np.ndarray:
+        """
+        计算查询对所有文档的BM25分数
+
+        Args:
+            query_tokens: 查询词元列表（重复词元按出现次数加权）
+
+        Returns:
+            长度为文档数的float32分数数组
+        """
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term, query_tf in Counter(query_tokens).items():
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            ids, tfs = posting
+            weight = self.idf(term) * query_tf
+            scores[ids] += weight * tfs * (self.k1 + 1) / (tfs + self._length_norm[ids])
+        return scores
+
+    def search(self, query_tokens: List[str], top_k: int = 10) -> List[Tuple[int, float]]:
+        """
+        检索得分最高的文档
+
+        Args:
+            query_tokens: 查询词元列表
+            top_k: 返回结果数量
+
+        Returns:
+            (文档编号, 分数) 列表，按分数降序，不含零分文档
+        """
+        scores = self.score(query_tokens)
+        return top_k_indices(scores, top_k)
+
+
+    def _term_matrix(self):
+        """
+        把倒排表展开为稀疏矩阵，元素为 tf * (k1 + 1) / (tf + 长度归一化项)
+
+        Returns:
+            (词元->列号字典, (num_docs, 词元数) 的CSC矩阵, 每列的IDF)
+        """
+        if self._matrix is None:
+            columns = {term: col for col, term in enumerate(self.postings)}
+            postings = list(self.postings.values())
+            lengths = np.array([len(ids) for ids, _ in postings], dtype=np.int64)
+            indptr = np.zeros(len(postings) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum(lengths)
+            if postings:
+                indices = np.concatenate([ids for ids, _ in postings])
+                tfs = np.concatenate([tfs for _, tfs in postings])
+            else:
+                indices = np.zeros(0, dtype=np.int32)
+                tfs = np.zeros(0, dtype=np.float32)
+            data = tfs * (self.k1 + 1) / (tfs + self._length_norm[indices])
+            matrix = sparse.csc_matrix((data, indices, indptr), shape=(self.num_docs, len(postings)), dtype=np.float32)
+            idf = np.log(1 + (self.num_alive - lengths + 0.5) / (lengths + 0.5)).astype(np.float32)
+            self._matrix = (columns, matrix, idf)
+        return self._matrix
+
+    def score_batch(self, tokenized_queries: List[List[str]]) -> np.ndarray:
+        """
+        一次稀疏矩阵乘法计算多个查询对所有文档的BM25分数
+
+        Args:
+            tokenized_queries: 每个查询的词元列表
+
+        Returns:
+            (查询数, 文档数) 的float32分数矩阵，与逐个调用 score() 的结果一致
+        """
+        columns, matrix, idf = self._term_matrix()
+        rows, cols, values = [], [], []
+        for row, tokens in enumerate(tokenized_queries):
+            for term, query_tf in Counter(tokens).items():
+                col = columns.get(term)
+                if col is not None:
+                    rows.append(row)
+                    cols.append(col)
+                    values.append(query_tf * idf[col])
+        queries = sparse.csr_matrix((values, (rows, cols)), shape=(len(tokenized_queries), len(columns)), dtype=np.float32)
+        return np.asarray((queries @ matrix.T).todense(), dtype=np.float32)
+
+    def search_batch(self, tokenized_queries: List[List[str]], top_k: int = 10,
+                     batch_size: int = 256) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索，查询按 batch_size 分块打分，避免一次生成过大的分数矩阵
+
+        Args:
+            tokenized_queries: 每个查询的词元列表
+            top_k: 每个查询返回的结果数量
+            batch_size: 每次矩阵乘法处理的查询数
+
+        Returns:
+            每个查询一个 (文档编号, 分数) 列表，按输入顺序排列
+        """
+        results = []
+        for start in range(0, len(tokenized_queries), batch_size):
+            scores = self.score_batch(tokenized_queries[start:start + batch_size])
+            results.extend(top_k_indices(row, top_k) for row in scores)
+        return results
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> List[Tuple[int, float]]:
+    """
+    用argpartition从分数数组中选出前top_k个正分项
+
+    Args:
+        scores: 一维分数数组
+        top_k: 返回数量
+
+    Returns:
+        (下标, 分数) 列表，按分数降序
+    """
+    if top_k <= 0 or len(scores) == 0:
+        return []
+    top_k = min(top_k, len(scores))
+    candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    candidates = candidates[np.argsort(-scores[candidates], kind='stable')]
+    return [(int(i), float(scores[i])) for i in candidates if scores[i] > 0]
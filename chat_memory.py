@@ -0,0 +1,165 @@
+"""对话历史管理模块
+
+ChatBot 每次调用前用历史策略压缩消息列表，使长对话的提示词大小有上限：
+
+    FullHistory            保留全部历史（不限制）
+    SlidingWindowHistory   按token预算保留最近的若干轮对话
+    SummarizingHistory     超出预算时把较早的对话总结为一条摘要，只保留最近的对话原文
+
+所有策略都固定保留开头的 system 消息（system prompt 及已有的摘要），
+按“轮”（一条用户消息及其后的回复）整体保留或丢弃，最新一轮总是保留。
+"""
+
+from typing import Callable, Dict, List, Tuple
+
+from context_packer import estimate_tokens
+
+Message = Dict[str, str]
+
+# 每条消息的角色、分隔符等固定开销（估算）
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PREFIX = "【之前对话的摘要】\n"
+
+
+def message_tokens(message: Message) -> int:
+    """估算单条消息的token数"""
+    return estimate_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def count_tokens(messages: List[Message]) -> int:
+    """估算消息列表的token数"""
+    return sum(message_tokens(message) for message in messages)
+
+
+def split_turns(messages: List[Message]) -> Tuple[List[Message], List[List[Message]]]:
+    """
+    把消息列表拆成固定保留的开头 system 消息和按轮分组的对话
+
+    Returns:
+        (开头的system消息列表, 对话轮列表)
+    """
+    pinned_count = 0
+    while pinned_count < len(messages) and messages[pinned_count]["role"] == "system":
+        pinned_count += 1
+
+    turns: List[List[Message]] = []
+    for message in messages[pinned_count:]:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return messages[:pinned_count], turns
+
+
+def _recent_turns(turns: List[List[Message]], budget: int) -> List[List[Message]]:
+    """从最新一轮向前保留不超过预算的对话轮（最新一轮总是保留）"""
+    kept = []
+    for turn in reversed(turns):
+        cost = count_tokens(turn)
+        if kept and cost > budget:
+            break
+        kept.append(turn)
+        budget -= cost
+    kept.reverse()
+    return kept
+
+
+def extractive_summary(messages: List[Message], max_chars: int = 800) -> str:
+    """
+    不调用模型的简单摘要：每条消息保留开头部分，总长度不超过 max_chars
+
+    Args:
+        messages: 需要总结的消息（可包含之前的摘要）
+        max_chars: 摘要最大字符数
+
+    Returns:
+        摘要文本
+    """
+    labels = {"user": "用户", "assistant": "助手", "system": "摘要"}
+    per_message = max(40, max_chars // max(1, len(messages)))
+    lines = []
+    for message in messages:
+        content = (message.get("content") or "").replace(SUMMARY_PREFIX, "").strip()
+        if len(content) > per_message:
+            content = content[:per_message] + "…"
+        lines.append(f"{labels.get(message['role'], message['role'])}：{content}")
+    return "\n".join(lines)[-max_chars:]
+
+
+class HistoryStrategy:
+    """历史策略基类：apply 返回压缩后的消息列表（不修改传入的列表）"""
+
+    def apply(self, messages: List[Message]) -> List[Message]:
+        raise NotImplementedError
+
+
+class FullHistory(HistoryStrategy):
+    def apply(self, messages: List[Message]) -> List[Message]:
+        return messages
+
+
+class SlidingWindowHistory(HistoryStrategy):
+    def __init__(self, max_tokens: int = 6000):
+        """
+        Args:
+            max_tokens: 消息列表（含system prompt）的token预算
+        """
+        self.max_tokens = max_tokens
+
+    def apply(self, messages: List[Message]) -> List[Message]:
+        if count_tokens(messages) <= self.max_tokens:
+            return messages
+        pinned, turns = split_turns(messages)
+        kept = _recent_turns(turns, self.max_tokens - count_tokens(pinned))
+        return pinned + [message for turn in kept for message in turn]
+
+
+class SummarizingHistory(HistoryStrategy):
+    def __init__(self, summarize: Callable[[List[Message]], str], max_tokens: int = 6000,
+                 keep_recent_tokens: int = 2000):
+        """
+        Args:
+            summarize: 把消息列表总结为一段文本的函数
+            max_tokens: 消息列表（含system prompt）超过该预算时触发总结
+            keep_recent_tokens: 总结时保留原文的最近对话的token预算
+        """
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.keep_recent_tokens = keep_recent_tokens
+
+    def apply(self, messages: List[Message]) -> List[Message]:
+        if count_tokens(messages) <= self.max_tokens:
+            return messages
+        pinned, turns = split_turns(messages)
+        recent = _recent_turns(turns, self.keep_recent_tokens)
+        older = turns[:len(turns) - len(recent)]
+        if not older:
+            return messages
+
+        # 之前的摘要与较早的对话一起重新总结，system prompt 原样保留
+        system_prompt = pinned[:1]
+        previous_summary = [message for message in pinned[1:] if message["content"].startswith(SUMMARY_PREFIX)]
+        summary = self.summarize(previous_summary + [message for turn in older for message in turn])
+        summary_message = {"role": "system", "content": SUMMARY_PREFIX + summary}
+        return system_prompt + [summary_message] + [message for turn in recent for message in turn]
+
+
+def make_history_strategy(config: Dict, summarize: Callable[[List[Message]], str] = extractive_summary) -> HistoryStrategy:
+    """
+    按配置创建历史策略
+
+    Args:
+        config: LLM_CONFIG["history"] 格式的配置，strategy 为 "full" / "window" / "summary"
+        summarize: summary 策略使用的总结函数
+
+    Returns:
+        HistoryStrategy 实例
+    """
+    strategy = config.get("strategy", "window")
+    if strategy == "full":
+        return FullHistory()
+    if strategy == "summary":
+        return SummarizingHistory(summarize, config["max_tokens"], config["keep_recent_tokens"])
+    if strategy == "window":
+        return SlidingWindowHistory(config["max_tokens"])
+    raise ValueError(f"未知的历史策略: {strategy}")
@@ -0,0 +1,99 @@
+"""对话会话管理模块
+
+按键（如团队名）保存长期存在的 ChatBot 会话：首次使用时从持久化的聊天记录重建一次消息列表
+（按 ChatBot 的历史策略裁剪到预算内），之后每轮对话直接在内存中追加。
+活跃会话数量有上限，超出时淘汰最久未使用且当前没有调用在使用的会话，下次使用时重新从记录重建。
+"""
+
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List
+
+Message = Dict[str, str]
+
+
+class ChatSessionManager:
+    def __init__(self, create_bot: Callable[[str], Any], load_messages: Callable[[str], List[Message]],
+                 max_sessions: int = 16):
+        """
+        初始化会话管理器
+
+        Args:
+            create_bot: 按键创建新 ChatBot 的函数（system prompt 固定，保证各会话的提示词前缀完全一致）
+            load_messages: 按键读取历史对话的函数，返回不含 system prompt 的 user/assistant 消息列表
+            max_sessions: 同时保留的活跃会话数
+        """
+        self.create_bot = create_bot
+        self.load_messages = load_messages
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        # 键 -> {"bot": ChatBot, "lock": 会话锁, "users": 正在使用（含等待会话锁）的调用数}
+        self._sessions: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._stats = {"hits": 0, "rebuilds": 0, "evictions": 0}
+
+    def _evict_idle(self):
+        """超出上限时淘汰最久未使用且没有调用在使用的会话（调用方持有 self._lock）"""
+        excess = len(self._sessions) - self.max_sessions
+        if excess <= 0:
+            return
+        idle = [key for key, entry in self._sessions.items() if entry["users"] == 0]
+        for key in idle[:excess]:
+            del self._sessions[key]
+            self._stats["evictions"] += 1
+
+    def _acquire(self, key: str) -> Dict[str, Any]:
+        """取得键对应的会话并标记为使用中（使用中的会话不会被淘汰）"""
+        with self._lock:
+            entry = self._sessions.get(key)
+            if entry is not None:
+                self._sessions.move_to_end(key)
+                self._stats["hits"] += 1
+                entry["users"] += 1
+                return entry
+
+        bot = self.create_bot(key)
+        bot.messages = bot.history.apply(bot.messages + self.load_messages(key))
+        with self._lock:
+            # 其他线程可能已经建好了同一个会话
+            entry = self._sessions.get(key)
+            if entry is None:
+                entry = {"bot": bot, "lock": threading.Lock(), "users": 0}
+                self._sessions[key] = entry
+                self._stats["rebuilds"] += 1
+            self._sessions.move_to_end(key)
+            entry["users"] += 1
+            self._evict_idle()
+            return entry
+
+    def _release(self, entry: Dict[str, Any]):
+        with self._lock:
+            entry["users"] -= 1
+            # 所有会话都在使用时可能暂时超出上限，空闲后再淘汰
+            self._evict_idle()
+
+    @contextmanager
+    def session(self, key: str):
+        """
+        取得键对应的会话，同一会话同一时间只允许一个调用使用；使用期间会话不会被淘汰
+
+        用法：
+            with manager.session(team_name) as chatbot:
+                reply = chatbot.chat(message)
+        """
+        entry = self._acquire(key)
+        try:
+            with entry["lock"]:
+                yield entry["bot"]
+        finally:
+            self._release(entry)
+
+    def discard(self, key: str):
+        """丢弃键对应的会话（例如聊天记录被清空后），下次使用时重新构建"""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """返回活跃会话数、复用次数、重建次数和淘汰次数"""
+        with self._lock:
+            return dict(self._stats, live_sessions=len(self._sessions))
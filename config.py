@@ -96,7 +96,63 @@ RAG_CONFIG = {
         "similarity_threshold": 0.3,
         "max_doc_length": 1000,
         "chunk_size": 200,
-        "chunk_overlap": 50
+        "chunk_overlap": 50,
+        "bm25_k1": 1.5,
+        "bm25_b": 0.75,
+        "lexical_backend": "memory"  # "memory"（进程内倒排索引）或 "sqlite"（多进程共享的FTS5数据库）
+    },
+    
+    # 嵌入配置（本地TF-IDF + TruncatedSVD模型）
+    "embedding": {
+        "model_name": "lsa",
+        "dim": 256,
+        "min_df": 1,
+        "max_features": None
+    },
+    
+    # 索引存储配置
+    "index": {
+        "store_dir": "index_store",  # 内存映射向量存储根目录，每个集合一个子目录
+        "max_tombstone_ratio": 0.3,  # 增量索引后墓碑段落占比超过该值时全量重建
+        "max_segments": 16,          # 每次增量索引写入一个新段，段数超过该值时合并为一个段
+        "fts": {
+            "db_path": "index_store/chunks.sqlite"  # 所有集合共用的SQLite FTS5段落库
+        },
+        "collections": {
+            "default": [
+                GAME_CONFIG["documents"]["real_docs_path"],
+                GAME_CONFIG["documents"]["fake_docs_path"]
+            ]
+        },
+        # IVF近似最近邻索引，集合达到 min_collection_size 后启用
+        "ivf": {
+            "min_collection_size": 20000,
+            "nlist": None,          # 簇数量，None表示按 4*sqrt(n) 自动确定
+            "nprobe": 8,            # 查询时探测的簇数量
+            "train_sample": 100000  # KMeans训练最多使用的向量数
+        },
+        # 乘积量化压缩：每个向量编码为 m 字节，查询时ADC粗排后用全精度向量精排
+        "pq": {
+            "enabled": False,
+            "m": 32,                # 子空间数量（每个子空间256个中心）
+            "rerank_k": 100,        # 参与全精度精排的候选数量
+            "train_sample": 100000
+        }
+    },
+    
+    # 检索/重排序结果缓存（LRU + TTL，索引版本变化时失效）
+    "query_cache": {
+        "enabled": True,
+        "max_entries": 1024,
+        "ttl_seconds": 600
+    },
+    
+    # 混合检索配置
+    "hybrid": {
+        "fusion": "minmax",   # "minmax"（alpha加权）或 "rrf"（倒数排名融合）
+        "candidate_k": 50,    # 每一路参与融合的候选数量
+        "rrf_k": 60,
+        "max_workers": 4      # 并行执行两路检索的线程数
     },
     
     # 重排序配置
@@ -112,7 +168,70 @@ RAG_CONFIG = {
         "max_length": 500,
         "temperature": 0.7,
         "top_p": 0.9,
-        "presence_penalty": 0.1
+        "presence_penalty": 0.1,
+        "context_token_budget": 3000  # 第三阶段生成答案时检索文档部分的token上限（本地估算）
+    }
+}
+
+# DeepSeek API 配置
+LLM_CONFIG = {
+    "base_url": "https://api.deepseek.com",
+    # 进程内共享的HTTP连接池
+    "http": {
+        "http2": True,                  # 安装了 h2 时启用HTTP/2
+        "verify_ssl": False,
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 60,         # 空闲连接保留秒数
+        "timeout": {
+            "connect": 10,
+            "read": 120,                # 长回答和推理模型需要较长的读取超时
+            "write": 30,
+            "pool": 10                  # 连接池耗尽时等待空闲连接的秒数
+        }
+    },
+    # 精确匹配的响应缓存（键为 模型+采样参数+system prompt+消息列表 的哈希）
+    "response_cache": {
+        "enabled": True,
+        "db_path": "index_store/llm_cache.sqlite",  # 与索引一样放在 index_store（不纳入版本控制）
+        "max_entries": 5000,
+        "max_bytes": 50 * 1024 * 1024,
+        "cache_nonzero_temperature": False  # temperature>0 的调用默认不缓存，ChatBot(use_cache=True) 可单独开启
+    },
+    # 对话历史：每次调用前压缩 ChatBot.messages，system prompt 始终保留
+    "history": {
+        "strategy": "window",           # "full"（不限制）、"window"（按token预算保留最近的对话）或 "summary"（总结较早的对话）
+        "max_tokens": 6000,             # 消息列表的token预算（本地估算）
+        "keep_recent_tokens": 2000,     # summary 策略保留原文的最近对话预算
+        "summary_input_chars": 4000,    # 交给模型总结的对话文本上限
+        "max_reasoning_contents": 10    # reasoning_contents 最多保留的条数
+    },
+    # 截止时间、重试与对冲请求
+    "retry": {
+        "max_retries": 2,               # 超时、连接中断、429、5xx 等可重试错误的最多重试次数
+        "backoff_base_seconds": 0.5,    # 第n次重试前随机等待 0 ~ min(上限, base×2^n) 秒
+        "backoff_max_seconds": 8,
+        "stage_deadline_fraction": 0.2, # 计时阶段中单次调用（含排队和重试）的截止时间 = 阶段时长 × 该比例
+        "default_deadline_seconds": 120,  # 不计时的调用（如第四阶段AI助手）的截止时间
+        "hedging": {
+            "enabled": False,           # 开启后，首个token在p95延迟内没有到达时再发起一次相同的请求
+            "percentile": 0.95,
+            "min_samples": 20,          # 延迟样本不足时不对冲
+            "window": 200,              # 参与统计的最近请求数
+            "min_delay_seconds": 1.0    # 发起对冲请求前至少等待的秒数
+        }
+    },
+    # 第四阶段各团队的长期对话会话
+    "sessions": {
+        "max_live_sessions": 16         # 内存中同时保留的会话数，超出时淘汰最久未使用的会话
+    },
+    # 语义缓存：精确缓存未命中时，复用同一上下文中相似输入的回复（与响应缓存使用相同的开启条件）
+    "semantic_cache": {
+        "enabled": True,
+        "db_path": "index_store/llm_cache.sqlite",
+        "similarity_threshold": 0.92,   # LSA向量余弦相似度阈值（只比较全部词元都在嵌入模型词表中的输入）
+        "max_entries": 2000,
+        "collection": "default"         # 提供嵌入模型的向量集合
     }
 }
 
@@ -131,7 +250,11 @@ SECURITY_CONFIG = {
     "max_query_length": 200,
     "rate_limiting": {
         "enabled": True,
-        "max_requests_per_minute": 30
+        "max_requests_per_minute": 30,          # 每个团队每分钟的DeepSeek调用数
+        "global_max_requests_per_minute": 120,  # 全进程每分钟的DeepSeek调用数
+        "burst": 5,                             # 令牌桶允许的突发请求数
+        "max_in_flight": 8,                     # 同时进行中的请求上限
+        "max_wait_seconds": 30                  # 额度不足时最长排队时间，超时后返回错误
     },
     "content_filtering": {
         "enabled": True,
@@ -170,6 +293,7 @@ def get_config(section: str = None):
         "teams": TEAM_TASKS,
         "hallucination": HALLUCINATION_BOMBS,
         "rag": RAG_CONFIG,
+        "llm": LLM_CONFIG,
         "monitoring": MONITORING_CONFIG,
         "security": SECURITY_CONFIG,
         "export": EXPORT_CONFIG,
@@ -193,6 +317,7 @@ def update_config(section: str, key: str, value):
         "teams": TEAM_TASKS,
         "hallucination": HALLUCINATION_BOMBS,
         "rag": RAG_CONFIG,
+        "llm": LLM_CONFIG,
         "monitoring": MONITORING_CONFIG,
         "security": SECURITY_CONFIG,
         "export": EXPORT_CONFIG,
@@ -0,0 +1,127 @@
+"""上下文打包模块
+
+在token预算内为生成答案挑选检索段落：按排名顺序放入段落，
+跳过与已放入内容重复的句子，放不下的段落在句子边界处截断。
+token数用本地规则估算（中文约0.6 token/字，英文和数字约0.3 token/字符），无需加载分词器。
+"""
+
+import math
+import re
+from typing import Any, Dict, List, Tuple
+
+from docx_loader import split_sentences
+
+# 每类字符的估算token数
+CJK_TOKENS_PER_CHAR = 0.6
+ASCII_TOKENS_PER_CHAR = 0.3
+OTHER_TOKENS_PER_CHAR = 1.0
+
+# 去重只针对有实际内容的句子，列表符号、章节编号等短句即使重复也保留
+MIN_DEDUP_CHARS = 8
+
+_CJK = re.compile(r'[　-〿㐀-䶿一-鿿豈-﫿＀-￯]')
+_ASCII = re.compile(r'[A-Za-z0-9]')
+_OTHER = re.compile(r'[^\sA-Za-z0-9　-〿㐀-䶿一-鿿豈-﫿＀-￯]')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数（适用于中英文混合文本）
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        估算的token数（向上取整）
+    """
+    if not text:
+        return 0
+    estimate = (
+        len(_CJK.findall(text)) * CJK_TOKENS_PER_CHAR
+        + len(_ASCII.findall(text)) * ASCII_TOKENS_PER_CHAR
+        + len(_OTHER.findall(text)) * OTHER_TOKENS_PER_CHAR
+    )
+    return math.ceil(estimate)
+
+
+def _sentence_key(sentence: str) -> str:
+    return _WHITESPACE.sub('', sentence)
+
+
+def _truncate_to_tokens(text: str, token_budget: int) -> str:
+    """返回估算token数不超过预算的最长前缀（至少保留一个字符）"""
+    low, high = 1, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if estimate_tokens(text[:middle]) <= token_budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+
+def pack_context(docs: List[Dict[str, Any]], token_budget: int) -> Tuple[str, Dict[str, Any]]:
+    """
+    按排名顺序把检索段落放入token预算
+
+    排名第一的段落总会放入：它的第一句就超出预算时按字符截断到预算内，不会得到空的上下文。
+
+    Args:
+        docs: 检索段落列表（已按排名从高到低排列），每项包含 text 和 metadata
+        token_budget: 检索文档部分可用的token数
+
+    Returns:
+        (拼接好的文档内容, 统计信息)；统计信息包含 tokens / included / truncated / deduplicated / dropped
+    """
+    parts = []
+    seen = set()
+    used = 0
+    stats = {"tokens": 0, "included": 0, "truncated": 0, "deduplicated": 0, "dropped": 0}
+
+    for i, doc in enumerate(docs):
+        if used >= token_budget and parts:
+            stats["dropped"] += len(docs) - i
+            break
+
+        # 相邻段落有重叠句子，只保留第一次出现的句子；有内容的句子全部重复时整段跳过
+        all_sentences = split_sentences(doc.get('text', ''))
+        sentences = [sentence for sentence in all_sentences if _sentence_key(sentence) not in seen]
+        meaningful = [len(_sentence_key(sentence)) >= MIN_DEDUP_CHARS for sentence in all_sentences]
+        if not sentences or (any(meaningful) and not any(
+                len(_sentence_key(sentence)) >= MIN_DEDUP_CHARS for sentence in sentences)):
+            stats["deduplicated"] += 1
+            continue
+
+        doc_name = doc.get('metadata', {}).get('document_display_name', f'文档{i+1}')
+        header = f"\n=== {doc_name} ===\n"
+        remaining = token_budget - used - estimate_tokens(header)
+
+        kept = []
+        for sentence in sentences:
+            cost = estimate_tokens(sentence)
+            if cost > remaining:
+                break
+            kept.append(sentence)
+            remaining -= cost
+        cut = len(kept) < len(sentences)
+        if not kept and not parts:
+            # 还没有放入任何段落：截断第一句，保证至少带上排名最高的段落
+            kept = [_truncate_to_tokens(sentences[0], remaining)]
+        if not kept:
+            stats["dropped"] += len(docs) - i
+            break
+
+        text = ''.join(kept)
+        parts.append(f"{header}{text}\n")
+        used += estimate_tokens(parts[-1])
+        seen.update(key for key in map(_sentence_key, kept) if len(key) >= MIN_DEDUP_CHARS)
+        stats["included"] += 1
+        if cut:
+            # 截断后预算已用完，后面的段落不再放入
+            stats["truncated"] += 1
+            stats["dropped"] += len(docs) - i - 1
+            break
+
+    stats["tokens"] = used
+    return ''.join(parts), stats
@@ -1,21 +1,147 @@
-from openai import OpenAI
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack
+from itertools import chain
+
+from openai import OpenAI, AsyncOpenAI, OpenAIError
 import urllib3
-import httpx
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 from dotenv import load_dotenv
 import os
 
+from chat_memory import HistoryStrategy, count_tokens, extractive_summary, make_history_strategy
+from config import GAME_CONFIG, LLM_CONFIG, SECURITY_CONFIG
+from llm_cache import get_response_cache, make_cache_key
+from llm_errors import LlmError, LlmRequestError, translate_error
+from llm_http import get_async_http_client, get_http_client
+from llm_retry import (
+    Deadline, LatencyTracker, acall_with_retries, ahedged_call, call_with_retries, hedged_call, retry_stats
+)
+from rate_limiter import LlmRateLimiter
+from semantic_cache import get_semantic_cache, make_scope
+from single_flight import SingleFlight
+from text_matcher import get_matcher
+
 load_dotenv()
 
 API_KEY = os.getenv("API_KEY")
 
+
+def find_blocked_terms(text: str) -> list:
+    """
+    查找文本中出现的屏蔽词（SECURITY_CONFIG["content_filtering"]，不区分大小写）.
+
+    只做检测：第三阶段的防御prompt和第四阶段的提问用它提示并记录屏蔽词，不会因此拒绝消息.
+
+    参数:
+    - text: 待检查的文本.
+
+    返回:
+    - 出现过的屏蔽词列表，未启用过滤时返回空列表.
+    """
+    filtering = SECURITY_CONFIG["content_filtering"]
+    if not filtering["enabled"]:
+        return []
+    return sorted(get_matcher(filtering["blocked_terms"], ignore_case=True).matched(text))
+
+_LIMITER_LOCK = threading.Lock()
+_RATE_LIMITER = None
+
+# 以响应缓存键合并并发的相同请求，结果为 (回复内容, 推理内容)
+_LLM_FLIGHT = SingleFlight()
+
+# 按 (模型, "complete"/"stream") 记录请求延迟（流式请求为首个token的延迟），用于决定何时发起对冲请求
+_LATENCY = LatencyTracker(LLM_CONFIG["retry"]["hedging"]["window"], LLM_CONFIG["retry"]["hedging"]["min_samples"])
+
+
+def stage_deadline_seconds(stage) -> float:
+    """
+    返回计时阶段中单次调用的截止秒数（阶段时长 GAME_CONFIG["stage_time_limits"] × stage_deadline_fraction）.
+
+    参数:
+    - stage: 阶段编号；不在 stage_time_limits 中的阶段使用 default_deadline_seconds.
+
+    返回:
+    - 截止秒数.
+    """
+    retry = LLM_CONFIG["retry"]
+    minutes = GAME_CONFIG["stage_time_limits"].get(stage)
+    if minutes is None:
+        return retry["default_deadline_seconds"]
+    return minutes * 60 * retry["stage_deadline_fraction"]
+
+
+def get_rate_limiter() -> LlmRateLimiter:
+    """
+    返回进程级的DeepSeek调用限流器（按 SECURITY_CONFIG["rate_limiting"] 创建）.
+
+    返回:
+    - LlmRateLimiter 实例，所有 ChatBot 共用.
+    """
+    global _RATE_LIMITER
+    with _LIMITER_LOCK:
+        if _RATE_LIMITER is None:
+            limiting = SECURITY_CONFIG["rate_limiting"]
+            _RATE_LIMITER = LlmRateLimiter(
+                per_key_rpm=limiting["max_requests_per_minute"],
+                global_rpm=limiting["global_max_requests_per_minute"],
+                burst=limiting["burst"],
+                max_in_flight=limiting["max_in_flight"],
+                max_wait_seconds=limiting["max_wait_seconds"],
+                enabled=limiting["enabled"]
+            )
+        return _RATE_LIMITER
+
+
+def rate_limiter_stats() -> dict:
+    """
+    返回限流器的排队深度、进行中请求数和等待时间统计.
+
+    返回:
+    - 统计字典，见 LlmRateLimiter.stats.
+    """
+    return get_rate_limiter().stats()
+
+
+def llm_flight_stats() -> dict:
+    """
+    返回相同请求合并的统计.
+
+    返回:
+    - 统计字典，见 SingleFlight.stats.
+    """
+    return _LLM_FLIGHT.stats()
+
+
+def resilience_stats() -> dict:
+    """
+    返回重试、对冲请求和截止时间的统计，以及各模型的请求延迟分位数.
+
+    返回:
+    - 统计字典，见 llm_retry.retry_stats；latency 为 "模型/类型" -> 样本数、p50、p95.
+    """
+    latency = {f"{model}/{kind}": stats for (model, kind), stats in _LATENCY.stats().items()}
+    return dict(retry_stats(), latency=latency)
+
+
+class ReasoningDelta(str):
+    """chat_stream 产生的推理内容片段（deepseek-reasoner 的 reasoning_content），与回答正文区分."""
+
+
 class ChatBot:
     def __init__(self,
                  system_prompt: str,
                  model: str = "deepseek-chat",
                  temperature: float = 0.7,
                  max_tokens: int = 8192,
+                 use_cache: bool = None,
+                 use_semantic_cache: bool = True,
+                 history: HistoryStrategy = None,
+                 rate_limit_key: str = None,
+                 deadline_seconds: float = None,
                  **kwargs):
         """
         初始化 ChatBot 实例。
@@ -25,57 +151,568 @@ class ChatBot:
         - model: 使用的模型名称，默认 "deepseek-chat"。
         - temperature: 控制回答的随机性，默认为 0.7。
         - max_tokens: 生成回答的最大 token 数量，默认为 150。
+        - use_cache: 是否使用响应缓存。None 表示按配置：temperature 为 0 时缓存，
+          temperature>0 时仅在 LLM_CONFIG["response_cache"]["cache_nonzero_temperature"] 开启时缓存。
+        - use_semantic_cache: 是否使用语义缓存（还需满足 use_cache 的条件）；回答要计分等不能复用相近输入的回复时关闭。
+        - history: 对话历史策略（见 chat_memory），默认按 LLM_CONFIG["history"] 创建。
+        - rate_limit_key: 限流键（如团队名），同一键共享一个令牌桶；None 表示只受全局限制。
+        - deadline_seconds: 每次调用（含排队和重试）的截止秒数，默认为 LLM_CONFIG["retry"]["default_deadline_seconds"]；
+          计时阶段可传入 stage_deadline_seconds(阶段)。
         - kwargs: 其他可能传递给 openai.ChatCompletion.create 的参数.
         """
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.use_cache = use_cache
+        self.use_semantic_cache = use_semantic_cache
+        self.rate_limit_key = rate_limit_key
+        self.deadline_seconds = deadline_seconds
         self.extra_params = kwargs
 
-        self.client = OpenAI(
-            api_key=API_KEY,
-            base_url="https://api.deepseek.com",
-            http_client=httpx.Client(verify=False)
+        # 所有实例共用进程级连接池，连接在多次对话之间保持复用；
+        # 重试由 ChatBot 按截止时间控制，关闭 SDK 自带的重试
+        try:
+            self.client = OpenAI(
+                api_key=API_KEY,
+                base_url=LLM_CONFIG["base_url"],
+                http_client=get_http_client(),
+                max_retries=0
+            )
+        except OpenAIError as e:
+            raise LlmRequestError(f"无法创建 DeepSeek 客户端: {e}") from e
 
-        )
+        # 异步客户端在首次调用 achat 时按事件循环创建
+        self._async_client = None
+        self._async_loop = None
+
+        # 每次调用前按历史策略压缩消息列表；推理内容只保留最近若干条
+        history_config = LLM_CONFIG["history"]
+        self.history = history or make_history_strategy(history_config, self._summarize)
+        self.reasoning_contents = deque(maxlen=history_config["max_reasoning_contents"])
+        # 最近一次请求的提示词统计：消息数、估算token数、API返回的实际 prompt_tokens
+        self.last_prompt_stats = None
+        # 压缩历史期间当前调用的截止时间，供 _summarize 使用
+        self._compaction_deadline = None
 
         # 初始消息列表中加入 system 提示
-        self.reasoning_contents = []
         self.messages = [
             {"role": "system", "content": system_prompt}
         ]
 
-    def chat(self, s: str) -> str:
+    def _get_async_client(self) -> AsyncOpenAI:
         """
-        发送用户消息并获取模型响应.
+        返回当前事件循环上的异步客户端.
+
+        httpx.AsyncClient 的连接池绑定在创建它的事件循环上，
+        同一事件循环内的实例共用一个连接池，事件循环变化时（例如每次 asyncio.run）切换客户端.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncOpenAI(
+                api_key=API_KEY,
+                base_url=LLM_CONFIG["base_url"],
+                http_client=get_async_http_client(loop),
+                max_retries=0
+            )
+            self._async_loop = loop
+        return self._async_client
+
+    def _summarize(self, messages: list) -> str:
+        """
+        调用模型把较早的对话总结为一段摘要（供 summary 历史策略使用），失败时退回截取式摘要.
+
+        总结请求与对话请求使用相同的截止时间和重试策略（在 chat 中触发时计入该次调用的截止时间）.
+
+        参数:
+        - messages: 需要总结的消息列表.
+
+        返回:
+        - 摘要文本.
+        """
+        transcript = extractive_summary(messages, max_chars=LLM_CONFIG["history"]["summary_input_chars"])
+        summary_messages = [
+            {"role": "system", "content": "请用简洁的中文总结以下对话，保留用户的目标、已确定的结论和代码要点，不超过300字。"},
+            {"role": "user", "content": transcript}
+        ]
+        deadline = self._compaction_deadline or self._deadline()
+        try:
+            summary, _ = self._retry(deadline, lambda: self._complete(
+                deadline, messages=summary_messages, temperature=0, max_tokens=512
+            ))
+            return summary or transcript
+        except LlmError as e:
+            print(f"总结对话历史失败，使用截取式摘要: {e}")
+            return transcript
+
+    def _compact_history(self, deadline: Deadline = None):
+        """按历史策略压缩消息列表（需要总结时使用本次调用的截止时间），并记录本次请求的提示词估算大小."""
+        self._compaction_deadline = deadline
+        try:
+            self.messages = self.history.apply(self.messages)
+        finally:
+            self._compaction_deadline = None
+        self.last_prompt_stats = {
+            "messages": len(self.messages),
+            "estimated_tokens": count_tokens(self.messages),
+            "prompt_tokens": None
+        }
+
+    def _record_usage(self, usage):
+        """记录API返回的实际 prompt token 数."""
+        if usage is not None and self.last_prompt_stats is not None:
+            self.last_prompt_stats["prompt_tokens"] = usage.prompt_tokens
+
+    def _cache_enabled(self, cache_config: dict) -> bool:
+        """按缓存配置和 use_cache 判断本实例是否使用该缓存."""
+        if not cache_config["enabled"] or self.use_cache is False:
+            return False
+        return self.temperature == 0 or bool(self.use_cache) or LLM_CONFIG["response_cache"]["cache_nonzero_temperature"]
+
+    def _cache_key(self):
+        """返回当前消息列表的响应缓存键，本次调用不使用缓存时返回 None."""
+        if not self._cache_enabled(LLM_CONFIG["response_cache"]):
+            return None
+        return make_cache_key(self.model, self.temperature, self.messages,
+                              max_tokens=self.max_tokens, **self.extra_params)
+
+    def _semantic_probe(self, semantic_text: str, semantic_context: str = None):
+        """
+        用本地嵌入模型编码用户输入，计算语义缓存作用域.
+
+        参数:
+        - semantic_text: 参与相似度比较的文本.
+        - semantic_context: 除 system prompt 外必须完全一致的上下文（如检索文档、代码）.
+
+        返回:
+        - (作用域, 输入文本, 向量)；不使用语义缓存或无法编码时返回 None.
+        """
+        cache_config = LLM_CONFIG["semantic_cache"]
+        if not self.use_semantic_cache or not self._cache_enabled(cache_config) or not semantic_text.strip():
+            return None
+        try:
+            from rag_backend import get_text_encoder
+            # 只使用已经打开的集合，不在对话请求中解析文档、训练嵌入模型
+            encoder = get_text_encoder(cache_config["collection"], load=False)
+            if encoder is None:
+                return None
+            embedder, embedder_version = encoder
+            # 含词表外词元的输入编码时会丢词，与意思不同的输入也可能高度相似，不参与比较
+            if not embedder.covers(semantic_text):
+                return None
+            vector = embedder.encode([semantic_text])[0]
+        except Exception as e:
+            print(f"语义缓存编码失败: {e}")
+            return None
+        if not vector.any():
+            return None
+        scope = make_scope(self.messages[0]["content"], semantic_context, self.messages[1:-1], embedder_version,
+                           model=self.model, temperature=self.temperature, max_tokens=self.max_tokens,
+                           **self.extra_params)
+        return scope, semantic_text, vector
+
+    def _lookup_cache(self, semantic_text: str, semantic_context: str = None):
+        """
+        依次查询精确匹配缓存和语义缓存.
+
+        返回:
+        - (是否命中, 回复内容, 推理内容, 未命中时回复应写入的缓存位置).
+        """
+        cache_key = self._cache_key()
+        if cache_key is not None:
+            hit, reply_content, reasoning_content = get_response_cache().get(cache_key)
+            if hit:
+                return True, reply_content, reasoning_content, None
+
+        probe = self._semantic_probe(semantic_text, semantic_context)
+        if probe is not None:
+            hit, reply_content, reasoning_content, _ = get_semantic_cache().lookup(probe[0], probe[2])
+            if hit:
+                return True, reply_content, reasoning_content, None
+
+        if cache_key is None and probe is None:
+            return False, None, None, None
+        return False, None, None, (cache_key, probe)
+
+    def _remember(self, reply_content: str, reasoning_content=None, pending=None) -> str:
+        """记录回复（及推理内容）到对话历史，需要时写入缓存，返回回复内容."""
+        if reasoning_content is not None:
+            self.reasoning_contents.append(reasoning_content)
+        # 将模型回复加入对话历史便于上下文延续
+        self.messages.append({"role": "assistant", "content": reply_content})
+        if pending is not None and reply_content:
+            cache_key, probe = pending
+            if cache_key is not None:
+                get_response_cache().put(cache_key, self.model, reply_content, reasoning_content)
+            if probe is not None:
+                scope, semantic_text, vector = probe
+                get_semantic_cache().add(scope, semantic_text, vector, reply_content, reasoning_content)
+        return reply_content
+
+    def set_last_user_message(self, content: str):
+        """
+        把历史中最近一条用户消息替换为 content（例如去掉只需在当轮发送的代码上下文）.
+
+        参数:
+        - content: 写入历史的用户消息.
+        """
+        for message in reversed(self.messages):
+            if message["role"] == "user":
+                message["content"] = content
+                return
+
+    def drop_unanswered_message(self):
+        """调用失败时移除末尾没有得到回复的用户消息，避免留在历史中."""
+        if len(self.messages) > 1 and self.messages[-1]["role"] == "user":
+            self.messages.pop()
+
+    @staticmethod
+    def _reply_of(message) -> tuple:
+        """从API返回的消息中取出 (回复内容, 推理内容)."""
+        return message.content, getattr(message, 'reasoning_content', None)
+
+    def _deadline(self, deadline_seconds: float = None) -> Deadline:
+        """按调用参数、实例设置或默认配置创建本次调用的截止时间."""
+        if deadline_seconds is None:
+            deadline_seconds = self.deadline_seconds
+        if deadline_seconds is None:
+            deadline_seconds = LLM_CONFIG["retry"]["default_deadline_seconds"]
+        return Deadline(deadline_seconds)
+
+    @staticmethod
+    def _limiter_timeout(deadline: Deadline) -> float:
+        """限流排队时间不超过最长排队时间，也不超过截止时间."""
+        return min(SECURITY_CONFIG["rate_limiting"]["max_wait_seconds"], deadline.remaining())
+
+    def _hedge_delay(self, kind: str):
+        """
+        返回发起对冲请求前等待的秒数（观测到的延迟分位数）.
+
+        参数:
+        - kind: "complete"（完整响应的延迟）或 "stream"（首个token的延迟）.
+
+        返回:
+        - 秒数；未开启对冲或延迟样本不足时返回 None.
+        """
+        hedging = LLM_CONFIG["retry"]["hedging"]
+        if not hedging["enabled"]:
+            return None
+        latency = _LATENCY.percentile((self.model, kind), hedging["percentile"])
+        if latency is None:
+            return None
+        return max(latency, hedging["min_delay_seconds"])
+
+    def _retry(self, deadline: Deadline, attempt_fn):
+        """按 LLM_CONFIG["retry"] 对可重试的错误退避重试."""
+        retry = LLM_CONFIG["retry"]
+        return call_with_retries(attempt_fn, deadline, retry["max_retries"],
+                                 retry["backoff_base_seconds"], retry["backoff_max_seconds"])
+
+    async def _aretry(self, deadline: Deadline, attempt_fn):
+        """_retry 的异步版本."""
+        retry = LLM_CONFIG["retry"]
+        return await acall_with_retries(attempt_fn, deadline, retry["max_retries"],
+                                        retry["backoff_base_seconds"], retry["backoff_max_seconds"])
+
+    def _complete(self, deadline: Deadline, messages: list = None, **overrides) -> tuple:
+        """
+        发送一次非流式请求.
+
+        参数:
+        - deadline: 截止时间.
+        - messages: 请求的消息列表，默认为对话历史（此时记录 prompt token 用量）.
+        - overrides: 覆盖实例设置的 temperature / max_tokens.
+
+        返回:
+        - (回复内容, 推理内容).
+
+        异常:
+        - LlmError: 请求失败或超过截止时间.
+        """
+        started = time.monotonic()
+        try:
+            deadline.check()
+            # 额度不足时排队等待，超过最长排队时间（或截止时间）才失败
+            with get_rate_limiter().limit(self.rate_limit_key, timeout=self._limiter_timeout(deadline)):
+                response = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.messages if messages is None else messages,
+                    temperature=overrides.get("temperature", self.temperature),
+                    max_tokens=overrides.get("max_tokens", self.max_tokens),
+                    timeout=deadline.remaining(),
+                    # 额外参数只用于对话请求（总结请求不使用）
+                    **(self.extra_params if messages is None else {})
+                )
+        except LlmError:
+            raise
+        except Exception as e:
+            raise translate_error(e) from e
+        _LATENCY.record((self.model, "complete"), time.monotonic() - started)
+        if messages is None:
+            self._record_usage(response.usage)
+        return self._reply_of(response.choices[0].message)
+
+    async def _acomplete(self, deadline: Deadline) -> tuple:
+        """_complete 的异步版本（排队和请求都不阻塞事件循环）."""
+        started = time.monotonic()
+        try:
+            deadline.check()
+            async with get_rate_limiter().alimit(self.rate_limit_key, timeout=self._limiter_timeout(deadline)):
+                response = await self._get_async_client().chat.completions.create(
+                    model=self.model,
+                    messages=self.messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    timeout=deadline.remaining(),
+                    **self.extra_params
+                )
+        except LlmError:
+            raise
+        except Exception as e:
+            raise translate_error(e) from e
+        _LATENCY.record((self.model, "complete"), time.monotonic() - started)
+        self._record_usage(response.usage)
+        return self._reply_of(response.choices[0].message)
+
+    def _open_stream(self, deadline: Deadline) -> tuple:
+        """
+        发起流式请求并读到首个token.
+
+        返回:
+        - (资源, 已读取的数据块列表, 剩余数据块的迭代器)；资源为 ExitStack，
+          关闭时结束流式响应并归还限流名额，整个流式响应期间占用一个进行中请求名额.
+
+        异常:
+        - LlmError: 请求失败或超过截止时间.
+        """
+        started = time.monotonic()
+        try:
+            deadline.check()
+            with ExitStack() as stack:
+                stack.enter_context(
+                    get_rate_limiter().limit(self.rate_limit_key, timeout=self._limiter_timeout(deadline))
+                )
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=self.messages,
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                    timeout=deadline.remaining(),
+                    **self.extra_params
+                )
+                stack.callback(stream.close)
+                # 第一个数据块通常只有角色信息，读到带内容（或推理内容）的数据块为止
+                chunks = iter(stream)
+                received = []
+                for chunk in chunks:
+                    received.append(chunk)
+                    if chunk.choices and (chunk.choices[0].delta.content
+                                          or getattr(chunk.choices[0].delta, 'reasoning_content', None)):
+                        break
+                # 成功后资源交给调用方关闭
+                resources = stack.pop_all()
+        except LlmError:
+            raise
+        except Exception as e:
+            raise translate_error(e) from e
+        _LATENCY.record((self.model, "stream"), time.monotonic() - started)
+        return resources, received, chunks
+
+    async def achat(self, s: str, semantic_text: str = None, semantic_context: str = None,
+                    deadline_seconds: float = None) -> str:
+        """
+        异步发送用户消息并获取模型响应（使用 AsyncOpenAI，不阻塞事件循环）.
 
         参数:
         - s: 用户输入的字符串.
+        - semantic_text: 语义缓存中参与相似度比较的文本，默认为 s.
+        - semantic_context: 语义缓存中除 system prompt 外必须完全一致的上下文（如检索文档、代码）.
+        - deadline_seconds: 本次调用的截止秒数，默认取实例设置.
 
         返回:
         - 模型生成的响应内容字符串.
+
+        异常:
+        - LlmError: 重试后仍失败或超过截止时间.
         """
-        # 添加用户的消息到对话历史中
+        deadline = self._deadline(deadline_seconds)
+
         self.messages.append({"role": "user", "content": s})
+        # 总结历史可能调用模型，放到线程中执行
+        await asyncio.to_thread(self._compact_history, deadline)
+
+        # 语义缓存需要编码输入并读取SQLite，放到线程中执行
+        hit, reply_content, reasoning_content, pending = await asyncio.to_thread(
+            self._lookup_cache, s if semantic_text is None else semantic_text, semantic_context
+        )
+        if hit:
+            return self._remember(reply_content, reasoning_content)
+
+        async def request():
+            return await self._aretry(deadline, lambda: ahedged_call(
+                lambda: self._acomplete(deadline), self._hedge_delay("complete"), deadline.remaining()
+            ))
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=self.messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                **self.extra_params
-            )
+            flight_key = pending[0] if pending else None
+            if flight_key is None:
+                (reply_content, reasoning_content), shared = await request(), False
+            else:
+                (reply_content, reasoning_content), shared = await _LLM_FLIGHT.ado(
+                    flight_key, request, timeout=deadline.remaining()
+                )
+        except LlmError:
+            raise
+        except Exception as e:
+            raise translate_error(e) from e
+        # 共享其他调用方的结果时，缓存已由领头者写入
+        return self._remember(reply_content, reasoning_content, None if shared else pending)
+
+    def chat(self, s: str, semantic_text: str = None, semantic_context: str = None,
+             deadline_seconds: float = None) -> str:
+        """
+        发送用户消息并获取模型响应.
 
-            # 获取模型的回复内容
-            reply_content = response.choices[0].message.content
-            if hasattr(response.choices[0].message, 'reasoning_content'):
-                reasoning_content = response.choices[0].message.reasoning_content
-                self.reasoning_contents.append(reasoning_content)
-            # 将模型回复加入对话历史便于上下文延续
-            self.messages.append({"role": "assistant", "content": reply_content})
+        可重试的错误（超时、连接中断、429、5xx）在截止时间内按指数退避重试；
+        开启对冲时，请求超过观测到的p95延迟仍未返回会再发起一次相同的请求.
 
-            return reply_content
+        参数:
+        - s: 用户输入的字符串.
+        - semantic_text: 语义缓存中参与相似度比较的文本，默认为 s.
+        - semantic_context: 语义缓存中除 system prompt 外必须完全一致的上下文（如检索文档、代码）.
+        - deadline_seconds: 本次调用的截止秒数，默认取实例设置.
+
+        返回:
+        - 模型生成的响应内容字符串.
+
+        异常:
+        - LlmError: 重试后仍失败或超过截止时间.
+        """
+        deadline = self._deadline(deadline_seconds)
+
+        # 添加用户的消息到对话历史中，超出预算时按历史策略压缩
+        self.messages.append({"role": "user", "content": s})
+        self._compact_history(deadline)
+
+        # 相同或相似的请求命中缓存时直接返回，不调用API
+        hit, reply_content, reasoning_content, pending = self._lookup_cache(
+            s if semantic_text is None else semantic_text, semantic_context
+        )
+        if hit:
+            return self._remember(reply_content, reasoning_content)
+
+        def request():
+            return self._retry(deadline, lambda: hedged_call(
+                lambda: self._complete(deadline), self._hedge_delay("complete"), deadline.remaining()
+            ))
+
+        try:
+            # 可缓存的请求与并发的相同请求合并为一次API调用
+            flight_key = pending[0] if pending else None
+            if flight_key is None:
+                (reply_content, reasoning_content), shared = request(), False
+            else:
+                (reply_content, reasoning_content), shared = _LLM_FLIGHT.do(
+                    flight_key, request, timeout=deadline.remaining()
+                )
+        except LlmError:
+            raise
         except Exception as e:
-            # 捕获异常并返回错误消息
-            return f"调用 ChatCompletion API 时出错: {str(e)}"
+            raise translate_error(e) from e
+
+        # 获取模型的回复内容（共享其他调用方的结果时，缓存已由领头者写入）
+        return self._remember(reply_content, reasoning_content, None if shared else pending)
+
+    def chat_stream(self, s: str, semantic_text: str = None, semantic_context: str = None,
+                    deadline_seconds: float = None):
+        """
+        以流式方式发送用户消息，逐段返回模型输出（stream=True）.
+
+        回答正文以 str 返回；推理内容以 ReasoningDelta 返回，调用方可用 isinstance 区分。
+        流结束后完整回复和推理内容会写入对话历史，与 chat 一致。
+        首个token到达之前的失败会按 chat 的方式重试（及对冲）；已经输出内容后失败则直接抛出异常.
+
+        参数:
+        - s: 用户输入的字符串.
+        - semantic_text: 语义缓存中参与相似度比较的文本，默认为 s.
+        - semantic_context: 语义缓存中除 system prompt 外必须完全一致的上下文（如检索文档、代码）.
+        - deadline_seconds: 本次调用的截止秒数（到生成结束为止），默认取实例设置.
+
+        返回:
+        - 生成器，逐个产生文本片段.
+
+        异常:
+        - LlmError: 请求失败或超过截止时间（迭代时抛出）.
+        """
+        deadline = self._deadline(deadline_seconds)
+
+        self.messages.append({"role": "user", "content": s})
+        self._compact_history(deadline)
+
+        hit, reply_content, reasoning_content, pending = self._lookup_cache(
+            s if semantic_text is None else semantic_text, semantic_context
+        )
+        if hit:
+            if reasoning_content:
+                yield ReasoningDelta(reasoning_content)
+            yield reply_content
+            self._remember(reply_content, reasoning_content)
+            return
+
+        # 相同请求正在由其他调用方流式生成时，等待其完整结果后一次性返回
+        flight_key = pending[0] if pending else None
+        leader, future = _LLM_FLIGHT.begin(flight_key) if flight_key else (True, None)
+        if not leader:
+            try:
+                reply_content, reasoning_content = future.result(deadline.remaining())
+            except LlmError:
+                raise
+            except Exception as e:
+                raise translate_error(e) from e
+            if reasoning_content:
+                yield ReasoningDelta(reasoning_content)
+            yield reply_content
+            self._remember(reply_content, reasoning_content)
+            return
+
+        reply_parts, reasoning_parts = [], []
+        completed, error = False, None
+        try:
+            try:
+                resources, received, chunks = self._retry(deadline, lambda: hedged_call(
+                    lambda: self._open_stream(deadline), self._hedge_delay("stream"), deadline.remaining(),
+                    discard=lambda opened: opened[0].close()
+                ))
+                with resources:
+                    for chunk in chain(received, chunks):
+                        deadline.check()
+                        # 最后一个数据块只包含 usage
+                        self._record_usage(getattr(chunk, 'usage', None))
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        reasoning = getattr(delta, 'reasoning_content', None)
+                        if reasoning:
+                            reasoning_parts.append(reasoning)
+                            yield ReasoningDelta(reasoning)
+                        if delta.content:
+                            reply_parts.append(delta.content)
+                            yield delta.content
+                completed = True
+            except LlmError as e:
+                error = e
+                raise
+            except Exception as e:
+                error = translate_error(e)
+                raise error from e
+        finally:
+            # 把结果（或失败原因）交给等待同一请求的调用方；生成器被提前关闭时也要通知
+            if future is not None:
+                if completed:
+                    _LLM_FLIGHT.finish(flight_key, future,
+                                       ("".join(reply_parts), "".join(reasoning_parts) if reasoning_parts else None))
+                else:
+                    _LLM_FLIGHT.finish(flight_key, future, error=error or LlmError("流式响应在完成前被中断"))
+
+        self._remember("".join(reply_parts), "".join(reasoning_parts) if reasoning_parts else None, pending)
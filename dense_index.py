@@ -0,0 +1,277 @@
+"""稠密向量检索模块
+
+LsaEmbedder: 基于TF-IDF + TruncatedSVD（LSA）的本地CPU嵌入模型，可离线运行。
+DenseIndex: 把所有段落向量存放在一个连续的float32矩阵中，
+一次矩阵乘法完成（批量）查询打分，用argpartition选出top-k。
+"""
+
+import json
+import os
+from collections import Counter
+from typing import List, Tuple, Dict, Any
+
+import numpy as np
+from scipy import sparse
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from text_processing import tokenize
+
+
+def save_npy(path: str, array: np.ndarray):
+    """
+    先写临时文件再原子替换为 .npy
+
+    其他进程可能正以内存映射方式读取旧文件，直接覆盖写会截断其映射；
+    替换后旧读者继续看到旧快照。
+    """
+    directory, name = os.path.split(path)
+    tmp_path = os.path.join(directory, f".{name}.tmp-{os.getpid()}")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, path)
+
+
+def l2_normalize(vectors: np.ndarray) -> np.ndarray:
+    """按行做L2归一化，零向量保持为零"""
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class LsaEmbedder:
+    def __init__(self, dim: int = 256, min_df: int = 1, max_features: int = None, random_state: int = 42):
+        """
+        初始化LSA嵌入模型
+
+        Args:
+            dim: 目标向量维度（不超过语料词表大小-1）
+            min_df: 词元最少出现的文档数
+            max_features: 词表上限，None表示不限制
+            random_state: SVD随机种子，保证重复构建结果一致
+        """
+        self.dim = dim
+        self.min_df = min_df
+        self.max_features = max_features
+        self.random_state = random_state
+        self.vocabulary: Dict[str, int] = {}
+        self.idf = None         # (vocab_size,) IDF权重
+        self.components = None  # (dim, vocab_size) 投影矩阵
+
+    @property
+    def output_dim(self) -> int:
+        return 0 if self.components is None else self.components.shape[0]
+
+    def fit(self, texts: List[str]) -> "LsaEmbedder":
+        """
+        在语料上训练TF-IDF词表和SVD投影
+
+        Args:
+            texts: 训练文本列表
+
+        Returns:
+            模型自身
+        """
+        vectorizer = TfidfVectorizer(
+            tokenizer=tokenize,
+            lowercase=False,
+            token_pattern=None,
+            sublinear_tf=True,
+            min_df=self.min_df,
+            max_features=self.max_features,
+            dtype=np.float32
+        )
+        tfidf = vectorizer.fit_transform(texts)
+        n_components = max(1, min(self.dim, tfidf.shape[0] - 1, tfidf.shape[1] - 1))
+        svd = TruncatedSVD(n_components=n_components, random_state=self.random_state)
+        svd.fit(tfidf)
+        self.vocabulary = {term: int(i) for term, i in vectorizer.vocabulary_.items()}
+        self.idf = np.ascontiguousarray(vectorizer.idf_, dtype=np.float32)
+        self.components = np.ascontiguousarray(svd.components_, dtype=np.float32)
+        return self
+
+    def transform_tfidf(self, texts: List[str]) -> sparse.csr_matrix:
+        """
+        按训练好的词表计算TF-IDF（次线性词频、L2归一化，与训练时一致）
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (len(texts), vocab_size) 的稀疏矩阵
+        """
+        rows, cols, values = [], [], []
+        for row, text in enumerate(texts):
+            counts = Counter(self.vocabulary[token] for token in tokenize(text) if token in self.vocabulary)
+            for col, tf in counts.items():
+                rows.append(row)
+                cols.append(col)
+                values.append(tf)
+
+        tf = np.asarray(values, dtype=np.float32)
+        cols = np.asarray(cols, dtype=np.int64)
+        data = (1 + np.log(tf)) * self.idf[cols] if len(tf) else tf
+        matrix = sparse.csr_matrix((data, (rows, cols)), shape=(len(texts), len(self.vocabulary)), dtype=np.float32)
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.diags(1 / norms).dot(matrix).tocsr()
+
+    def covers(self, text: str) -> bool:
+        """
+        判断文本的每个词元是否都在词表中
+
+        不在词表中的词元编码时被丢弃，只比较剩余词元的向量会把意思不同的文本判为相似。
+
+        Args:
+            text: 输入文本
+
+        Returns:
+            文本至少有一个词元且全部在词表中时为True
+        """
+        tokens = tokenize(text)
+        return bool(tokens) and all(token in self.vocabulary for token in tokens)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        把文本编码为L2归一化的float32向量
+
+        Args:
+            texts: 文本列表
+
+        Returns:
+            (len(texts), output_dim) 的float32矩阵
+        """
+        if self.components is None:
+            raise RuntimeError("LsaEmbedder尚未训练，请先调用fit()")
+        vectors = np.asarray(self.transform_tfidf(texts) @ self.components.T, dtype=np.float32)
+        return l2_normalize(vectors)
+
+    def config(self) -> Dict[str, Any]:
+        """返回决定模型输出的配置，用于判断持久化的模型是否过期"""
+        return {
+            "model_name": "lsa",
+            "dim": self.dim,
+            "min_df": self.min_df,
+            "max_features": self.max_features,
+            "random_state": self.random_state
+        }
+
+    def save(self, directory: str):
+        """
+        把模型保存为 vocabulary.json + idf.npy + components.npy（不使用pickle）
+
+        Args:
+            directory: 保存目录
+        """
+        tmp_path = os.path.join(directory, f".vocabulary.json.tmp-{os.getpid()}")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.vocabulary, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, 'vocabulary.json'))
+        save_npy(os.path.join(directory, 'idf.npy'), self.idf)
+        save_npy(os.path.join(directory, 'components.npy'), self.components)
+
+    @classmethod
+    def load(cls, directory: str, config: Dict[str, Any], mmap_mode: str = "r") -> "LsaEmbedder":
+        """
+        从目录加载模型，投影矩阵以内存映射方式打开
+
+        Args:
+            directory: 模型目录
+            config: save时 config() 的返回值
+            mmap_mode: np.load 的 mmap_mode
+
+        Returns:
+            LsaEmbedder实例
+        """
+        embedder = cls(
+            dim=config["dim"],
+            min_df=config["min_df"],
+            max_features=config["max_features"],
+            random_state=config["random_state"]
+        )
+        with open(os.path.join(directory, 'vocabulary.json'), 'r', encoding='utf-8') as f:
+            embedder.vocabulary = json.load(f)
+        embedder.idf = np.load(os.path.join(directory, 'idf.npy'), mmap_mode=mmap_mode)
+        embedder.components = np.load(os.path.join(directory, 'components.npy'), mmap_mode=mmap_mode)
+        return embedder
+
+
+class DenseIndex:
+    def __init__(self, embeddings: np.ndarray, excluded_ids: np.ndarray = None):
+        """
+        初始化稠密索引
+
+        Args:
+            embeddings: (n, dim) 的L2归一化向量矩阵
+            excluded_ids: 已删除（墓碑化）的行号，检索时排除
+        """
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if excluded_ids is None:
+            excluded_ids = np.zeros(0, dtype=np.int64)
+        self.excluded_ids = np.asarray(excluded_ids, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return self.embeddings.shape[0]
+
+    def score(self, query_vectors: np.ndarray) -> np.ndarray:
+        """
+        计算查询与全部段落的余弦相似度
+
+        Args:
+            query_vectors: (dim,) 或 (n_queries, dim) 的归一化查询向量
+
+        Returns:
+            (n_queries, n) 的相似度矩阵
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        return queries @ self.embeddings.T
+
+    def search(self, query_vectors: np.ndarray, top_k: int = 10,
+               batch_size: int = 256) -> List[List[Tuple[int, float]]]:
+        """
+        批量检索最相似的段落
+
+        查询按 batch_size 分块做矩阵乘法，避免一次生成过大的分数矩阵。
+
+        Args:
+            query_vectors: (dim,) 或 (n_queries, dim) 的归一化查询向量
+            top_k: 每个查询返回的结果数量
+            batch_size: 每次矩阵乘法处理的查询数
+
+        Returns:
+            每个查询一个 (段落编号, 相似度) 列表，按相似度降序
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        top_k = min(top_k, len(self) - len(self.excluded_ids))
+        if top_k <= 0:
+            return [[] for _ in range(queries.shape[0])]
+
+        results = []
+        for start in range(0, queries.shape[0], batch_size):
+            scores = self.score(queries[start:start + batch_size])
+            if len(self.excluded_ids):
+                scores[:, self.excluded_ids] = -np.inf
+            results.extend(top_k_rows(scores, top_k))
+        return results
+
+
+def top_k_rows(scores: np.ndarray, top_k: int) -> List[List[Tuple[int, float]]]:
+    """
+    对分数矩阵逐行选出前top_k项
+
+    Args:
+        scores: (n_queries, n) 分数矩阵
+        top_k: 每行返回数量（不超过n）
+
+    Returns:
+        每行一个 (列下标, 分数) 列表，按分数降序
+    """
+    candidates = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+    order = np.argsort(-candidate_scores, axis=1, kind='stable')
+    candidates = np.take_along_axis(candidates, order, axis=1)
+    candidate_scores = np.take_along_axis(candidate_scores, order, axis=1)
+    return [
+        [(int(i), float(s)) for i, s in zip(row_ids, row_scores)]
+        for row_ids, row_scores in zip(candidates, candidate_scores)
+    ]
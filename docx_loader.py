@@ -0,0 +1,409 @@
+"""docx文档加载模块
+
+从 documents/real 和 documents/fake 读取docx文档（优先直接流式解析 word/document.xml，
+不支持的结构回退到python-docx），
+按句子边界切分为带重叠的文本块，输出与 json/*.json 中 documents 条目相同结构的记录。
+"""
+
+import os
+import re
+import uuid
+import zipfile
+from typing import List, Dict, Any, Optional, Iterator
+from xml.etree import ElementTree
+
+from docx import Document
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+
+def make_uid(document_name: str, text: str) -> str:
+    """
+    根据文档键和文本内容生成uuid3风格的段落编号
+
+    相同内容总是得到相同编号，可直接作为内容哈希使用。
+
+    Args:
+        document_name: 文档键（文件相对集合根目录的路径，见 load_document_records）
+        text: 段落文本
+
+    Returns:
+        uid字符串
+    """
+    return str(uuid.uuid3(uuid.NAMESPACE_URL, f"{document_name}\n{text}"))
+
+
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class UnsupportedDocxError(Exception):
+    """流式解析遇到不支持的结构，需要回退到python-docx"""
+
+
+def _heading_level_from_name(style_name: Optional[str]) -> Optional[int]:
+    """根据样式名返回标题级别，Title记为0，正文返回None（样式名不区分大小写）"""
+    style_name = (style_name or "").lower()
+    if style_name == "title":
+        return 0
+    if style_name.startswith("heading"):
+        level = style_name[len("heading"):].strip()
+        return int(level) if level.isdigit() else 1
+    return None
+
+
+def _heading_level(paragraph: Paragraph) -> Optional[int]:
+    """返回段落的标题级别，Title记为0，正文返回None"""
+    return _heading_level_from_name(paragraph.style.name if paragraph.style is not None else None)
+
+
+def _iter_paragraphs_docx(path: str) -> Iterator[Dict[str, Any]]:
+    """用python-docx按正文顺序提取段落和表格行（兼容路径）"""
+    doc = Document(path)
+
+    for child in doc.element.body.iterchildren():
+        tag = child.tag.rsplit('}', 1)[-1]
+        if tag == 'p':
+            paragraph = Paragraph(child, doc)
+            text = paragraph.text.strip()
+            if text:
+                yield {"text": text, "heading_level": _heading_level(paragraph)}
+        elif tag == 'tbl':
+            for row in Table(child, doc).rows:
+                cells = [cell.text.strip() for cell in row.cells]
+                if any(cells):
+                    yield {"text": " | ".join(cells), "heading_level": None, "cells": cells}
+
+
+def _read_style_names(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """读取 word/styles.xml 中 样式ID -> 样式名 的映射"""
+    try:
+        data = archive.read('word/styles.xml')
+    except KeyError:
+        return {}
+    names = {}
+    for style in ElementTree.fromstring(data).iter(f'{_W}style'):
+        name = style.find(f'{_W}name')
+        if name is not None:
+            names[style.get(f'{_W}styleId')] = name.get(f'{_W}val')
+    return names
+
+
+def _run_text(run) -> str:
+    """按python-docx的规则把 w:r 转换为文本"""
+    parts = []
+    for child in run:
+        tag = child.tag
+        if tag == f'{_W}t':
+            parts.append(child.text or "")
+        elif tag in (f'{_W}tab', f'{_W}ptab'):
+            parts.append("\t")
+        elif tag == f'{_W}br':
+            parts.append("\n" if child.get(f'{_W}type', 'textWrapping') == 'textWrapping' else "")
+        elif tag == f'{_W}cr':
+            parts.append("\n")
+        elif tag == f'{_W}noBreakHyphen':
+            parts.append("-")
+    return "".join(parts)
+
+
+def _paragraph_text(paragraph) -> str:
+    """拼接段落中直接的 w:r 和 w:hyperlink 的文本"""
+    parts = []
+    for child in paragraph:
+        if child.tag == f'{_W}r':
+            parts.append(_run_text(child))
+        elif child.tag == f'{_W}hyperlink':
+            parts.extend(_run_text(run) for run in child.iterfind(f'{_W}r'))
+    return "".join(parts)
+
+
+def _paragraph_style(paragraph) -> Optional[str]:
+    style = paragraph.find(f'{_W}pPr/{_W}pStyle')
+    return style.get(f'{_W}val') if style is not None else None
+
+
+def _table_rows(table) -> Iterator[List[str]]:
+    """
+    逐行返回表格的单元格文本，与python-docx的 _Row.cells 一致：
+    横向合并的单元格按跨越的列数重复，纵向合并的后续单元格取上方单元格的文本
+    """
+    above: Dict[int, str] = {}
+    for row in table.iterfind(f'{_W}tr'):
+        grid_before = row.find(f'{_W}trPr/{_W}gridBefore')
+        column = int(grid_before.get(f'{_W}val')) if grid_before is not None else 0
+        cells, current = [], {}
+        for cell in row.iterfind(f'{_W}tc'):
+            properties = cell.find(f'{_W}tcPr')
+            span, merge = 1, None
+            if properties is not None:
+                grid_span = properties.find(f'{_W}gridSpan')
+                if grid_span is not None:
+                    span = int(grid_span.get(f'{_W}val'))
+                v_merge = properties.find(f'{_W}vMerge')
+                if v_merge is not None:
+                    merge = v_merge.get(f'{_W}val', 'continue')
+            if merge == 'continue':
+                if column not in above:
+                    raise UnsupportedDocxError("纵向合并单元格缺少上方单元格")
+                text = above[column]
+            else:
+                text = "\n".join(_paragraph_text(p) for p in cell.iterfind(f'{_W}p'))
+            for offset in range(span):
+                current[column + offset] = text
+                cells.append(text)
+            column += span
+        above = current
+        yield cells
+
+
+def iter_paragraphs_streaming(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    直接流式解析docx压缩包中的 word/document.xml，不构建python-docx对象树
+
+    用iterparse逐个处理正文的顶层段落/表格，处理完即从树中移除，内存占用与文档大小无关。
+
+    Args:
+        path: docx文件路径
+
+    Yields:
+        与 extract_paragraphs 相同结构的段落字典
+
+    Raises:
+        UnsupportedDocxError: 文档结构不在快速路径支持范围内
+    """
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise UnsupportedDocxError(str(e))
+
+    with archive:
+        style_names = _read_style_names(archive)
+        try:
+            stream = archive.open('word/document.xml')
+        except KeyError:
+            raise UnsupportedDocxError("缺少 word/document.xml")
+
+        with stream:
+            depth = 0
+            body = None
+            try:
+                for event, element in ElementTree.iterparse(stream, events=('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if depth == 1 and element.tag != f'{_W}document':
+                            raise UnsupportedDocxError(f"不支持的根元素: {element.tag}")
+                        if depth == 2 and element.tag == f'{_W}body':
+                            body = element
+                        continue
+
+                    depth -= 1
+                    if depth != 2 or body is None:
+                        continue
+                    if element.tag == f'{_W}p':
+                        text = _paragraph_text(element).strip()
+                        if text:
+                            style_id = _paragraph_style(element)
+                            yield {"text": text, "heading_level": _heading_level_from_name(style_names.get(style_id))}
+                    elif element.tag == f'{_W}tbl':
+                        for cells in _table_rows(element):
+                            cells = [cell.strip() for cell in cells]
+                            if any(cells):
+                                yield {"text": " | ".join(cells), "heading_level": None, "cells": cells}
+                    body.remove(element)
+            except ElementTree.ParseError as e:
+                raise UnsupportedDocxError(str(e))
+
+
+def iter_paragraphs(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    按正文顺序逐个返回docx中的段落和表格行
+
+    优先使用流式解析；遇到不支持的结构时丢弃已解析的部分，改用python-docx从头解析整个文档。
+    流式解析完整个文档后才开始返回（只缓存提取出的文本，XML仍逐个元素释放），
+    同一文档的结果不会混合两种解析方式，也就不会因两者的切分差异而重复或遗漏内容。
+
+    Args:
+        path: docx文件路径
+
+    Yields:
+        段落字典，包含 text 和 heading_level（正文为None）；
+        表格的每一行以“ | ”连接单元格作为 text，并在 cells 中给出各单元格文本
+    """
+    try:
+        paragraphs = list(iter_paragraphs_streaming(path))
+    except UnsupportedDocxError as e:
+        print(f"流式解析 {path} 失败，改用python-docx: {e}")
+        paragraphs = _iter_paragraphs_docx(path)
+    yield from paragraphs
+
+
+def extract_paragraphs(path: str) -> List[Dict[str, Any]]:
+    """
+    按正文顺序提取docx中的段落和表格
+
+    Args:
+        path: docx文件路径
+
+    Returns:
+        段落列表，每项包含 text 和 heading_level（正文为None），
+        表格的每一行以“ | ”连接单元格后作为一个段落
+    """
+    return list(iter_paragraphs(path))
+
+
+# 句末标点（含中文全角标点），其后紧跟的右引号/右括号归入同一句
+_SENTENCE_BOUNDARY = re.compile(r'((?:[。！？；!?;…]|\.(?=\s|$))+[”’"」』）)]*|\n+)')
+
+
+def split_sentences(text: str) -> List[str]:
+    """
+    按中英文句末标点把文本切分为句子，标点保留在句尾
+
+    Args:
+        text: 段落文本
+
+    Returns:
+        句子列表，拼接后与原文一致（去掉了空白句）
+    """
+    parts = _SENTENCE_BOUNDARY.split(text)
+    sentences = []
+    for i in range(0, len(parts), 2):
+        sentence = parts[i] + (parts[i + 1] if i + 1 < len(parts) else '')
+        if sentence.strip():
+            sentences.append(sentence)
+    return sentences
+
+
+def _split_long_sentence(sentence: str, chunk_size: int, chunk_overlap: int) -> List[str]:
+    """把超过 chunk_size 的单句按固定窗口切开，窗口之间重叠 chunk_overlap 个字符"""
+    step = max(1, chunk_size - chunk_overlap)
+    pieces = []
+    for start in range(0, len(sentence), step):
+        pieces.append(sentence[start:start + chunk_size])
+        if start + chunk_size >= len(sentence):
+            break
+    return pieces
+
+
+def chunk_paragraphs(paragraphs: List[Dict[str, Any]], chunk_size: int = 200,
+                     chunk_overlap: int = 50) -> List[str]:
+    """
+    把段落切分为带重叠的文本块，只在句子边界处断开
+
+    标题开启一个新块（不与上一节重叠，连续标题合并）；块长度即将超过 chunk_size 时另起一块，
+    新块以上一块末尾总长不超过 chunk_overlap 的若干整句开头。
+
+    Args:
+        paragraphs: extract_paragraphs 的输出
+        chunk_size: 单个文本块的最大字符数
+        chunk_overlap: 相邻文本块重叠的最大字符数
+
+    Returns:
+        文本块列表
+    """
+    chunks = []
+    current: List[str] = []
+    num_fresh = 0  # current中尚未输出过的句子数，只含重叠句时不再输出
+    has_body = False  # 连续的标题合并到同一块，直到出现正文
+
+    def emit():
+        text = "".join(current).strip()
+        if num_fresh and text:
+            chunks.append(text)
+
+    for paragraph in paragraphs:
+        is_heading = paragraph["heading_level"] is not None
+        if is_heading and has_body:
+            emit()
+            current, num_fresh, has_body = [], 0, False
+        has_body = has_body or not is_heading
+
+        sentences = split_sentences(paragraph["text"])
+        if sentences:
+            sentences[-1] += "\n"
+        for sentence in sentences:
+            for piece in _split_long_sentence(sentence, chunk_size, chunk_overlap):
+                if num_fresh and sum(map(len, current)) + len(piece) > chunk_size:
+                    emit()
+                    carry = []
+                    for previous in reversed(current):
+                        if sum(map(len, carry)) + len(previous) > chunk_overlap:
+                            break
+                        carry.insert(0, previous)
+                    current, num_fresh = carry, 0
+                while current and sum(map(len, current)) + len(piece) > chunk_size:
+                    current.pop(0)
+                current.append(piece)
+                num_fresh += 1
+
+    if current:
+        emit()
+    return chunks
+
+
+def list_docx_files(directories: List[str]) -> List[str]:
+    """按文件名排序列出若干目录下的docx文件（忽略Word临时文件）"""
+    files = []
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.docx') and not filename.startswith('~$'):
+                files.append(os.path.join(directory, filename))
+    return files
+
+
+def collection_root(directories: List[str]) -> str:
+    """返回若干文档目录的公共根目录（段落uid相对它生成）"""
+    if not directories:
+        return os.getcwd()
+    return os.path.commonpath([os.path.abspath(directory) for directory in directories])
+
+
+def load_document_records(path: str, chunk_size: int = 200, chunk_overlap: int = 50,
+                          root: str = None) -> List[Dict[str, Any]]:
+    """
+    加载单个docx文档为检索记录
+
+    Args:
+        path: docx文件路径
+        chunk_size: 单个文本块的最大字符数
+        chunk_overlap: 相邻文本块重叠的最大字符数
+        root: 集合根目录，段落uid按文件相对它的路径生成（不同目录下的同名文件互不冲突）；
+            默认为文件所在目录
+
+    Returns:
+        记录列表，结构与 json/*.json 中的 documents 条目一致
+    """
+    document_name = os.path.basename(path)
+    document_key = os.path.relpath(path, root or os.path.dirname(path)).replace(os.sep, '/')
+    records = []
+    for text in chunk_paragraphs(extract_paragraphs(path), chunk_size, chunk_overlap):
+        records.append({
+            "text": text,
+            "metadata": {
+                "document_display_name": document_name,
+                "document_source": path,
+            },
+            "uid": make_uid(document_key, text)
+        })
+    return records
+
+
+def load_corpus(directories: List[str], chunk_size: int = 200, chunk_overlap: int = 50) -> List[Dict[str, Any]]:
+    """
+    加载多个目录下的全部docx文档
+
+    Args:
+        directories: 文档目录列表
+        chunk_size: 单个文本块的最大字符数
+        chunk_overlap: 相邻文本块重叠的最大字符数
+
+    Returns:
+        所有文档的记录列表
+    """
+    records = []
+    root = collection_root(directories)
+    for path in list_docx_files(directories):
+        records.extend(load_document_records(path, chunk_size, chunk_overlap, root))
+    return records
@@ -0,0 +1,340 @@
+"""内存映射向量存储模块
+
+把一个向量集合持久化为一个 manifest.json、嵌入模型文件和若干段（segment）目录：
+
+    manifest.json        版本头、段落数量、段列表、嵌入模型配置、语料指纹、文档列表
+    segments/<段名>/
+        embeddings.npy   (k, dim) float32 段落向量
+        offsets.npy      (k + 1,) int64 段落文本在本段 texts.bin 中的字节偏移
+        ids.npy          (k,) 段落uid（定长ASCII）
+        doc_index.npy    (k,) int32 段落所属文档在 manifest["documents"] 中的下标
+        texts.bin        本段段落文本的UTF-8拼接
+        removed.npy      (m,) int64 本段提交时标记为墓碑的全局行号（段落随源文件修改或删除而失效）
+
+全局行号按段的顺序连续编号。段目录写完后不再修改：全量构建写入一个段，
+增量索引把新段落和新墓碑写成一个新段，耗时只与变化量有关；manifest最后原子替换，作为提交标记，
+已映射旧段的其他进程继续读取旧快照。段数超过上限时把全部段合并为一个段。
+
+加载时全部用 np.load(mmap_mode="r") 打开，不做反序列化，
+多个Streamlit进程打开同一份存储时由操作系统共享页缓存。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from dense_index import LsaEmbedder
+
+STORE_FORMAT = "rag-embedding-store"
+STORE_FORMAT_VERSION = 3
+MANIFEST_FILE = "manifest.json"
+SEGMENTS_DIR = "segments"
+
+
+def settings_fingerprint(settings: Dict[str, Any]) -> str:
+    """
+    计算影响切分/嵌入的配置指纹，配置变化时存储需要全量重建
+
+    Args:
+        settings: 影响存储内容的配置
+
+    Returns:
+        sha1十六进制字符串
+    """
+    return hashlib.sha1(json.dumps(settings, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _write_manifest(directory: str, manifest: Dict[str, Any]):
+    tmp_path = os.path.join(directory, f".{MANIFEST_FILE}.tmp-{os.getpid()}")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, os.path.join(directory, MANIFEST_FILE))
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, Any]]:
+    """读取manifest，不存在或损坏时返回None"""
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_store_current(manifest: Optional[Dict[str, Any]], fingerprint: str) -> bool:
+    """判断已有存储是否可直接使用（版本头一致且配置指纹未变）"""
+    return (
+        manifest is not None
+        and manifest.get("format") == STORE_FORMAT
+        and manifest.get("format_version") == STORE_FORMAT_VERSION
+        and manifest.get("settings_fingerprint") == fingerprint
+    )
+
+
+def _encode_records(records: List[Dict[str, Any]], documents: List[Dict[str, str]]):
+    """
+    把记录转换为文档下标和UTF-8文本，新出现的文档追加到 documents
+
+    文档按来源路径区分，不同目录下的同名文件是不同的文档。
+
+    Returns:
+        (doc_index数组, 编码后的文本列表)
+    """
+    positions = {document["source"]: i for i, document in enumerate(documents)}
+    doc_index = np.empty(len(records), dtype=np.int32)
+    encoded_texts = []
+    for i, record in enumerate(records):
+        metadata = record.get('metadata', {})
+        source = metadata.get('document_source', '')
+        if source not in positions:
+            positions[source] = len(documents)
+            documents.append({"name": metadata.get('document_display_name', 'Unknown Document'), "source": source})
+        doc_index[i] = positions[source]
+        encoded_texts.append(record.get('text', '').encode('utf-8'))
+    return doc_index, encoded_texts
+
+
+def _segment_path(directory: str, name: str) -> str:
+    return os.path.join(directory, SEGMENTS_DIR, name)
+
+
+def _write_segment(directory: str, name: str, embeddings: np.ndarray, ids: np.ndarray, doc_index: np.ndarray,
+                   encoded_texts: List[bytes], removed_rows: np.ndarray) -> Dict[str, Any]:
+    """
+    在临时目录写好一个段后整体改名为 segments/<name>
+
+    Returns:
+        manifest["segments"] 中该段的条目
+    """
+    segments_dir = os.path.join(directory, SEGMENTS_DIR)
+    os.makedirs(segments_dir, exist_ok=True)
+    tmp_dir = os.path.join(segments_dir, f".{name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    offsets = np.zeros(len(encoded_texts) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(text) for text in encoded_texts])
+    with open(os.path.join(tmp_dir, 'texts.bin'), 'wb') as f:
+        for text in encoded_texts:
+            f.write(text)
+    np.save(os.path.join(tmp_dir, 'embeddings.npy'), np.ascontiguousarray(embeddings, dtype=np.float32))
+    np.save(os.path.join(tmp_dir, 'offsets.npy'), offsets)
+    np.save(os.path.join(tmp_dir, 'ids.npy'), np.asarray(ids, dtype='S36'))
+    np.save(os.path.join(tmp_dir, 'doc_index.npy'), np.asarray(doc_index, dtype=np.int32))
+    np.save(os.path.join(tmp_dir, 'removed.npy'), np.unique(np.asarray(removed_rows, dtype=np.int64)))
+    os.replace(tmp_dir, _segment_path(directory, name))
+    return {"name": name, "count": len(encoded_texts)}
+
+
+def _remove_segments(directory: str, names: List[str]):
+    """删除已不在manifest中的段（已映射这些文件的进程仍可继续读取）"""
+    for name in names:
+        shutil.rmtree(_segment_path(directory, name), ignore_errors=True)
+
+
+def _segment_name(version: int) -> str:
+    """段名：版本号加随机后缀，重建或并发写入时不会与已有的段重名"""
+    return f"{version:06d}-{uuid.uuid4().hex[:8]}"
+
+
+def save_store(directory: str, records: List[Dict[str, Any]], embeddings: np.ndarray,
+               embedder: LsaEmbedder, fingerprint: str, files: Dict[str, Dict[str, Any]]):
+    """
+    把段落记录、向量和嵌入模型写入存储目录（全量，写成一个段）
+
+    manifest最后写入，作为整份存储的提交标记；之后删除旧manifest中的段。
+
+    Args:
+        directory: 存储目录
+        records: 段落记录（json/*.json 中 documents 条目的结构）
+        embeddings: (len(records), dim) 的段落向量
+        embedder: 生成这些向量的嵌入模型
+        fingerprint: settings_fingerprint 的结果
+        files: 源文件清单（见 index_manifest）
+    """
+    os.makedirs(directory, exist_ok=True)
+    previous = read_manifest(directory) or {}
+
+    documents: List[Dict[str, str]] = []
+    doc_index, encoded_texts = _encode_records(records, documents)
+    ids = np.asarray([record.get('uid', '') for record in records], dtype='S36')
+    segment = _write_segment(directory, _segment_name(1), embeddings, ids, doc_index, encoded_texts,
+                             np.zeros(0, dtype=np.int64))
+    embedder.save(directory)
+
+    _write_manifest(directory, {
+        "format": STORE_FORMAT,
+        "format_version": STORE_FORMAT_VERSION,
+        "created_at": datetime.now().isoformat(timespec='seconds'),
+        "version": 1,
+        "count": len(records),
+        "dim": int(embeddings.shape[1]) if embeddings.ndim == 2 else 0,
+        "segments": [segment],
+        "embedder": embedder.config(),
+        "settings_fingerprint": fingerprint,
+        "documents": documents,
+        "files": files
+    })
+    _remove_segments(directory, [old["name"] for old in previous.get("segments", []) if old["name"] != segment["name"]])
+
+
+def _merge_segments(directory: str, manifest: Dict[str, Any], name: str) -> Dict[str, Any]:
+    """把manifest中的全部段合并为一个新段（行号和墓碑保持不变）"""
+    segments = [_open_segment(directory, segment) for segment in manifest["segments"]]
+    encoded_texts = []
+    for segment in segments:
+        texts, offsets = segment["texts"], segment["offsets"]
+        encoded_texts.extend(texts[offsets[i]:offsets[i + 1]].tobytes() for i in range(len(offsets) - 1))
+    return _write_segment(
+        directory, name,
+        np.concatenate([segment["embeddings"] for segment in segments]).reshape(-1, manifest["dim"]),
+        np.concatenate([segment["ids"] for segment in segments]),
+        np.concatenate([segment["doc_index"] for segment in segments]),
+        encoded_texts,
+        np.concatenate([segment["removed"] for segment in segments])
+    )
+
+
+def append_store(directory: str, manifest: Dict[str, Any], records: List[Dict[str, Any]],
+                 embeddings: np.ndarray, removed_rows: List[int],
+                 files: Dict[str, Dict[str, Any]], max_segments: int = 16) -> Dict[str, Any]:
+    """
+    增量更新存储：把新段落和墓碑写成一个新段
+
+    已有的段不做任何修改，写入量只与新增段落数有关。
+    段数超过 max_segments 时把全部段合并为一个段（行号不变），之后删除被合并的段。
+
+    Args:
+        directory: 存储目录
+        manifest: 当前manifest
+        records: 新增的段落记录
+        embeddings: 新增段落的向量
+        removed_rows: 需要标记为墓碑的行号
+        files: 更新后的源文件清单
+        max_segments: 最多保留的段数
+
+    Returns:
+        更新后的manifest
+    """
+    version = manifest.get("version", 1) + 1
+    documents = [dict(document) for document in manifest["documents"]]
+    doc_index, encoded_texts = _encode_records(records, documents)
+    ids = np.asarray([record.get('uid', '') for record in records], dtype='S36')
+    segment = _write_segment(
+        directory, _segment_name(version),
+        np.asarray(embeddings, dtype=np.float32).reshape(-1, manifest["dim"]),
+        ids, doc_index, encoded_texts, np.asarray(removed_rows, dtype=np.int64)
+    )
+
+    manifest = dict(manifest)
+    manifest.update({
+        "updated_at": datetime.now().isoformat(timespec='seconds'),
+        "version": version,
+        "count": manifest["count"] + len(records),
+        "segments": manifest["segments"] + [segment],
+        "documents": documents,
+        "files": files
+    })
+
+    merged = []
+    if len(manifest["segments"]) > max_segments:
+        merged = [old["name"] for old in manifest["segments"]]
+        manifest["segments"] = [_merge_segments(directory, manifest, _segment_name(version))]
+    _write_manifest(directory, manifest)
+    _remove_segments(directory, merged)
+    return manifest
+
+
+def update_manifest(directory: str, fields: Dict[str, Any]):
+    """
+    在已有manifest中写入附加索引的信息（如IVF）
+
+    Args:
+        directory: 存储目录
+        fields: 需要合并到manifest顶层的字段
+    """
+    manifest = read_manifest(directory)
+    if manifest is None:
+        raise FileNotFoundError(f"存储目录缺少manifest: {directory}")
+    manifest.update(fields)
+    _write_manifest(directory, manifest)
+
+
+def _open_segment(directory: str, segment: Dict[str, Any]) -> Dict[str, np.ndarray]:
+    """以内存映射方式打开一个段的全部数组"""
+    path = _segment_path(directory, segment["name"])
+    texts_path = os.path.join(path, 'texts.bin')
+    if os.path.getsize(texts_path) > 0:
+        texts = np.memmap(texts_path, dtype=np.uint8, mode="r")
+    else:
+        texts = np.zeros(0, dtype=np.uint8)
+    opened = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode="r")
+              for name in ('embeddings', 'offsets', 'ids', 'doc_index', 'removed')}
+    opened["texts"] = texts
+    return opened
+
+
+def _concat(arrays: List[np.ndarray]) -> np.ndarray:
+    """只有一个段时直接返回其内存映射，否则拼接"""
+    return arrays[0] if len(arrays) == 1 else np.concatenate(arrays)
+
+
+class StoredRecords:
+    """按需从内存映射文件还原段落记录的只读序列"""
+
+    def __init__(self, directory: str, manifest: Dict[str, Any]):
+        self.documents = manifest["documents"]
+        self.segments = [_open_segment(directory, segment) for segment in manifest["segments"]]
+        # 每个段第一行的全局行号
+        self.starts = np.cumsum([0] + [len(segment["ids"]) for segment in self.segments])
+        self.ids = _concat([segment["ids"] for segment in self.segments])
+        self.doc_index = _concat([segment["doc_index"] for segment in self.segments])
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        for segment in self.segments:
+            self.alive[segment["removed"]] = False
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def text(self, i: int) -> str:
+        k = int(np.searchsorted(self.starts, i, side='right')) - 1
+        segment, j = self.segments[k], i - int(self.starts[k])
+        offsets = segment["offsets"]
+        return segment["texts"][offsets[j]:offsets[j + 1]].tobytes().decode('utf-8')
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        document = self.documents[self.doc_index[i]]
+        return {
+            "text": self.text(i),
+            "metadata": {
+                "document_display_name": document["name"],
+                "document_source": document["source"]
+            },
+            "uid": self.ids[i].decode('ascii')
+        }
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+def open_store(directory: str, manifest: Dict[str, Any]):
+    """
+    以内存映射方式打开存储
+
+    Args:
+        directory: 存储目录
+        manifest: read_manifest 的结果（调用方已用 is_store_current 校验）
+
+    Returns:
+        (StoredRecords, 向量矩阵, LsaEmbedder)；只有一个段时向量矩阵是memmap，多个段时拼接到内存中
+    """
+    records = StoredRecords(directory, manifest)
+    embeddings = _concat([segment["embeddings"] for segment in records.segments]).reshape(-1, manifest["dim"])
+    embedder = LsaEmbedder.load(directory, manifest["embedder"])
+    return records, embeddings, embedder
@@ -0,0 +1,177 @@
+"""SQLite FTS5 段落存储模块
+
+把各向量集合的段落保存到同一个SQLite数据库，供多个Streamlit进程共享查询：
+
+    collections  集合名 -> 已同步的存储版本
+    chunks       段落元数据（按 集合名 + uid 唯一），row_id 为段落在向量存储中的行号
+    chunks_fts   FTS5全文索引，内容为jieba分词后以空格连接的词元，rowid 与 chunks.id 对应
+
+写入由持有索引锁的进程完成（WAL模式，不阻塞读者）；
+查询时每个线程复用一个只读连接，用 bm25() 排序。
+"""
+
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    id INTEGER PRIMARY KEY,
+    collection TEXT NOT NULL,
+    uid TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    document_name TEXT NOT NULL,
+    document_source TEXT NOT NULL,
+    text TEXT NOT NULL,
+    UNIQUE (collection, uid)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(tokens, collection UNINDEXED);
+"""
+
+
+def build_match_query(query_tokens: List[str]) -> str:
+    """
+    把查询词元转换为FTS5的MATCH表达式（各词元以短语形式OR连接）
+
+    Args:
+        query_tokens: 查询词元列表
+
+    Returns:
+        MATCH表达式，没有词元时返回空字符串
+    """
+    terms = dict.fromkeys(token for token in query_tokens if token.strip())
+    return " OR ".join('"' + term.replace('"', '""') + '"' for term in terms)
+
+
+class FtsChunkStore:
+    def __init__(self, db_path: str):
+        """
+        初始化段落存储
+
+        Args:
+            db_path: SQLite数据库文件路径
+        """
+        self.db_path = db_path
+        self._local = threading.local()
+
+    def _connect_writer(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _reader(self) -> sqlite3.Connection:
+        """返回当前线程的只读连接（首次调用时打开）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            uri = "file:" + os.path.abspath(self.db_path) + "?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=30)
+            self._local.conn = conn
+        return conn
+
+    def version(self, collection: str) -> Optional[str]:
+        """返回集合已同步的存储版本，数据库或集合不存在时返回None"""
+        if not os.path.exists(self.db_path):
+            return None
+        try:
+            row = self._reader().execute(
+                "SELECT version FROM collections WHERE name = ?", (collection,)
+            ).fetchone()
+        except sqlite3.OperationalError:
+            return None
+        return row[0] if row else None
+
+    def sync(self, collection: str, version: str, rows: List[Tuple[int, Dict[str, Any], str]]) -> Dict[str, int]:
+        """
+        把集合的段落同步到数据库：按uid增删，保留未变化的段落
+
+        Args:
+            collection: 集合名称
+            version: 同步后记录的存储版本
+            rows: (行号, 段落记录, 空格连接的词元) 列表，只包含有效段落
+
+        Returns:
+            同步统计，包含 inserted / deleted / kept
+        """
+        conn = self._connect_writer()
+        try:
+            with conn:
+                existing = {
+                    uid: (chunk_id, row_id) for chunk_id, uid, row_id in conn.execute(
+                        "SELECT id, uid, row_id FROM chunks WHERE collection = ?", (collection,)
+                    )
+                }
+                wanted = {record["uid"]: (row_id, record, tokens) for row_id, record, tokens in rows}
+
+                stale = [(existing[uid][0],) for uid in existing.keys() - wanted.keys()]
+                conn.executemany("DELETE FROM chunks_fts WHERE rowid = ?", stale)
+                conn.executemany("DELETE FROM chunks WHERE id = ?", stale)
+
+                moved = [
+                    (wanted[uid][0], chunk_id) for uid, (chunk_id, row_id) in existing.items()
+                    if uid in wanted and wanted[uid][0] != row_id
+                ]
+                conn.executemany("UPDATE chunks SET row_id = ? WHERE id = ?", moved)
+
+                inserted = 0
+                for uid in wanted.keys() - existing.keys():
+                    row_id, record, tokens = wanted[uid]
+                    metadata = record.get('metadata', {})
+                    cursor = conn.execute(
+                        "INSERT INTO chunks (collection, uid, row_id, document_name, document_source, text) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (collection, uid, row_id, metadata.get('document_display_name', 'Unknown Document'),
+                         metadata.get('document_source', ''), record.get('text', ''))
+                    )
+                    conn.execute(
+                        "INSERT INTO chunks_fts (rowid, tokens, collection) VALUES (?, ?, ?)",
+                        (cursor.lastrowid, tokens, collection)
+                    )
+                    inserted += 1
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO collections (name, version, updated_at) VALUES (?, ?, ?)",
+                    (collection, version, datetime.now().isoformat(timespec='seconds'))
+                )
+        finally:
+            conn.close()
+        return {"inserted": inserted, "deleted": len(stale), "kept": len(existing) - len(stale)}
+
+    def search(self, collection: str, query_tokens: List[str], top_k: int = 10) -> List[Tuple[int, float, Dict[str, Any]]]:
+        """
+        用FTS5的 bm25() 检索集合中的段落
+
+        Args:
+            collection: 集合名称
+            query_tokens: 查询词元列表
+            top_k: 返回结果数量
+
+        Returns:
+            (行号, 分数, 段落记录) 列表，按分数降序（分数为 -bm25()，越大越相关）
+        """
+        match = build_match_query(query_tokens)
+        if not match or top_k <= 0:
+            return []
+        rows = self._reader().execute(
+            "SELECT c.row_id, -bm25(chunks_fts) AS score, c.uid, c.document_name, c.document_source, c.text "
+            "FROM chunks_fts JOIN chunks c ON c.id = chunks_fts.rowid "
+            "WHERE chunks_fts MATCH ? AND chunks_fts.collection = ? "
+            "ORDER BY bm25(chunks_fts) LIMIT ?",
+            (match, collection, top_k)
+        ).fetchall()
+        return [
+            (row_id, score, {
+                "text": text,
+                "metadata": {"document_display_name": name, "document_source": source},
+                "uid": uid
+            })
+            for row_id, score, uid, name, source, text in rows
+        ]
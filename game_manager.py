@@ -17,7 +17,12 @@ import os
 from typing import Dict, List, Any
 
 # 导入RAG后端
-from rag_backend import validate_rag_system, get_game_documents
+from rag_backend import validate_rag_system, get_game_documents, query_cache_stats
+from deepseek_utils import llm_flight_stats, rate_limiter_stats, resilience_stats
+from json_cache import cache_stats as json_cache_stats
+from llm_cache import get_response_cache
+from llm_http import connection_stats
+from semantic_cache import get_semantic_cache
 
 def create_admin_interface():
     """创建管理员界面"""
@@ -365,6 +370,102 @@ def show_system_health():
         with cols[i]:
             st.metric(metric, value)
     
+    # DeepSeek API 连接池（本进程）
+    st.subheader("🌐 DeepSeek连接池")
+    http_stats = connection_stats()
+    cols = st.columns(4)
+    cols[0].metric('API请求数', http_stats['requests'])
+    cols[1].metric('新建连接数', http_stats['connections_opened'])
+    cols[2].metric('连接复用率', f"{http_stats['reuse_ratio']:.0%}")
+    cols[3].metric('协议', 'HTTP/2' if http_stats['http2'] else 'HTTP/1.1')
+    
+    # DeepSeek调用限流（本进程）
+    st.subheader("🚦 DeepSeek调用限流")
+    limiter_stats = rate_limiter_stats()
+    cols = st.columns(5)
+    cols[0].metric('排队中', limiter_stats['queue_depth'])
+    cols[1].metric('进行中', f"{limiter_stats['in_flight']}/{limiter_stats['max_in_flight']}")
+    cols[2].metric('平均等待', f"{limiter_stats['avg_wait_seconds']:.2f}秒")
+    cols[3].metric('最长等待', f"{limiter_stats['max_wait_seconds']:.2f}秒")
+    cols[4].metric('排队超时', limiter_stats['timeouts'])
+    
+    # DeepSeek调用的重试、对冲请求和延迟
+    st.subheader("🔁 DeepSeek重试与对冲请求")
+    retry_stats = resilience_stats()
+    cols = st.columns(4)
+    cols[0].metric('重试次数', retry_stats['retries'])
+    cols[1].metric('对冲请求', retry_stats['hedges'])
+    cols[2].metric('对冲胜出', retry_stats['hedge_wins'])
+    cols[3].metric('超过截止时间', retry_stats['deadline_exceeded'])
+    if retry_stats['latency']:
+        latency_rows = [
+            {
+                '模型/类型': name,
+                '样本数': stats['samples'],
+                'p50（秒）': f"{stats['p50']:.2f}" if stats['p50'] is not None else '样本不足',
+                'p95（秒）': f"{stats['p95']:.2f}" if stats['p95'] is not None else '样本不足'
+            }
+            for name, stats in retry_stats['latency'].items()
+        ]
+        st.dataframe(pd.DataFrame(latency_rows), use_container_width=True, hide_index=True)
+    
+    # 检索结果缓存（本进程）
+    st.subheader("🔎 检索结果缓存")
+    search_cache_stats = query_cache_stats()
+    cols = st.columns(5)
+    cols[0].metric('缓存条目', search_cache_stats['entries'])
+    cols[1].metric('估计内存', f"{search_cache_stats['memory_bytes'] / 1024:.1f} KB")
+    cols[2].metric('本进程命中率', f"{search_cache_stats['hit_ratio']:.0%}")
+    cols[3].metric('淘汰/过期', f"{search_cache_stats['evictions']}/{search_cache_stats['expirations']}")
+    cols[4].metric('合并的并发请求', search_cache_stats['coalesced'])
+    
+    # json/ 文件解析缓存（本进程）
+    st.subheader("📂 JSON文件缓存")
+    json_stats = json_cache_stats()
+    cols = st.columns(4)
+    cols[0].metric('缓存文件数', json_stats['entries'])
+    cols[1].metric('命中', json_stats['hits'])
+    cols[2].metric('未命中', json_stats['misses'])
+    cols[3].metric('本进程命中率', f"{json_stats['hit_ratio']:.0%}")
+    
+    # LLM响应缓存
+    st.subheader("🗃️ LLM响应缓存")
+    response_cache = get_response_cache()
+    llm_cache_stats = response_cache.stats()
+    cols = st.columns(5)
+    cols[0].metric('缓存条目', llm_cache_stats['entries'])
+    cols[1].metric('占用空间', f"{llm_cache_stats['size_bytes'] / 1024:.1f} KB")
+    cols[2].metric('累计命中', llm_cache_stats['total_hits'])
+    cols[3].metric('本进程命中率', f"{llm_cache_stats['hit_ratio']:.0%}")
+    cols[4].metric('合并的并发请求', llm_flight_stats()['coalesced'])
+    if st.button("🧹 清空LLM响应缓存"):
+        deleted = response_cache.clear()
+        st.success(f"已删除 {deleted} 条缓存响应")
+    
+    # LLM语义缓存
+    st.subheader("🧠 LLM语义缓存")
+    semantic_cache = get_semantic_cache()
+    semantic_stats = semantic_cache.stats()
+    cols = st.columns(4)
+    cols[0].metric('缓存条目', semantic_stats['entries'])
+    cols[1].metric('相似度阈值', f"{semantic_stats['threshold']:.2f}")
+    cols[2].metric('累计命中', semantic_stats['total_hits'])
+    cols[3].metric('本进程命中率', f"{semantic_stats['hit_ratio']:.0%}")
+    top_entries = semantic_cache.entry_stats(limit=10)
+    if top_entries:
+        entry_df = pd.DataFrame([
+            {
+                '输入': entry['prompt'][:60],
+                '命中次数': entry['hits'],
+                '最近使用': datetime.fromtimestamp(entry['last_used']).strftime('%H:%M:%S')
+            }
+            for entry in top_entries
+        ])
+        st.dataframe(entry_df, use_container_width=True, hide_index=True)
+    if st.button("🧹 清空LLM语义缓存"):
+        deleted = semantic_cache.clear()
+        st.success(f"已删除 {deleted} 条语义缓存")
+    
     # 错误日志
     st.subheader("📋 系统日志")
     
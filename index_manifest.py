@@ -0,0 +1,81 @@
+"""索引清单模块
+
+记录每个源docx文件的内容哈希及其切分出的段落uid，
+重新索引时据此找出新增、修改和删除的文件，只处理发生变化的部分。
+
+清单条目结构（保存在向量存储 manifest.json 的 "files" 字段中）：
+
+    {
+        "documents/real/文档1.docx": {
+            "sha1": "...",          # 文件内容哈希
+            "size": 12345,
+            "mtime_ns": 1700000000000000000,
+            "chunks": ["uid", ...]  # 该文件的段落uid（uuid3内容哈希）
+        }
+    }
+"""
+
+import hashlib
+import os
+from typing import List, Dict, Any
+
+
+def file_sha1(path: str, block_size: int = 1 << 20) -> str:
+    """计算文件内容的sha1"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def file_state(path: str, sha1: str = None) -> Dict[str, Any]:
+    """读取文件的大小、修改时间和内容哈希"""
+    stat = os.stat(path)
+    return {
+        "sha1": sha1 or file_sha1(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns
+    }
+
+
+def diff_sources(paths: List[str], tracked: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    比较当前源文件与清单记录
+
+    大小和修改时间都未变的文件直接视为未修改，不读取内容；
+    否则计算内容哈希，哈希相同（例如仅被touch）的文件也视为未修改。
+
+    Args:
+        paths: 当前源文件路径列表
+        tracked: 清单中的 "files" 字段
+
+    Returns:
+        字典，包含 added / changed / deleted / unchanged 四个路径列表，
+        以及 states（当前每个文件的 sha1 / size / mtime_ns）
+    """
+    diff = {"added": [], "changed": [], "deleted": [], "unchanged": [], "states": {}}
+
+    for path in paths:
+        stat = os.stat(path)
+        entry = tracked.get(path)
+        if entry is None:
+            diff["added"].append(path)
+            diff["states"][path] = file_state(path)
+            continue
+
+        if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            diff["unchanged"].append(path)
+            diff["states"][path] = {"sha1": entry["sha1"], "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+            continue
+
+        state = file_state(path)
+        diff["states"][path] = state
+        if state["sha1"] == entry.get("sha1"):
+            diff["unchanged"].append(path)
+        else:
+            diff["changed"].append(path)
+
+    current = set(paths)
+    diff["deleted"] = [path for path in tracked if path not in current]
+    return diff
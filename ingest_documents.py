@@ -0,0 +1,98 @@
+"""文档导入脚本
+
+并行解析 documents/real 和 documents/fake 下的docx文档，
+按 RAG_CONFIG["retrieval"] 中的 chunk_size / chunk_overlap 切分为文本块，
+输出与 json/*.json 中 documents 条目相同结构的记录，并统计吞吐量。
+
+用法：
+    python ingest_documents.py [--output index_store/ingested_documents.json] [--workers 4]
+
+输出默认写入索引存储目录（RAG_CONFIG["index"]["store_dir"]，不纳入版本控制），
+不写入 app.py 读取的 json/ 任务数据目录。
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Any
+
+from config import GAME_CONFIG, RAG_CONFIG
+from docx_loader import collection_root, list_docx_files, load_document_records
+
+
+def _load_file(task) -> List[Dict[str, Any]]:
+    """在工作进程中解析单个文档（模块级函数，便于跨进程序列化）"""
+    path, chunk_size, chunk_overlap, root = task
+    return load_document_records(path, chunk_size, chunk_overlap, root)
+
+
+def ingest(directories: List[str] = None, chunk_size: int = None, chunk_overlap: int = None,
+           max_workers: int = None) -> Dict[str, Any]:
+    """
+    并行解析并切分目录下的全部docx文档
+
+    每个文档交给一个工作进程处理，结果按文件名顺序合并。
+
+    Args:
+        directories: 文档目录列表，默认为真实文档和混淆文档目录
+        chunk_size: 单个文本块的最大字符数，默认取 RAG_CONFIG
+        chunk_overlap: 相邻文本块重叠的最大字符数，默认取 RAG_CONFIG
+        max_workers: 工作进程数，默认为CPU核数
+
+    Returns:
+        字典，包含 documents（记录列表）、files、chunks、elapsed_seconds、chunks_per_second
+    """
+    if directories is None:
+        directories = [GAME_CONFIG["documents"]["real_docs_path"], GAME_CONFIG["documents"]["fake_docs_path"]]
+    retrieval_config = RAG_CONFIG["retrieval"]
+    chunk_size = chunk_size or retrieval_config["chunk_size"]
+    chunk_overlap = retrieval_config["chunk_overlap"] if chunk_overlap is None else chunk_overlap
+
+    paths = list_docx_files(directories)
+    start = time.perf_counter()
+    records = []
+    if paths:
+        root = collection_root(directories)
+        tasks = [(path, chunk_size, chunk_overlap, root) for path in paths]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for file_records in executor.map(_load_file, tasks):
+                records.extend(file_records)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "documents": records,
+        "files": len(paths),
+        "chunks": len(records),
+        "elapsed_seconds": elapsed,
+        "chunks_per_second": len(records) / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="并行导入docx文档并切分为检索记录")
+    parser.add_argument("--output", default=os.path.join(RAG_CONFIG["index"]["store_dir"], "ingested_documents.json"),
+                        help="输出的JSON文件路径")
+    parser.add_argument("--workers", type=int, default=None, help="工作进程数（默认CPU核数）")
+    parser.add_argument("--chunk-size", type=int, default=None, help="文本块最大字符数")
+    parser.add_argument("--chunk-overlap", type=int, default=None, help="相邻文本块重叠字符数")
+    args = parser.parse_args()
+
+    print("🚀 开始导入文档...")
+    result = ingest(chunk_size=args.chunk_size, chunk_overlap=args.chunk_overlap, max_workers=args.workers)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump({"documents": result["documents"]}, f, ensure_ascii=False, indent=2)
+
+    print("\n📊 导入统计：")
+    print(f"文档数：{result['files']}")
+    print(f"文本块数：{result['chunks']}")
+    print(f"耗时：{result['elapsed_seconds']:.2f} 秒")
+    print(f"吞吐量：{result['chunks_per_second']:.1f} 块/秒")
+    print(f"\n📁 输出文件：{args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""JSON文件缓存模块
+
+进程内共享的 json/ 目录读取缓存：同一路径只在文件的修改时间或大小变化时重新解析，
+其余读取直接返回缓存的解析结果。
+
+注意：返回的对象在所有调用方之间共享，调用方只能读取，需要修改时请先复制。
+"""
+
+import json
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+_LOCK = threading.Lock()
+_CACHE: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+_STATS = {"hits": 0, "misses": 0}
+
+
+def load_json(path: str) -> Any:
+    """
+    读取并解析JSON文件，文件未变化时返回缓存结果
+
+    Args:
+        path: JSON文件路径
+
+    Returns:
+        解析后的对象（共享，只读）
+
+    Raises:
+        OSError: 文件不存在或无法读取
+        ValueError: 文件内容不是合法JSON
+    """
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    signature = (stat.st_mtime_ns, stat.st_size)
+
+    with _LOCK:
+        cached = _CACHE.get(key)
+        if cached is not None and cached[0] == signature:
+            _STATS["hits"] += 1
+            return cached[1]
+
+    with open(key, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    with _LOCK:
+        _STATS["misses"] += 1
+        _CACHE[key] = (signature, data)
+    return data
+
+
+def cache_stats() -> Dict[str, Any]:
+    """返回缓存统计：命中次数、未命中次数、命中率和缓存的文件数"""
+    with _LOCK:
+        total = _STATS["hits"] + _STATS["misses"]
+        return {
+            "hits": _STATS["hits"],
+            "misses": _STATS["misses"],
+            "hit_ratio": _STATS["hits"] / total if total else 0.0,
+            "entries": len(_CACHE)
+        }
+
+
+def clear_cache():
+    """清空缓存和统计"""
+    with _LOCK:
+        _CACHE.clear()
+        _STATS["hits"] = 0
+        _STATS["misses"] = 0
@@ -0,0 +1,198 @@
+"""LLM响应缓存模块
+
+按内容寻址的磁盘缓存：以 模型、采样参数、完整消息列表（含system prompt）的哈希为键，
+把 ChatBot 的回复保存到SQLite，多个Streamlit进程共享；每个线程复用一个连接。
+超过条目数或字节数上限时按最近使用时间淘汰。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from config import LLM_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    content TEXT NOT NULL,
+    reasoning TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+
+def make_cache_key(model: str, temperature: float, messages: List[Dict[str, Any]], **params) -> str:
+    """
+    计算请求的缓存键
+
+    Args:
+        model: 模型名称
+        temperature: 采样温度
+        messages: 完整消息列表（第一条为system prompt）
+        **params: 其他影响输出的请求参数（如 max_tokens）
+
+    Returns:
+        请求内容的SHA-256十六进制摘要
+    """
+    payload = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages, "params": params},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class LlmResponseCache:
+    def __init__(self, db_path: str, max_entries: int = 5000, max_bytes: int = 50 * 1024 * 1024):
+        """
+        初始化响应缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            max_entries: 最多保存的响应数
+            max_bytes: 响应内容（UTF-8编码）总字节数上限
+        """
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        """返回当前线程的连接（首次调用时打开并建表）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def get(self, key: str) -> Tuple[bool, Optional[str], Optional[str]]:
+        """
+        读取缓存的响应
+
+        Returns:
+            (是否命中, 回复内容, 推理内容)
+        """
+        try:
+            conn = self._connection()
+            with conn:
+                row = conn.execute("SELECT content, reasoning FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (time.time(), key)
+                    )
+        except sqlite3.Error as e:
+            print(f"读取LLM缓存失败: {e}")
+            row = None
+
+        if row is None:
+            self._count("misses")
+            return False, None, None
+        self._count("hits")
+        return True, row[0], row[1]
+
+    def put(self, key: str, model: str, content: str, reasoning: Optional[str] = None):
+        """
+        写入响应，超出容量时淘汰最久未使用的条目
+
+        Args:
+            key: make_cache_key 计算的缓存键
+            model: 模型名称（用于统计展示）
+            content: 回复内容
+            reasoning: 推理内容（没有时为None）
+        """
+        size = len(content.encode('utf-8')) + len((reasoning or "").encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, model, content, reasoning, size, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, model, content, reasoning, size, now, now)
+                )
+                evicted = self._evict(conn)
+        except sqlite3.Error as e:
+            print(f"写入LLM缓存失败: {e}")
+            return
+        self._count("writes")
+        self._count("evictions", evicted)
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        entries, total_bytes = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return 0
+
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            stale.append((key,))
+            entries -= 1
+            total_bytes -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+        return len(stale)
+
+    def clear(self) -> int:
+        """删除全部缓存的响应，返回删除的条目数"""
+        conn = self._connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM responses").rowcount
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """返回本进程的命中/未命中/写入/淘汰计数，以及数据库中的条目数、字节数和累计命中次数"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+
+        entries, total_bytes, total_hits = 0, 0, 0
+        if os.path.exists(self.db_path):
+            try:
+                entries, total_bytes, total_hits = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(hits), 0) FROM responses"
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"读取LLM缓存统计失败: {e}")
+        stats.update(entries=entries, size_bytes=total_bytes, total_hits=total_hits)
+        return stats
+
+
+_CACHE_LOCK = threading.Lock()
+_RESPONSE_CACHE: Optional[LlmResponseCache] = None
+
+
+def get_response_cache() -> LlmResponseCache:
+    """返回按 LLM_CONFIG["response_cache"] 配置的进程级响应缓存"""
+    global _RESPONSE_CACHE
+    with _CACHE_LOCK:
+        if _RESPONSE_CACHE is None:
+            cache_config = LLM_CONFIG["response_cache"]
+            _RESPONSE_CACHE = LlmResponseCache(
+                cache_config["db_path"],
+                max_entries=cache_config["max_entries"],
+                max_bytes=cache_config["max_bytes"]
+            )
+        return _RESPONSE_CACHE
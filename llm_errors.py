@@ -0,0 +1,105 @@
+"""LLM调用的异常类型
+
+ChatBot 调用失败时抛出 LlmError 的子类，而不是把错误信息当作回答返回，
+调用方据此区分“回答内容”和“调用失败”（例如失败时不计分、不保存聊天记录）。
+
+retryable 表示换一次请求有可能成功（超时、连接断开、服务端过载等），
+ChatBot 只对这类错误按退避策略重试。
+"""
+
+import asyncio
+import concurrent.futures
+
+import httpx
+import openai
+
+from rate_limiter import RateLimitTimeout
+
+
+class LlmError(Exception):
+    """LLM调用失败"""
+
+    retryable = False
+
+    def __init__(self, message: str, retryable: bool = None, retry_after: float = None):
+        """
+        Args:
+            message: 错误信息（可直接展示给用户）
+            retryable: 是否值得重试，默认取子类的设置
+            retry_after: 服务端建议的最短重试间隔（秒）
+        """
+        super().__init__(message)
+        if retryable is not None:
+            self.retryable = retryable
+        self.retry_after = retry_after
+
+
+class LlmTimeoutError(LlmError):
+    """请求超时或超过调用的截止时间"""
+
+    retryable = True
+
+
+class LlmConnectionError(LlmError):
+    """无法连接到API或连接中断"""
+
+    retryable = True
+
+
+class LlmRateLimitError(LlmError):
+    """调用频率超限（服务端返回429，或本地限流排队超时）"""
+
+    retryable = True
+
+
+class LlmServerError(LlmError):
+    """服务端错误（5xx）"""
+
+    retryable = True
+
+
+class LlmRequestError(LlmError):
+    """请求本身有问题（鉴权失败、参数错误等），重试不会成功"""
+
+
+def _retry_after(response) -> float:
+    """读取响应头中的 Retry-After 秒数，没有或无法解析时返回 None"""
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def translate_error(error: Exception) -> LlmError:
+    """
+    把 openai / httpx / 限流器等抛出的异常转换为对应的 LlmError 子类
+
+    Args:
+        error: 原始异常
+
+    Returns:
+        LlmError 实例（error 本身已是 LlmError 时原样返回）
+    """
+    if isinstance(error, LlmError):
+        return error
+    if isinstance(error, RateLimitTimeout):
+        # 本地已经排队等到了最长时间，不再重试
+        return LlmRateLimitError(str(error), retryable=False)
+    if isinstance(error, (openai.APITimeoutError, httpx.TimeoutException,
+                          TimeoutError, concurrent.futures.TimeoutError, asyncio.TimeoutError)):
+        return LlmTimeoutError(f"DeepSeek API 请求超时: {error}")
+    if isinstance(error, (openai.APIConnectionError, httpx.TransportError)):
+        return LlmConnectionError(f"无法连接 DeepSeek API: {error}")
+    if isinstance(error, openai.APIStatusError):
+        status = error.status_code
+        retry_after = _retry_after(error.response)
+        if status == 429:
+            return LlmRateLimitError(f"DeepSeek API 调用频率超限: {error}", retry_after=retry_after)
+        if status == 408:
+            return LlmTimeoutError(f"DeepSeek API 请求超时: {error}", retry_after=retry_after)
+        if status >= 500:
+            return LlmServerError(f"DeepSeek API 服务端错误（{status}）: {error}", retry_after=retry_after)
+        return LlmRequestError(f"DeepSeek API 拒绝了请求（{status}）: {error}")
+    return LlmError(f"调用 ChatCompletion API 时出错: {error}")
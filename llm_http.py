@@ -0,0 +1,135 @@
+"""DeepSeek API 的共享HTTP连接池
+
+进程内所有 ChatBot 共用一个线程安全的 httpx.Client（keep-alive，安装了 h2 时启用HTTP/2），
+避免每条消息都重新建立TCP+TLS连接。异步客户端的连接池绑定在事件循环上，
+因此每个事件循环共用一个 httpx.AsyncClient。
+
+连接池大小和超时取自 LLM_CONFIG["http"]；连接复用情况通过 connection_stats() 查看。
+"""
+
+import importlib.util
+import threading
+import weakref
+from typing import Any, Dict
+
+import httpx
+
+from config import LLM_CONFIG
+
+_LOCK = threading.Lock()
+_CLIENT = None
+_ASYNC_CLIENTS: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_STATS = {"requests": 0, "connections_opened": 0, "tls_handshakes": 0, "reused_connections": 0}
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+
+def _count(name: str):
+    with _LOCK:
+        _STATS[name] += 1
+
+
+def _make_trace():
+    """
+    为单个请求创建httpcore跟踪回调：
+    发送请求头之前没有新建连接，说明该请求复用了连接池中的已有连接
+    """
+    state = {"connected": False}
+
+    def trace(event_name: str, info: Dict[str, Any]):
+        if event_name == "connection.connect_tcp.complete":
+            state["connected"] = True
+            _count("connections_opened")
+        elif event_name == "connection.start_tls.complete":
+            _count("tls_handshakes")
+        elif event_name.endswith("send_request_headers.started") and not state["connected"]:
+            _count("reused_connections")
+
+    return trace
+
+
+def _on_request(request: httpx.Request):
+    _count("requests")
+    request.extensions["trace"] = _make_trace()
+
+
+def _async_trace(trace):
+    async def async_trace(event_name: str, info: Dict[str, Any]):
+        trace(event_name, info)
+    return async_trace
+
+
+async def _on_request_async(request: httpx.Request):
+    _count("requests")
+    request.extensions["trace"] = _async_trace(_make_trace())
+
+
+def _client_options() -> Dict[str, Any]:
+    """根据 LLM_CONFIG["http"] 构造 httpx 客户端参数"""
+    http_config = LLM_CONFIG["http"]
+    timeout = http_config["timeout"]
+    return {
+        "http2": http_config["http2"] and HTTP2_AVAILABLE,
+        "verify": http_config["verify_ssl"],
+        "limits": httpx.Limits(
+            max_connections=http_config["max_connections"],
+            max_keepalive_connections=http_config["max_keepalive_connections"],
+            keepalive_expiry=http_config["keepalive_expiry"]
+        ),
+        "timeout": httpx.Timeout(
+            connect=timeout["connect"],
+            read=timeout["read"],
+            write=timeout["write"],
+            pool=timeout["pool"]
+        )
+    }
+
+
+def get_http_client() -> httpx.Client:
+    """
+    返回进程内共享的同步HTTP客户端（首次调用时创建）
+
+    Returns:
+        httpx.Client，可在多个线程和多个 OpenAI 客户端之间共享，调用方不应关闭
+    """
+    global _CLIENT
+    with _LOCK:
+        if _CLIENT is None or _CLIENT.is_closed:
+            _CLIENT = httpx.Client(event_hooks={"request": [_on_request]}, **_client_options())
+        return _CLIENT
+
+
+def get_async_http_client(loop) -> httpx.AsyncClient:
+    """
+    返回绑定在指定事件循环上的共享异步HTTP客户端
+
+    Args:
+        loop: 当前运行的事件循环
+
+    Returns:
+        httpx.AsyncClient，同一事件循环内的所有调用共享；事件循环被回收后随之释放
+    """
+    with _LOCK:
+        client = _ASYNC_CLIENTS.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(event_hooks={"request": [_on_request_async]}, **_client_options())
+            _ASYNC_CLIENTS[loop] = client
+        return client
+
+
+def connection_stats() -> Dict[str, Any]:
+    """返回请求数、新建连接数、TLS握手数、复用连接的请求数及复用率"""
+    with _LOCK:
+        stats = dict(_STATS)
+    stats["reuse_ratio"] = stats["reused_connections"] / stats["requests"] if stats["requests"] else 0.0
+    stats["http2"] = LLM_CONFIG["http"]["http2"] and HTTP2_AVAILABLE
+    return stats
+
+
+def close_clients():
+    """关闭共享的同步客户端（异步客户端随事件循环释放），下次使用时重新创建"""
+    global _CLIENT
+    with _LOCK:
+        client, _CLIENT = _CLIENT, None
+    if client is not None:
+        client.close()
@@ -0,0 +1,253 @@
+"""LLM调用的截止时间、重试和对冲请求
+
+    Deadline            单次调用（含排队、重试）的截止时间
+    call_with_retries   对可重试的错误按指数退避重试，退避时间加随机抖动（full jitter），避免多个调用方同时重试
+    LatencyTracker      记录最近的请求延迟，提供分位数
+    hedged_call         请求在观测到的p95延迟内还没有响应时，再发起一次相同的请求，取先成功的结果
+
+对冲请求只改善尾延迟：大多数请求在p95之前完成，不会触发第二次请求，额外开销约为5%的请求量。
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from llm_errors import LlmError, LlmTimeoutError
+
+_LOCK = threading.Lock()
+_STATS = {"retries": 0, "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0}
+
+# 对冲请求在工作线程中执行
+_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+def _count(name: str):
+    with _LOCK:
+        _STATS[name] += 1
+
+
+class Deadline:
+    def __init__(self, seconds: float):
+        """
+        Args:
+            seconds: 从现在起可用的秒数
+        """
+        self.seconds = seconds
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """剩余秒数（已过期时为0）"""
+        return max(0.0, self.expires - time.monotonic())
+
+    def check(self):
+        """已过截止时间时抛出 LlmTimeoutError（不可重试）"""
+        if time.monotonic() >= self.expires:
+            _count("deadline_exceeded")
+            raise LlmTimeoutError(f"超过调用截止时间（{self.seconds:.0f}秒）", retryable=False)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """第 attempt 次重试前的等待秒数：在 [0, min(cap, base*2^attempt)] 内均匀随机"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _next_delay(error: LlmError, attempt: int, max_retries: int, base: float, cap: float,
+                deadline: Deadline) -> Optional[float]:
+    """返回重试前的等待秒数；不应重试时返回 None"""
+    if not error.retryable or attempt >= max_retries:
+        return None
+    delay = max(backoff_delay(attempt, base, cap), error.retry_after or 0.0)
+    # 等待之后已经没有时间完成请求，直接放弃
+    if delay >= deadline.remaining():
+        return None
+    _count("retries")
+    return delay
+
+
+def call_with_retries(attempt_fn: Callable[[], Any], deadline: Deadline, max_retries: int = 2,
+                      base: float = 0.5, cap: float = 8.0) -> Any:
+    """
+    执行 attempt_fn()，遇到可重试的 LlmError 时退避后重试
+
+    Args:
+        attempt_fn: 发起一次请求的函数，失败时抛出 LlmError
+        deadline: 截止时间，重试不会超过它
+        max_retries: 最多重试次数
+        base: 第一次重试的最长退避秒数
+        cap: 单次退避的上限秒数
+
+    Returns:
+        attempt_fn 的返回值
+
+    Raises:
+        LlmError: 不可重试的错误，或重试用尽后的最后一个错误
+    """
+    attempt = 0
+    while True:
+        deadline.check()
+        try:
+            return attempt_fn()
+        except LlmError as e:
+            delay = _next_delay(e, attempt, max_retries, base, cap, deadline)
+            if delay is None:
+                raise
+        time.sleep(delay)
+        attempt += 1
+
+
+async def acall_with_retries(attempt_fn: Callable[[], Awaitable[Any]], deadline: Deadline, max_retries: int = 2,
+                             base: float = 0.5, cap: float = 8.0) -> Any:
+    """call_with_retries 的异步版本，attempt_fn() 返回协程"""
+    attempt = 0
+    while True:
+        deadline.check()
+        try:
+            return await attempt_fn()
+        except LlmError as e:
+            delay = _next_delay(e, attempt, max_retries, base, cap, deadline)
+            if delay is None:
+                raise
+        await asyncio.sleep(delay)
+        attempt += 1
+
+
+class LatencyTracker:
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        """
+        Args:
+            window: 每个键保留的最近样本数
+            min_samples: 样本数少于该值时不提供分位数
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: Dict[Hashable, deque] = {}
+
+    def record(self, key: Hashable, seconds: float):
+        """记录一次成功请求的延迟"""
+        with self._lock:
+            if key not in self._samples:
+                self._samples[key] = deque(maxlen=self.window)
+            self._samples[key].append(seconds)
+
+    def percentile(self, key: Hashable, q: float) -> Optional[float]:
+        """返回键对应延迟的 q 分位数（0-1），样本不足时返回 None"""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def stats(self) -> Dict[Hashable, Dict[str, Any]]:
+        """返回每个键的样本数、p50 和 p95 延迟"""
+        with self._lock:
+            keys = list(self._samples)
+        return {
+            key: {
+                "samples": len(self._samples[key]),
+                "p50": self.percentile(key, 0.5),
+                "p95": self.percentile(key, 0.95)
+            }
+            for key in keys
+        }
+
+
+def _discard_late(future, discard: Optional[Callable[[Any], None]]):
+    """没被采用的请求完成后释放它的结果（例如关闭流式响应）"""
+    def done(f):
+        if discard is not None and not f.cancelled() and f.exception() is None:
+            discard(f.result())
+    future.add_done_callback(done)
+
+
+def hedged_call(fn: Callable[[], Any], hedge_after: Optional[float], timeout: float,
+                discard: Callable[[Any], None] = None) -> Any:
+    """
+    执行 fn()，hedge_after 秒内没有完成时在另一个线程再执行一次，返回先成功的结果
+
+    Args:
+        fn: 发起一次请求的函数，失败时抛出 LlmError
+        hedge_after: 发起对冲请求前等待的秒数，None 表示不对冲（直接在当前线程执行）
+        timeout: 最长等待秒数
+        discard: 释放未被采用的结果的函数
+
+    Returns:
+        fn 的返回值
+
+    Raises:
+        LlmError: 两次请求都失败（抛出最后一个错误）或等待超时
+    """
+    if hedge_after is None or hedge_after >= timeout:
+        return fn()
+
+    end = time.monotonic() + timeout
+    futures = [_EXECUTOR.submit(fn)]
+    done, _ = wait(futures, timeout=hedge_after)
+    if not done:
+        futures.append(_EXECUTOR.submit(fn))
+        _count("hedges")
+
+    pending, error = set(futures), None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        winner = next((f for f in done if f.exception() is None), None)
+        if winner is None:
+            error = next(iter(done)).exception()
+            continue
+        if winner is futures[-1] and len(futures) > 1:
+            _count("hedge_wins")
+        for other in futures:
+            if other is not winner:
+                _discard_late(other, discard)
+        return winner.result()
+
+    if error is not None and not pending:
+        raise error
+    for other in futures:
+        _discard_late(other, discard)
+    raise LlmTimeoutError(f"请求在 {timeout:.0f} 秒内没有响应")
+
+
+async def ahedged_call(afn: Callable[[], Awaitable[Any]], hedge_after: Optional[float], timeout: float) -> Any:
+    """hedged_call 的异步版本：afn() 返回协程，未被采用的请求直接取消"""
+    if hedge_after is None or hedge_after >= timeout:
+        return await afn()
+
+    end = time.monotonic() + timeout
+    tasks = [asyncio.ensure_future(afn())]
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+        if not done:
+            tasks.append(asyncio.ensure_future(afn()))
+            _count("hedges")
+
+        pending, error = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=max(0.0, end - time.monotonic()),
+                                               return_when=FIRST_COMPLETED)
+            if not done:
+                raise LlmTimeoutError(f"请求在 {timeout:.0f} 秒内没有响应")
+            winner = next((t for t in done if t.exception() is None), None)
+            if winner is None:
+                error = next(iter(done)).exception()
+                continue
+            if winner is tasks[-1] and len(tasks) > 1:
+                _count("hedge_wins")
+            return winner.result()
+        raise error
+    finally:
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+
+
+def retry_stats() -> Dict[str, int]:
+    """返回重试次数、对冲请求次数、对冲请求胜出次数和超过截止时间的次数"""
+    with _LOCK:
+        return dict(_STATS)
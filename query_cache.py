@@ -0,0 +1,113 @@
+"""查询结果缓存模块
+
+有容量上限（LRU淘汰）和存活时间（TTL）的线程安全缓存，
+用于缓存检索、重排序等对相同输入反复执行的函数结果。
+每个条目带一个标签（如集合名），索引更新时按标签整体失效。
+"""
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+
+def estimate_size(obj: Any, _seen: set = None) -> int:
+    """粗略估计对象及其包含的容器、字符串占用的字节数"""
+    if _seen is None:
+        _seen = set()
+    if id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _seen) for item in obj)
+    return size
+
+
+class QueryCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600):
+        """
+        初始化缓存
+
+        Args:
+            max_entries: 最多保存的条目数，超出时淘汰最久未使用的条目
+            ttl_seconds: 条目存活时间（秒），过期条目在读取时删除
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Hashable, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def get(self, key: Hashable) -> Tuple[bool, Optional[Any]]:
+        """
+        读取缓存
+
+        Returns:
+            (是否命中, 缓存值)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[0] > self.ttl_seconds:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                entry = None
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return True, entry[3]
+
+    def put(self, key: Hashable, value: Any, tag: Hashable = None):
+        """
+        写入缓存
+
+        Args:
+            key: 缓存键
+            value: 缓存值（调用方不应再修改）
+            tag: 失效标签，invalidate(tag) 时一并删除
+        """
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic(), tag, size, value)
+            self._bytes += size
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, tag: Hashable = None) -> int:
+        """
+        删除带指定标签的全部条目，tag为None时清空缓存
+
+        Returns:
+            删除的条目数
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if tag is None or entry[1] == tag]
+            for key in keys:
+                self._remove(key)
+            self._stats["invalidations"] += len(keys)
+            return len(keys)
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self._bytes -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中率、条目数、估计内存占用（字节）及各项计数"""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                hit_ratio=self._stats["hits"] / lookups if lookups else 0.0,
+                entries=len(self._entries),
+                memory_bytes=self._bytes
+            )
@@ -1,78 +1,501 @@
 """RAG后端函数模块
 
 这个模块包含所有RAG相关的后端函数。
-当前实现返回默认值，用户需要根据实际RAG系统进行替换。
+文档检索基于docx语料的BM25倒排索引，其余函数仍返回默认值，用户需要根据实际RAG系统进行替换。
 """
 
-import random
+import asyncio
+import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict, Any
 import json
+import sqlite3
 
-def search_documents(query: str, top_k: int = 10) -> List[Dict[str, Any]]:
+import numpy as np
+
+from bm25_index import BM25Index
+from config import GAME_CONFIG, RAG_CONFIG
+from dense_index import LsaEmbedder, DenseIndex
+from docx_loader import collection_root, list_docx_files, load_document_records
+from ann_index import IVFIndex, ProductQuantizer, default_nlist, measure_recall
+from embedding_store import (
+    settings_fingerprint, read_manifest, is_store_current, save_store, append_store, open_store, update_manifest
+)
+from index_manifest import diff_sources
+from fts_store import FtsChunkStore
+from query_cache import QueryCache
+from single_flight import SingleFlight
+from text_matcher import get_matcher
+from text_processing import tokenize, normalize_query
+
+# 进程内共享的向量集合，首次检索时从磁盘存储打开（必要时重建）
+_INDEX_LOCK = threading.RLock()
+_COLLECTIONS: Dict[str, Dict[str, Any]] = {}
+
+# SQLite FTS5 段落存储，以及本进程已确认同步过的集合版本
+_FTS_STORE = FtsChunkStore(RAG_CONFIG["index"]["fts"]["db_path"])
+_FTS_SYNCED: Dict[str, str] = {}
+
+# 检索/重排序结果缓存，键为规范化查询+参数+索引版本
+_QUERY_CACHE = QueryCache(
+    max_entries=RAG_CONFIG["query_cache"]["max_entries"],
+    ttl_seconds=RAG_CONFIG["query_cache"]["ttl_seconds"]
+)
+
+# 与查询缓存使用相同键的单飞层：并发的相同请求只计算一次，共享结果
+_SINGLE_FLIGHT = SingleFlight()
+
+# 重排序质量信号词：广告、绝对化表述、科学内容
+_RERANK_MATCHER = get_matcher(["优惠", "购买", "所有", "都", "临床", "研究"])
+
+# 默认答案的主题词
+_ANSWER_TOPIC_MATCHER = get_matcher(["玻尿酸", "敏感肌", "孕妇", "口红", "抗衰老", "精华"])
+
+# 答案评估术语：关键术语 + 专业术语
+_ANSWER_TERMS_MATCHER = get_matcher(
+    ["成分", "浓度", "安全", "建议", "避免", "推荐"] +
+    ["透明质酸", "神经酰胺", "烟酰胺", "视黄醇", "胜肽"]
+)
+
+# 混合检索两路并行执行的线程池
+_HYBRID_EXECUTOR = ThreadPoolExecutor(max_workers=RAG_CONFIG["hybrid"]["max_workers"], thread_name_prefix="hybrid")
+
+def _store_settings() -> Dict[str, Any]:
+    """影响存储内容的配置，变化时存储需要全量重建"""
+    return {
+        "chunk_size": RAG_CONFIG["retrieval"]["chunk_size"],
+        "chunk_overlap": RAG_CONFIG["retrieval"]["chunk_overlap"],
+        "embedding": RAG_CONFIG["embedding"]
+    }
+
+def _read_source(path: str, root: str) -> List[Dict[str, Any]]:
+    """解析单个docx为段落记录（uid相对集合根目录 root 生成），同一文件内内容相同的段落只保留一条"""
+    records, seen = [], set()
+    retrieval_config = RAG_CONFIG["retrieval"]
+    for record in load_document_records(path, retrieval_config["chunk_size"], retrieval_config["chunk_overlap"], root):
+        if record["uid"] not in seen:
+            seen.add(record["uid"])
+            records.append(record)
+    return records
+
+def _build_store(store_dir: str, paths: List[str], root: str, fingerprint: str):
+    """全量解析docx、训练嵌入模型并写入存储目录"""
+    states = diff_sources(paths, {})["states"]
+    records, files = [], {}
+    for path in paths:
+        file_records = _read_source(path, root)
+        records.extend(file_records)
+        files[path] = dict(states[path], chunks=[record["uid"] for record in file_records])
+    
+    embedding_config = RAG_CONFIG["embedding"]
+    texts = [record["text"] for record in records]
+    embedder = LsaEmbedder(
+        dim=embedding_config["dim"],
+        min_df=embedding_config["min_df"],
+        max_features=embedding_config["max_features"]
+    ).fit(texts)
+    save_store(store_dir, records, embedder.encode(texts), embedder, fingerprint, files)
+
+def _collection_sources(collection_name: str) -> List[str]:
+    collections = RAG_CONFIG["index"]["collections"]
+    if collection_name not in collections:
+        raise ValueError(f"未知的向量集合: {collection_name}")
+    return list_docx_files(collections[collection_name])
+
+def _collection_root(collection_name: str) -> str:
+    return collection_root(RAG_CONFIG["index"]["collections"][collection_name])
+
+def _open_collection(store_dir: str, manifest: Dict[str, Any], bm25: BM25Index = None) -> Dict[str, Any]:
+    """以内存映射方式打开存储，组装集合字典"""
+    records, embeddings, embedder = open_store(store_dir, manifest)
+    dead_rows = np.flatnonzero(~records.alive)
+    ivf = _load_ivf(store_dir, manifest, embeddings, dead_rows)
+    pq = _load_pq(store_dir, manifest, embeddings)
+    return {
+        "store_dir": store_dir,
+        # 训练IVF/PQ时会更新manifest，重新读取
+        "manifest": read_manifest(store_dir),
+        "version": manifest["version"],
+        "records": records,
+        "embedder": embedder,
+        "dense": DenseIndex(embeddings, excluded_ids=dead_rows),
+        "ivf": ivf,
+        "pq": pq,
+        "bm25": bm25
+    }
+
+def _load_collection(collection_name: str) -> Dict[str, Any]:
     """
-    文档检索函数
+    打开向量集合的内存映射存储
+
+    存储缺失、格式过期或切分/嵌入配置变化时全量重建；
+    否则只对上次索引后变化的源文件做增量更新。
+
+    Args:
+        collection_name: RAG_CONFIG["index"]["collections"] 中的集合名称
+
+    Returns:
+        包含 records / embedder / dense / ivf / pq / bm25 的集合字典
+    """
+    paths = _collection_sources(collection_name)
+    root = _collection_root(collection_name)
+    fingerprint = settings_fingerprint(_store_settings())
+    store_dir = os.path.join(RAG_CONFIG["index"]["store_dir"], collection_name)
+    
+    manifest = read_manifest(store_dir)
+    if not is_store_current(manifest, fingerprint):
+        _build_store(store_dir, paths, root, fingerprint)
+        manifest = read_manifest(store_dir)
+    
+    collection = _open_collection(store_dir, manifest)
+    collection, _ = _apply_source_changes(collection, paths, root)
+    return collection
+
+def _apply_source_changes(collection: Dict[str, Any], paths: List[str], root: str):
+    """
+    按内容哈希把源文件的变化增量应用到集合
+
+    只解析和嵌入新增/修改的文件；修改文件中内容未变的段落（uid相同）保留原行，
+    消失的段落和被删除文件的段落标记为墓碑。墓碑比例超过
+    RAG_CONFIG["index"]["max_tombstone_ratio"] 时改为全量重建。
+
+    Returns:
+        (更新后的集合字典, 变更统计)
+    """
+    store_dir, manifest = collection["store_dir"], collection["manifest"]
+    tracked = manifest.get("files", {})
+    diff = diff_sources(paths, tracked)
+    report = {
+        "added_files": len(diff["added"]),
+        "changed_files": len(diff["changed"]),
+        "deleted_files": len(diff["deleted"]),
+        "unchanged_files": len(diff["unchanged"]),
+        "added_chunks": 0,
+        "tombstoned_chunks": 0,
+        "full_rebuild": False
+    }
+    
+    files = {path: dict(diff["states"][path], chunks=tracked[path]["chunks"]) for path in diff["unchanged"]}
+    if not (diff["added"] or diff["changed"] or diff["deleted"]):
+        if files != tracked:
+            # 只有修改时间变化：记录新的状态，下次无需重新计算哈希
+            update_manifest(store_dir, {"files": files})
+            collection = dict(collection, manifest=read_manifest(store_dir))
+        return collection, report
+    
+    records = collection["records"]
+    rows_by_uid: Dict[str, List[int]] = {}
+    for row in np.flatnonzero(records.alive):
+        rows_by_uid.setdefault(records.ids[row].decode('ascii'), []).append(int(row))
     
+    new_records, removed_rows = [], []
+    for path in diff["added"] + diff["changed"]:
+        file_records = _read_source(path, root)
+        old_uids = set(tracked.get(path, {}).get("chunks", []))
+        new_uids = [record["uid"] for record in file_records]
+        new_records.extend(record for record in file_records if record["uid"] not in old_uids)
+        for uid in old_uids - set(new_uids):
+            removed_rows.extend(rows_by_uid.get(uid, []))
+        files[path] = dict(diff["states"][path], chunks=new_uids)
+    for path in diff["deleted"]:
+        for uid in tracked[path]["chunks"]:
+            removed_rows.extend(rows_by_uid.get(uid, []))
+    
+    num_dead = int((~records.alive).sum()) + len(removed_rows)
+    if num_dead > RAG_CONFIG["index"]["max_tombstone_ratio"] * (len(records) + len(new_records)):
+        _build_store(store_dir, paths, root, manifest["settings_fingerprint"])
+        report.update(full_rebuild=True, added_chunks=len(new_records), tombstoned_chunks=len(removed_rows))
+        return _open_collection(store_dir, read_manifest(store_dir)), report
+    
+    texts = [record["text"] for record in new_records]
+    new_embeddings = collection["embedder"].encode(texts) if texts else np.zeros((0, collection["dense"].embeddings.shape[1]), dtype=np.float32)
+    first_row = manifest["count"]
+    manifest = append_store(store_dir, manifest, new_records, new_embeddings, removed_rows, files,
+                            max_segments=RAG_CONFIG["index"]["max_segments"])
+    
+    if collection["ivf"] is not None:
+        collection["ivf"].update(new_embeddings, first_row, removed_rows).save(store_dir)
+        update_manifest(store_dir, {"ivf": dict(manifest["ivf"], count=manifest["count"])})
+    if collection["pq"] is not None:
+        quantizer, codes = collection["pq"]
+        quantizer.save(store_dir, np.concatenate([codes, quantizer.encode(new_embeddings)]))
+        update_manifest(store_dir, {"pq": dict(manifest["pq"], count=manifest["count"])})
+    
+    bm25 = collection["bm25"]
+    if bm25 is not None:
+        for row in removed_rows:
+            bm25.remove(row, tokenize(records.text(row)))
+        bm25.add([tokenize(text) for text in texts])
+    
+    report.update(added_chunks=len(new_records), tombstoned_chunks=len(removed_rows))
+    return _open_collection(store_dir, read_manifest(store_dir), bm25=bm25), report
+
+def reindex_collection(collection_name: str = "default") -> Dict[str, Any]:
+    """
+    增量重新索引：只处理自上次索引以来新增、修改或删除的docx
+
+    在 generate_documents.py / generate_cosmetics_manuals.py 重写语料后调用。
+
     Args:
-        query: 检索查询
-        top_k: 返回结果数量
+        collection_name: 向量集合名称
+
+    Returns:
+        变更统计：各类文件数、新增/墓碑段落数、是否全量重建、索引版本和耗时（毫秒）
+    """
+    start = time.perf_counter()
+    with _INDEX_LOCK:
+        collection = _get_collection(collection_name)
+        collection, report = _apply_source_changes(collection, _collection_sources(collection_name),
+                                                   _collection_root(collection_name))
+        _COLLECTIONS[collection_name] = collection
+        if report["added_chunks"] or report["tombstoned_chunks"] or report["full_rebuild"]:
+            _QUERY_CACHE.invalidate(collection_name)
+    report.update(version=collection["version"], elapsed_ms=(time.perf_counter() - start) * 1000)
+    return report
+
+def _load_ivf(store_dir: str, manifest: Dict[str, Any], embeddings: np.ndarray, dead_rows: np.ndarray):
+    """
+    集合规模达到阈值时加载（或训练）IVF近似索引
+
+    Returns:
+        IVFIndex，规模未达阈值时返回None
+    """
+    ivf_config = RAG_CONFIG["index"]["ivf"]
+    num_vectors = embeddings.shape[0]
+    if num_vectors < ivf_config["min_collection_size"]:
+        return None
+    
+    nlist = ivf_config["nlist"] or default_nlist(num_vectors)
+    saved = manifest.get("ivf", {})
+    if saved.get("count") == num_vectors and saved.get("nlist") == nlist:
+        return IVFIndex.load(store_dir, nprobe=ivf_config["nprobe"])
+    
+    ivf = IVFIndex(nlist=nlist, nprobe=ivf_config["nprobe"], train_sample=ivf_config["train_sample"])
+    ivf.train(embeddings)
+    if len(dead_rows):
+        ivf.update(embeddings[:0], num_vectors, dead_rows)
+    ivf.save(store_dir)
+    update_manifest(store_dir, {"ivf": {"count": num_vectors, "nlist": nlist}})
+    return ivf
+
+def _load_pq(store_dir: str, manifest: Dict[str, Any], embeddings: np.ndarray):
+    """
+    启用乘积量化时加载（或训练并编码）PQ码本与码字
+
+    Returns:
+        (ProductQuantizer, 码字memmap)，未启用时返回None
+    """
+    pq_config = RAG_CONFIG["index"]["pq"]
+    if not pq_config["enabled"]:
+        return None
     
+    num_vectors = embeddings.shape[0]
+    saved = manifest.get("pq", {})
+    if saved.get("count") == num_vectors and saved.get("m") == pq_config["m"]:
+        return ProductQuantizer.load(store_dir, dim=embeddings.shape[1])
+    
+    pq = ProductQuantizer(m=pq_config["m"], train_sample=pq_config["train_sample"]).train(embeddings)
+    pq.save(store_dir, pq.encode(embeddings))
+    update_manifest(store_dir, {"pq": {"count": num_vectors, "m": pq_config["m"]}})
+    return ProductQuantizer.load(store_dir, dim=embeddings.shape[1])
+
+def _get_collection(collection_name: str = "default") -> Dict[str, Any]:
+    """获取进程内共享的向量集合（首次调用时打开）"""
+    collection = _COLLECTIONS.get(collection_name)
+    if collection is None:
+        with _INDEX_LOCK:
+            collection = _COLLECTIONS.get(collection_name)
+            if collection is None:
+                collection = _load_collection(collection_name)
+                _COLLECTIONS[collection_name] = collection
+    return collection
+
+def _get_corpus_index(collection_name: str = "default"):
+    """
+    获取集合的段落记录及BM25索引（BM25在首次关键词检索时构建，已删除段落不进入倒排表）
+
     Returns:
-        检索结果列表，每个结果包含文档名、内容、相关度分数
-    """
-    import json
-    import os
-    
-    # 模拟检索延迟
-    time.sleep(1)
-    
-    # JSON文件路径映射
-    json_files = {
-        "敏感肌": "json/找出敏感肌可用的玻尿酸面膜核心成分.json",
-        "玻尿酸": "json/找出敏感肌可用的玻尿酸面膜核心成分.json",
-        "面膜": "json/找出敏感肌可用的玻尿酸面膜核心成分.json",
-        "抗衰老": "json/确定抗衰老精华中的有效活性成分.json",
-        "精华": "json/确定抗衰老精华中的有效活性成分.json",
-        "活性成分": "json/确定抗衰老精华中的有效活性成分.json",
-        "孕妇": "json/识别孕妇可安全使用的口红配方要求.json",
-        "口红": "json/识别孕妇可安全使用的口红配方要求.json",
-        "安全": "json/识别孕妇可安全使用的口红配方要求.json"
+        (记录序列, BM25Index)
+    """
+    collection = _get_collection(collection_name)
+    if collection["bm25"] is None:
+        with _INDEX_LOCK:
+            if collection["bm25"] is None:
+                records = collection["records"]
+                retrieval_config = RAG_CONFIG["retrieval"]
+                index = BM25Index(k1=retrieval_config["bm25_k1"], b=retrieval_config["bm25_b"])
+                tokenized = [tokenize(records.text(i)) if records.alive[i] else [] for i in range(len(records))]
+                collection["bm25"] = index.build(tokenized, alive=records.alive)
+    return collection["records"], collection["bm25"]
+
+def _get_dense_index(collection_name: str = "default"):
+    """
+    获取集合的段落记录、LSA嵌入模型及稠密索引
+
+    Returns:
+        (记录序列, LsaEmbedder, DenseIndex)
+    """
+    collection = _get_collection(collection_name)
+    return collection["records"], collection["embedder"], collection["dense"]
+
+def _is_fake_source(source: str) -> bool:
+    """文档是否来自虚假文档目录（GAME_CONFIG["documents"]["fake_docs_path"]）"""
+    fake_dir = os.path.abspath(GAME_CONFIG["documents"]["fake_docs_path"])
+    return bool(source) and os.path.dirname(os.path.abspath(source)) == fake_dir
+
+def _format_result(record: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """把语料记录转换为检索结果字典（is_fake 标记段落是否来自虚假文档，用于评分）"""
+    metadata = record.get('metadata', {})
+    return {
+        "document": metadata.get('document_display_name', 'Unknown Document'),
+        "content": record.get('text', ''),
+        "score": score,
+        "paragraph_id": record.get('uid', ''),
+        "is_fake": _is_fake_source(metadata.get('document_source', ''))
     }
+
+def _index_version(manifest: Dict[str, Any]) -> str:
+    """向量存储的版本标识，存储重建或增量更新后都会变化（用于FTS同步和查询缓存失效）"""
+    return f"{manifest['settings_fingerprint']}:{manifest['created_at']}:{manifest['version']}"
+
+def _get_fts_store(collection_name: str = "default") -> FtsChunkStore:
+    """
+    获取与向量集合同步的SQLite FTS5段落存储
+
+    数据库中的版本落后于向量存储时（首次使用或重新索引后），把有效段落同步进去；
+    其他进程已经同步过时直接复用。
+    """
+    collection = _get_collection(collection_name)
+    version = _index_version(collection["manifest"])
+    if _FTS_SYNCED.get(collection_name) != version:
+        with _INDEX_LOCK:
+            if _FTS_SYNCED.get(collection_name) != version:
+                if _FTS_STORE.version(collection_name) != version:
+                    records = collection["records"]
+                    rows = [
+                        (int(row), records[row], " ".join(tokenize(records.text(row))))
+                        for row in np.flatnonzero(records.alive)
+                    ]
+                    _FTS_STORE.sync(collection_name, version, rows)
+                _FTS_SYNCED[collection_name] = version
+    return _FTS_STORE
+
+def _lexical_hits(collection_name: str, query: str, top_k: int):
+    """
+    关键词检索，按 RAG_CONFIG["retrieval"]["lexical_backend"] 选择内存BM25或SQLite FTS5
+
+    Returns:
+        (行号, 分数, 段落记录) 列表，按分数降序
+    """
+    query_tokens = tokenize(query)
+    if RAG_CONFIG["retrieval"]["lexical_backend"] == "sqlite":
+        return _get_fts_store(collection_name).search(collection_name, query_tokens, top_k)
+    records, index = _get_corpus_index(collection_name)
+    return [(doc_id, score, records[doc_id]) for doc_id, score in index.search(query_tokens, top_k)]
+
+def _copy_results(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """复制结果列表中的每个结果字典（及其中的metadata等字典），比deepcopy快得多"""
+    return [
+        {key: dict(value) if isinstance(value, dict) else value for key, value in result.items()}
+        for result in results
+    ]
+
+def _cached_call(key, tag, compute):
+    """
+    通过查询缓存执行 compute()，返回结果的副本（调用方可以放心修改结果字典）
+
+    未命中缓存时，并发的相同请求共享同一次计算；compute() 抛出的异常不会被缓存。
+    """
+    if not RAG_CONFIG["query_cache"]["enabled"]:
+        return _copy_results(_SINGLE_FLIGHT.do(key, compute)[0])
+    hit, value = _QUERY_CACHE.get(key)
+    if not hit:
+        def compute_and_store():
+            result = compute()
+            _QUERY_CACHE.put(key, result, tag=tag)
+            return result
+        value, _ = _SINGLE_FLIGHT.do(key, compute_and_store)
+    return _copy_results(value)
+
+async def _acached_call(key, tag, acompute):
+    """_cached_call 的异步版本，acompute() 返回协程"""
+    if not RAG_CONFIG["query_cache"]["enabled"]:
+        return _copy_results((await _SINGLE_FLIGHT.ado(key, acompute))[0])
+    hit, value = _QUERY_CACHE.get(key)
+    if not hit:
+        async def compute_and_store():
+            result = await acompute()
+            _QUERY_CACHE.put(key, result, tag=tag)
+            return result
+        value, _ = await _SINGLE_FLIGHT.ado(key, compute_and_store)
+    return _copy_results(value)
+
+def _run_sync(coroutine):
+    """
+    在同步代码中运行协程并返回结果
+
+    当前线程没有运行中的事件循环时（Streamlit脚本线程）直接 asyncio.run；
+    已在事件循环中被调用时，放到独立线程的新事件循环中运行，避免嵌套。
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coroutine)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, coroutine).result()
+
+def query_cache_stats() -> Dict[str, Any]:
+    """
+    查询结果缓存的统计信息
+
+    Returns:
+        包含 hit_ratio / hits / misses / entries / memory_bytes 等字段的字典，
+        coalesced 为与并发的相同请求合并计算的次数
+    """
+    return dict(_QUERY_CACHE.stats(), coalesced=_SINGLE_FLIGHT.stats()["coalesced"])
+
+def _format_lexical_hits(hits) -> List[Dict[str, Any]]:
+    """把关键词检索命中格式化为结果列表，分数按最高分归一化到0-1"""
+    if not hits:
+        return []
+    max_score = hits[0][1]
+    return [_format_result(record, score / max_score) for _, score, record in hits]
+
+def search_documents(query: str, top_k: int = None, collection_name: str = "default") -> List[Dict[str, Any]]:
+    """
+    文档检索函数
+
+    基于 documents/real 和 documents/fake 构建的BM25索引检索；
+    lexical_backend 为 "sqlite" 时查询多进程共享的FTS5数据库，否则使用进程内倒排索引。
+    
+    Args:
+        query: 检索查询
+        top_k: 返回结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        collection_name: 集合名称
     
-    # 根据查询关键词选择对应的JSON文件
-    selected_file = None
-    for keyword, file_path in json_files.items():
-        if keyword in query:
-            selected_file = file_path
-            break
+    Returns:
+        检索结果列表，每个结果包含文档名、内容、相关度分数（按最高分归一化到0-1）
+    """
+    if top_k is None:
+        top_k = RAG_CONFIG["retrieval"]["top_k"]
     
-    # 如果没有匹配的关键词，默认使用第一个文件
-    if not selected_file:
-        selected_file = "json/找出敏感肌可用的玻尿酸面膜核心成分.json"
+    # 用规范化后的查询检索，缓存键相同的查询结果一定相同
+    query = normalize_query(query)
     
     try:
-        # 读取JSON文件
-        with open(selected_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        # 提取documents数据并转换为所需格式
-        results = []
-        documents = data.get('documents', [])
-        
-        for doc in documents[:top_k]:
-            result = {
-                "document": doc.get('metadata', {}).get('document_display_name', 'Unknown Document'),
-                "content": doc.get('text', ''),
-                "score": doc.get('score', 0.0),
-                "paragraph_id": doc.get('uid', '')
-            }
-            results.append(result)
+        def compute():
+            return _format_lexical_hits(_lexical_hits(collection_name, query, top_k))
         
-        return results
+        version = _index_version(_get_collection(collection_name)["manifest"])
+        key = ("search_documents", query, top_k, collection_name,
+               RAG_CONFIG["retrieval"]["lexical_backend"], version)
+        return _cached_call(key, collection_name, compute)
     
-    except (FileNotFoundError, json.JSONDecodeError, KeyError) as e:
-        # 如果读取JSON文件失败，返回默认结果
-        print(f"Error reading JSON file: {e}")
+    except (OSError, json.JSONDecodeError, sqlite3.OperationalError) as e:
+        # 文档目录或索引文件缺失、无法读取时，返回默认结果
+        print(f"Error building document index: {e}")
         
         # 默认返回值 - 模拟化妆品相关文档检索结果
         default_results = [
@@ -115,10 +538,97 @@ def search_documents(query: str, top_k: int = 10) -> List[Dict[str, Any]]:
         ]
         
         return default_results[:top_k]
+    except Exception as e:
+        # 其他错误（索引或缓存的程序错误）不能用默认结果掩盖
+        print(f"Error searching documents: {e}")
+        raise
+
+def search_documents_batch(queries: List[str], top_k: int = None,
+                           collection_name: str = "default") -> List[List[Dict[str, Any]]]:
+    """
+    批量文档检索，用于离线评估和缓存预热
+
+    先查查询缓存，未命中的查询一起分词，用一次稀疏矩阵乘法完成BM25打分，
+    结果写回缓存。使用SQLite FTS5后端时逐个查询。
+    
+    Args:
+        queries: 查询列表
+        top_k: 每个查询返回的结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        collection_name: 集合名称
+    
+    Returns:
+        与输入顺序一致的结果列表，每项与 search_documents 的返回值格式相同
+    """
+    if top_k is None:
+        top_k = RAG_CONFIG["retrieval"]["top_k"]
+    
+    backend = RAG_CONFIG["retrieval"]["lexical_backend"]
+    version = _index_version(_get_collection(collection_name)["manifest"])
+    normalized = [normalize_query(query) for query in queries]
+    keys = [("search_documents", query, top_k, collection_name, backend, version) for query in normalized]
+    use_cache = RAG_CONFIG["query_cache"]["enabled"]
+    
+    # 规范化后相同的查询只计算一次
+    computed: Dict[Any, List[Dict[str, Any]]] = {}
+    missing: Dict[Any, str] = {}
+    for query, key in zip(normalized, keys):
+        if key in computed or key in missing:
+            continue
+        hit, value = _QUERY_CACHE.get(key) if use_cache else (False, None)
+        if hit:
+            computed[key] = value
+        else:
+            missing[key] = query
+    
+    if missing:
+        if backend == "sqlite":
+            hit_lists = [_lexical_hits(collection_name, query, top_k) for query in missing.values()]
+        else:
+            records, index = _get_corpus_index(collection_name)
+            fetched: Dict[int, Dict[str, Any]] = {}
+            hit_lists = [
+                [(doc_id, score, fetched.get(doc_id) or fetched.setdefault(doc_id, records[doc_id])) for doc_id, score in hits]
+                for hits in index.search_batch([tokenize(query) for query in missing.values()], top_k)
+            ]
+        for key, hits in zip(missing, hit_lists):
+            computed[key] = _format_lexical_hits(hits)
+            if use_cache:
+                _QUERY_CACHE.put(key, computed[key], tag=collection_name)
+    
+    return [_copy_results(computed[key]) for key in keys]
+
+async def asearch_documents(query: str, top_k: int = None, collection_name: str = "default") -> List[Dict[str, Any]]:
+    """
+    异步文档检索
+
+    检索是CPU密集的本地计算，放到线程池执行，事件循环可同时处理其他请求。
+    
+    Args:
+        query: 检索查询
+        top_k: 返回结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        collection_name: 集合名称
+    
+    Returns:
+        与 search_documents 相同格式的结果列表
+    """
+    return await asyncio.to_thread(search_documents, query, top_k, collection_name)
 
 def rerank_results(initial_results: List[Dict[str, Any]], query: str = "") -> List[Dict[str, Any]]:
     """
-    重排序检索结果
+    重排序检索结果（arerank_results 的同步包装）
+    
+    Args:
+        initial_results: 初始检索结果
+        query: 原始查询（可选）
+    
+    Returns:
+        重排序后的结果列表
+    """
+    return _run_sync(arerank_results(initial_results, query))
+
+async def arerank_results(initial_results: List[Dict[str, Any]], query: str = "") -> List[Dict[str, Any]]:
+    """
+    异步重排序检索结果
     
     Args:
         initial_results: 初始检索结果
@@ -129,21 +639,32 @@ def rerank_results(initial_results: List[Dict[str, Any]], query: str = "") -> Li
     
     TODO: 替换为真实的重排序模型实现
     """
-    # 模拟重排序延迟
-    time.sleep(0.5)
+    # 重排序使用与缓存键相同的规范化查询
+    query = normalize_query(query)
+    key = ("rerank_results", query, tuple(
+        (result.get('document'), result.get('paragraph_id'), result.get('content', ''), result.get('score'))
+        for result in initial_results
+    ))
+    return await _acached_call(key, "rerank", lambda: _arerank(initial_results, query))
+
+async def _arerank(initial_results: List[Dict[str, Any]], query: str) -> List[Dict[str, Any]]:
+    """按内容质量调整分数并重新排序（未命中缓存时执行；query 为规范化后的查询，当前的质量打分规则不使用它）"""
+    # 模拟重排序延迟（不阻塞事件循环）
+    await asyncio.sleep(0.5)
     
     # 简单的重排序逻辑：根据质量分数重新排序
     reranked = []
     for result in initial_results:
         new_result = result.copy()
         
-        # 模拟重排序分数计算
+        # 模拟重排序分数计算（一次扫描找出全部质量信号词）
+        signals = _RERANK_MATCHER.matched(result['content'])
         quality_penalty = 0
-        if "优惠" in result['content'] or "购买" in result['content']:
+        if "优惠" in signals or "购买" in signals:
             quality_penalty = -0.3  # 广告内容降权
-        elif "所有" in result['content'] and "都" in result['content']:
+        elif "所有" in signals and "都" in signals:
             quality_penalty = -0.2  # 绝对化表述降权
-        elif "临床" in result['content'] or "研究" in result['content']:
+        elif "临床" in signals or "研究" in signals:
             quality_penalty = 0.1   # 科学内容加权
         
         new_result['new_score'] = result['score'] + quality_penalty
@@ -157,7 +678,20 @@ def rerank_results(initial_results: List[Dict[str, Any]], query: str = "") -> Li
 
 def generate_answer(context: str, query: str = "") -> str:
     """
-    基于上下文生成答案
+    基于上下文生成答案（agenerate_answer 的同步包装）
+    
+    Args:
+        context: 检索到的上下文信息
+        query: 原始查询
+    
+    Returns:
+        生成的答案文本
+    """
+    return _run_sync(agenerate_answer(context, query))
+
+async def agenerate_answer(context: str, query: str = "") -> str:
+    """
+    异步基于上下文生成答案
     
     Args:
         context: 检索到的上下文信息
@@ -168,8 +702,8 @@ def generate_answer(context: str, query: str = "") -> str:
     
     TODO: 替换为真实的生成模型实现
     """
-    # 模拟生成延迟
-    time.sleep(2)
+    # 模拟生成延迟（不阻塞事件循环）
+    await asyncio.sleep(2)
     
     # 默认答案模板
     default_answers = {
@@ -238,12 +772,13 @@ def generate_answer(context: str, query: str = "") -> str:
         """
     }
     
-    # 根据上下文内容选择合适的答案
-    if "玻尿酸" in context or "敏感肌" in context:
+    # 根据上下文内容选择合适的答案（一次扫描上下文找出全部主题词）
+    topics = _ANSWER_TOPIC_MATCHER.matched(context)
+    if "玻尿酸" in topics or "敏感肌" in topics:
         return default_answers["玻尿酸"]
-    elif "孕妇" in context or "口红" in context:
+    elif "孕妇" in topics or "口红" in topics:
         return default_answers["孕妇口红"]
-    elif "抗衰老" in context or "精华" in context:
+    elif "抗衰老" in topics or "精华" in topics:
         return default_answers["抗衰老精华"]
     else:
         return """
@@ -302,51 +837,202 @@ def evaluate_answer(answer: str, reference: str = "") -> int:
     if "**" in answer or "##" in answer:  # 包含格式化
         score += 2
     
-    # 内容评估
-    key_terms = ["成分", "浓度", "安全", "建议", "避免", "推荐"]
-    for term in key_terms:
-        if term in answer:
-            score += 1
-    
-    # 专业性评估
-    professional_terms = ["透明质酸", "神经酰胺", "烟酰胺", "视黄醇", "胜肽"]
-    for term in professional_terms:
-        if term in answer:
-            score += 1
+    # 内容评估与专业性评估：每个出现过的关键术语/专业术语加1分
+    score += len(_ANSWER_TERMS_MATCHER.matched(answer))
     
     return min(score, 10)  # 最高10分
 
-def vector_search(query: str, collection_name: str = "default") -> List[Dict[str, Any]]:
+def vector_search(query: str, collection_name: str = "default", top_k: int = None,
+                  nprobe: int = None) -> List[Dict[str, Any]]:
     """
     向量检索接口
+
+    向量存储以内存映射方式打开，多个进程共享同一份页缓存。
+    集合规模超过 RAG_CONFIG["index"]["ivf"]["min_collection_size"] 时使用IVF近似检索，
+    否则暴力计算余弦相似度。启用PQ时先用压缩码字粗排，再用全精度向量精排候选。
     
     Args:
         query: 查询文本
+        collection_name: 向量集合名称（见 RAG_CONFIG["index"]["collections"]）
+        top_k: 返回结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        nprobe: IVF探测簇数，默认取配置值；越大召回越高、速度越慢
+    
+    Returns:
+        检索结果，score为查询与段落的余弦相似度
+    """
+    if top_k is None:
+        top_k = RAG_CONFIG["retrieval"]["top_k"]
+    
+    collection = _get_collection(collection_name)
+    query_vectors = collection["embedder"].encode([query])
+    hits = _dense_hits(collection, query_vectors, top_k, nprobe)[0]
+    return [_format_result(collection["records"][doc_id], score) for doc_id, score in hits]
+
+def vector_search_batch(queries: List[str], collection_name: str = "default", top_k: int = None,
+                        nprobe: int = None) -> List[List[Dict[str, Any]]]:
+    """
+    批量向量检索：一次编码全部查询，暴力检索时用一次矩阵乘法打分
+    
+    Args:
+        queries: 查询列表
         collection_name: 向量集合名称
+        top_k: 每个查询返回的结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        nprobe: IVF探测簇数
     
     Returns:
-        检索结果
+        与输入顺序一致的结果列表，每项与 vector_search 的返回值格式相同
+    """
+    if top_k is None:
+        top_k = RAG_CONFIG["retrieval"]["top_k"]
+    if not queries:
+        return []
     
-    TODO: 替换为真实的向量数据库实现（如Chroma、Pinecone等）
+    collection = _get_collection(collection_name)
+    records = collection["records"]
+    hit_lists = _dense_hits(collection, collection["embedder"].encode(queries), top_k, nprobe)
+    return [[_format_result(records[doc_id], score) for doc_id, score in hits] for hits in hit_lists]
+
+def _dense_hits(collection: Dict[str, Any], query_vectors: np.ndarray, top_k: int, nprobe: int = None):
+    """按集合已启用的索引（暴力 / IVF / PQ / IVF+PQ）检索向量"""
+    embeddings = collection["dense"].embeddings
+    ivf, pq = collection["ivf"], collection["pq"]
+    if pq is not None:
+        quantizer, codes = pq
+        candidate_ids = None
+        if ivf is not None:
+            candidate_ids = [ivf.candidates(query, nprobe) for query in query_vectors]
+        return quantizer.search(codes, embeddings, query_vectors, top_k,
+                                rerank_k=RAG_CONFIG["index"]["pq"]["rerank_k"], candidate_ids=candidate_ids,
+                                excluded_ids=collection["dense"].excluded_ids)
+    if ivf is not None:
+        return ivf.search(embeddings, query_vectors, top_k, nprobe=nprobe)
+    return collection["dense"].search(query_vectors, top_k)
+
+def evaluate_vector_recall(collection_name: str = "default", num_queries: int = 200, top_k: int = None,
+                           nprobe_values: List[int] = None) -> List[Dict[str, Any]]:
     """
-    # 调用主检索函数
-    return search_documents(query)
+    评估IVF近似检索相对暴力检索的召回率，用于选择 nprobe
 
-def hybrid_search(query: str, alpha: float = 0.7) -> List[Dict[str, Any]]:
+    以集合中随机抽取的段落向量作为查询。集合尚未建立IVF时临时训练一个。
+
+    Args:
+        collection_name: 向量集合名称
+        num_queries: 抽样查询数量
+        top_k: 评估的结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        nprobe_values: 待评估的 nprobe 列表
+
+    Returns:
+        每个 nprobe 一条记录：nprobe、recall、ivf_ms、exact_ms
+    """
+    if top_k is None:
+        top_k = RAG_CONFIG["retrieval"]["top_k"]
+    
+    collection = _get_collection(collection_name)
+    embeddings = collection["dense"].embeddings
+    ivf = collection["ivf"]
+    if ivf is None:
+        ivf_config = RAG_CONFIG["index"]["ivf"]
+        ivf = IVFIndex(
+            nlist=ivf_config["nlist"] or default_nlist(embeddings.shape[0]),
+            train_sample=ivf_config["train_sample"]
+        ).train(embeddings)
+    
+    rng = np.random.default_rng(0)
+    sample = rng.choice(embeddings.shape[0], min(num_queries, embeddings.shape[0]), replace=False)
+    return measure_recall(ivf, embeddings, np.asarray(embeddings[np.sort(sample)]), top_k, nprobe_values)
+
+def _timed(func, *args):
+    """执行函数并返回 (结果, 耗时毫秒)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+def _lexical_leg(collection_name: str, query: str, candidate_k: int):
+    return [(doc_id, score) for doc_id, score, _ in _lexical_hits(collection_name, query, candidate_k)]
+
+def _vector_leg(collection_name: str, query: str, candidate_k: int):
+    collection = _get_collection(collection_name)
+    return _dense_hits(collection, collection["embedder"].encode([query]), candidate_k)[0]
+
+def _min_max(hits) -> Dict[int, float]:
+    """把一路结果的分数min-max归一化到0-1（分数全部相同时记为1）"""
+    if not hits:
+        return {}
+    scores = [score for _, score in hits]
+    low, high = min(scores), max(scores)
+    span = high - low
+    return {doc_id: (score - low) / span if span > 0 else 1.0 for doc_id, score in hits}
+
+def hybrid_search(query: str, alpha: float = 0.7, fusion: str = None, top_k: int = None,
+                  collection_name: str = "default") -> List[Dict[str, Any]]:
     """
     混合检索（向量+关键词）
+
+    BM25与向量两路检索在线程池中并行执行，再按 fusion 融合：
+    - "minmax": 两路分数分别min-max归一化后按 alpha 加权求和
+    - "rrf": 倒数排名融合 sum(1 / (rrf_k + rank))，与分数尺度无关，不使用 alpha
     
     Args:
         query: 查询文本
-        alpha: 向量检索权重
+        alpha: 向量检索权重（关键词检索权重为 1 - alpha）
+        fusion: 融合方式，默认取 RAG_CONFIG["hybrid"]["fusion"]
+        top_k: 返回结果数量，默认取 RAG_CONFIG["retrieval"]["top_k"]
+        collection_name: 向量集合名称
     
     Returns:
-        混合检索结果
-    
-    TODO: 实现真实的混合检索逻辑
+        混合检索结果，每个结果的 metadata 中包含两路原始分数、排名和各路耗时（毫秒）
     """
-    # 简化实现：直接返回向量检索结果
-    return search_documents(query)
+    hybrid_config = RAG_CONFIG["hybrid"]
+    fusion = fusion or hybrid_config["fusion"]
+    if fusion not in ("minmax", "rrf"):
+        raise ValueError(f"未知的融合方式: {fusion}")
+    if top_k is None:
+        top_k = RAG_CONFIG["retrieval"]["top_k"]
+    candidate_k = max(top_k, hybrid_config["candidate_k"])
+    
+    start = time.perf_counter()
+    lexical_future = _HYBRID_EXECUTOR.submit(_timed, _lexical_leg, collection_name, query, candidate_k)
+    vector_future = _HYBRID_EXECUTOR.submit(_timed, _vector_leg, collection_name, query, candidate_k)
+    lexical_hits, lexical_ms = lexical_future.result()
+    vector_hits, vector_ms = vector_future.result()
+    
+    lexical_ranks = {doc_id: rank for rank, (doc_id, _) in enumerate(lexical_hits, 1)}
+    vector_ranks = {doc_id: rank for rank, (doc_id, _) in enumerate(vector_hits, 1)}
+    if fusion == "minmax":
+        lexical_norm, vector_norm = _min_max(lexical_hits), _min_max(vector_hits)
+        fused = {
+            doc_id: alpha * vector_norm.get(doc_id, 0.0) + (1 - alpha) * lexical_norm.get(doc_id, 0.0)
+            for doc_id in set(lexical_norm) | set(vector_norm)
+        }
+    else:
+        rrf_k = hybrid_config["rrf_k"]
+        fused = {
+            doc_id: sum(1.0 / (rrf_k + ranks[doc_id]) for ranks in (lexical_ranks, vector_ranks) if doc_id in ranks)
+            for doc_id in set(lexical_ranks) | set(vector_ranks)
+        }
+    
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)[:top_k]
+    timings = {
+        "lexical": lexical_ms,
+        "vector": vector_ms,
+        "total": (time.perf_counter() - start) * 1000
+    }
+    
+    records = _get_collection(collection_name)["records"]
+    lexical_scores, vector_scores = dict(lexical_hits), dict(vector_hits)
+    results = []
+    for doc_id, score in ranked:
+        result = _format_result(records[doc_id], score)
+        result["metadata"] = {
+            "fusion": fusion,
+            "lexical_score": lexical_scores.get(doc_id),
+            "vector_score": vector_scores.get(doc_id),
+            "lexical_rank": lexical_ranks.get(doc_id),
+            "vector_rank": vector_ranks.get(doc_id),
+            "timings_ms": timings
+        }
+        results.append(result)
+    return results
 
 def get_embedding(text: str) -> List[float]:
     """
@@ -356,12 +1042,30 @@ def get_embedding(text: str) -> List[float]:
         text: 输入文本
     
     Returns:
-        嵌入向量
-    
-    TODO: 替换为真实的嵌入模型（如OpenAI、Sentence-BERT等）
+        L2归一化的LSA嵌入向量（维度见 RAG_CONFIG["embedding"]["dim"]）
+    """
+    _, embedder, _ = _get_dense_index()
+    return embedder.encode([text])[0].tolist()
+
+def get_text_encoder(collection_name: str = "default", load: bool = True):
     """
-    # 返回随机向量作为示例
-    return [random.random() for _ in range(768)]
+    获取集合的LSA嵌入模型及其版本（用于LLM语义缓存）
+
+    Args:
+        collection_name: 集合名称
+        load: 集合尚未在本进程中打开时是否打开（可能需要解析全部文档并训练模型）
+
+    Returns:
+        (LsaEmbedder, 嵌入模型版本)；全量重建后模型重新训练，版本随之变化。
+        load 为 False 且集合尚未打开时返回 None
+    """
+    collection = _COLLECTIONS.get(collection_name)
+    if collection is None:
+        if not load:
+            return None
+        collection = _get_collection(collection_name)
+    manifest = collection["manifest"]
+    return collection["embedder"], f"{manifest['settings_fingerprint']}:{manifest['created_at']}"
 
 def calculate_similarity(vec1: List[float], vec2: List[float]) -> float:
     """
@@ -372,12 +1076,14 @@ def calculate_similarity(vec1: List[float], vec2: List[float]) -> float:
         vec2: 向量2
     
     Returns:
-        相似度分数
-    
-    TODO: 实现真实的相似度计算（余弦相似度等）
+        余弦相似度，任一向量为零向量时返回0
     """
-    # 简化实现
-    return random.uniform(0.3, 0.95)
+    a = np.asarray(vec1, dtype=np.float32)
+    b = np.asarray(vec2, dtype=np.float32)
+    denominator = float(np.linalg.norm(a) * np.linalg.norm(b))
+    if denominator == 0:
+        return 0.0
+    return float(a @ b) / denominator
 
 # 游戏相关的辅助函数
 def get_game_documents() -> List[str]:
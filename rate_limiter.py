@@ -0,0 +1,197 @@
+"""LLM调用限流模块
+
+令牌桶限制调用速率（每个团队一个桶，另有一个全局桶），信号量限制同时进行中的请求数。
+额度不足时调用方排队等待而不是立即失败，超过截止时间仍未拿到额度才抛出 RateLimitTimeout。
+
+令牌桶采用预约方式：取令牌时允许余额为负，负数部分按速率折算为需要等待的时间，
+排队的调用方因此按到达顺序依次获得额度。
+"""
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+
+class RateLimitTimeout(Exception):
+    """在截止时间前没有拿到调用额度"""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        """
+        Args:
+            rate_per_minute: 每分钟补充的令牌数
+            burst: 桶容量（允许的突发请求数）
+        """
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self, now: float) -> float:
+        """取一个令牌，返回需要等待的秒数（余额不足时为负数余额折算的时间）"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return max(0.0, -self.tokens / self.rate)
+
+    def cancel(self):
+        """退还 reserve 取走的令牌"""
+        self.tokens = min(self.capacity, self.tokens + 1)
+
+
+class LlmRateLimiter:
+    POLL_INTERVAL = 0.05  # 异步调用方等待空闲名额的轮询间隔（秒）
+
+    def __init__(self, per_key_rpm: float = 30, global_rpm: float = 120, burst: int = 5,
+                 max_in_flight: int = 8, max_wait_seconds: float = 30, enabled: bool = True):
+        """
+        初始化限流器
+
+        Args:
+            per_key_rpm: 每个键（团队）每分钟最多请求数
+            global_rpm: 全进程每分钟最多请求数
+            burst: 每个令牌桶允许的突发请求数
+            max_in_flight: 同时进行中的请求上限
+            max_wait_seconds: 默认的最长排队时间
+            enabled: 为False时不做任何限制
+        """
+        self.per_key_rpm = per_key_rpm
+        self.burst = burst
+        self.max_wait_seconds = max_wait_seconds
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._global = TokenBucket(global_rpm, burst)
+        self._buckets: Dict[Hashable, TokenBucket] = {}
+        self._slots = threading.BoundedSemaphore(max_in_flight)
+        self.max_in_flight = max_in_flight
+        self._stats = {
+            "requests": 0, "waited": 0, "timeouts": 0,
+            "queue_depth": 0, "max_queue_depth": 0, "in_flight": 0,
+            "total_wait_seconds": 0.0, "max_wait_seconds": 0.0
+        }
+
+    def _reserve(self, key: Optional[Hashable], deadline: float) -> Tuple[float, List[TokenBucket]]:
+        """在全局桶和键对应的桶中各预约一个令牌，返回 (需要等待的秒数, 预约的桶)；超过截止时间时退还令牌并抛出异常"""
+        with self._lock:
+            now = time.monotonic()
+            buckets = [self._global]
+            if key is not None:
+                if key not in self._buckets:
+                    self._buckets[key] = TokenBucket(self.per_key_rpm, self.burst)
+                buckets.append(self._buckets[key])
+            wait = max(bucket.reserve(now) for bucket in buckets)
+            if now + wait > deadline:
+                for bucket in buckets:
+                    bucket.cancel()
+                self._stats["timeouts"] += 1
+                raise RateLimitTimeout(f"请求过于频繁，排队 {deadline - now:.0f} 秒内无法获得调用额度，请稍后重试")
+            return wait, buckets
+
+    def _refund(self, buckets: List[TokenBucket]):
+        """没有发出请求（等待进行中名额超时或被取消）时退还预约的令牌"""
+        with self._lock:
+            for bucket in buckets:
+                bucket.cancel()
+
+    def _enter_queue(self):
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["queue_depth"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+
+    def _leave_queue(self, waited: float, acquired: bool):
+        with self._lock:
+            self._stats["queue_depth"] -= 1
+            if not acquired:
+                return
+            self._stats["in_flight"] += 1
+            if waited > 0.001:
+                self._stats["waited"] += 1
+            self._stats["total_wait_seconds"] += waited
+            self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], waited)
+
+    def _release(self):
+        self._slots.release()
+        with self._lock:
+            self._stats["in_flight"] -= 1
+
+    def _timeout(self):
+        with self._lock:
+            self._stats["timeouts"] += 1
+        return RateLimitTimeout("同时进行中的请求过多，排队超时，请稍后重试")
+
+    @contextmanager
+    def limit(self, key: Optional[Hashable] = None, timeout: float = None):
+        """
+        获取一次调用额度，在 with 块结束前占用一个进行中请求名额
+
+        Args:
+            key: 限流键（如团队名），None 表示只受全局限制
+            timeout: 最长排队秒数，默认为 max_wait_seconds
+
+        Raises:
+            RateLimitTimeout: 截止时间前没有获得额度
+        """
+        if not self.enabled:
+            yield
+            return
+        start = time.monotonic()
+        deadline = start + (self.max_wait_seconds if timeout is None else timeout)
+        self._enter_queue()
+        acquired, buckets = False, []
+        try:
+            wait, buckets = self._reserve(key, deadline)
+            if wait > 0:
+                time.sleep(wait)
+            acquired = self._slots.acquire(timeout=max(0.0, deadline - time.monotonic()))
+            if not acquired:
+                raise self._timeout()
+        finally:
+            if not acquired:
+                self._refund(buckets)
+            self._leave_queue(time.monotonic() - start, acquired)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def alimit(self, key: Optional[Hashable] = None, timeout: float = None):
+        """limit 的异步版本：排队期间不阻塞事件循环"""
+        if not self.enabled:
+            yield
+            return
+        start = time.monotonic()
+        deadline = start + (self.max_wait_seconds if timeout is None else timeout)
+        self._enter_queue()
+        acquired, buckets = False, []
+        try:
+            wait, buckets = self._reserve(key, deadline)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            # 轮询空闲名额（协程被取消时不会留下占用名额的后台线程）
+            while not self._slots.acquire(blocking=False):
+                if time.monotonic() >= deadline:
+                    raise self._timeout()
+                await asyncio.sleep(self.POLL_INTERVAL)
+            acquired = True
+        finally:
+            if not acquired:
+                self._refund(buckets)
+            self._leave_queue(time.monotonic() - start, acquired)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回排队深度、进行中请求数、等待次数、平均/最长等待时间和超时次数"""
+        with self._lock:
+            stats = dict(self._stats)
+        acquired = stats["requests"] - stats["queue_depth"] - stats["timeouts"]
+        stats["avg_wait_seconds"] = stats["total_wait_seconds"] / acquired if acquired > 0 else 0.0
+        stats["max_in_flight"] = self.max_in_flight
+        return stats
@@ -0,0 +1,253 @@
+"""LLM语义缓存模块
+
+精确匹配缓存未命中时，用本地嵌入模型编码用户输入，在同一作用域（相同的system prompt/检索上下文、
+对话历史和模型参数）内查找最相似的历史输入；余弦相似度达到阈值即复用其回复。
+LSA嵌入模型会丢弃词表外的词元，只有全部词元都在词表中的输入才参与比较（见 LsaEmbedder.covers）。
+
+条目保存在SQLite中供多个进程共享（每个线程复用一个连接），每个作用域的向量在进程内缓存为一个NumPy矩阵，
+查找时一次矩阵乘法得到全部相似度；其他进程写入新条目后自动重新加载。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config import LLM_CONFIG
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS semantic_entries (
+    id INTEGER PRIMARY KEY,
+    scope TEXT NOT NULL,
+    prompt TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    content TEXT NOT NULL,
+    reasoning TEXT,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS semantic_entries_scope ON semantic_entries (scope);
+CREATE INDEX IF NOT EXISTS semantic_entries_last_used ON semantic_entries (last_used);
+"""
+
+
+def make_scope(system_prompt: str, context: Optional[str], history: List[Dict[str, Any]],
+               embedder_version: str, **params) -> str:
+    """
+    计算语义缓存的作用域：只有作用域完全相同的条目之间才做相似度比较
+
+    Args:
+        system_prompt: 完整的system prompt
+        context: 除system prompt外必须完全一致的上下文（检索文档、代码等），没有时为None
+        history: 当前用户输入之前的对话历史（不含system prompt）
+        embedder_version: 嵌入模型版本，模型重新训练后旧向量不可比较
+        **params: 模型名称、采样参数等
+
+    Returns:
+        SHA-256十六进制摘要
+    """
+    payload = json.dumps(
+        {"system": system_prompt, "context": context, "history": history,
+         "embedder": embedder_version, "params": params},
+        ensure_ascii=False, sort_keys=True, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class SemanticCache:
+    def __init__(self, db_path: str, threshold: float = 0.92, max_entries: int = 2000):
+        """
+        初始化语义缓存
+
+        Args:
+            db_path: SQLite数据库文件路径
+            threshold: 复用回复所需的最低余弦相似度
+            max_entries: 最多保存的条目数，超出时淘汰最久未使用的条目
+        """
+        self.db_path = db_path
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # 作用域 -> ((条目数, 最大id), 条目id数组, (n, dim) 向量矩阵)
+        self._scopes: Dict[str, Tuple[Tuple[int, int], np.ndarray, np.ndarray]] = {}
+        self._stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        """返回当前线程的连接（首次调用时打开并建表）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.db_path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self._stats[name] += amount
+
+    def _scope_matrix(self, conn: sqlite3.Connection, scope: str) -> Tuple[np.ndarray, np.ndarray]:
+        """返回作用域内全部条目的 (id数组, 向量矩阵)，数据库中的条目变化时重新加载"""
+        signature = conn.execute(
+            "SELECT COUNT(*), COALESCE(MAX(id), 0) FROM semantic_entries WHERE scope = ?", (scope,)
+        ).fetchone()
+        with self._lock:
+            cached = self._scopes.get(scope)
+        if cached is not None and cached[0] == signature:
+            return cached[1], cached[2]
+
+        rows = conn.execute("SELECT id, embedding FROM semantic_entries WHERE scope = ? ORDER BY id", (scope,)).fetchall()
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        matrix = np.stack([np.frombuffer(row[1], dtype=np.float32) for row in rows]) if rows else np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            self._scopes[scope] = (signature, ids, matrix)
+        return ids, matrix
+
+    def lookup(self, scope: str, vector: np.ndarray) -> Tuple[bool, Optional[str], Optional[str], float]:
+        """
+        在作用域内查找与输入向量最相似的条目
+
+        Args:
+            scope: make_scope 计算的作用域
+            vector: L2归一化的输入向量
+
+        Returns:
+            (是否命中, 回复内容, 推理内容, 最高相似度)
+        """
+        vector = np.asarray(vector, dtype=np.float32)
+        row = None
+        similarity = 0.0
+        try:
+            conn = self._connection()
+            ids, matrix = self._scope_matrix(conn, scope)
+            if len(ids) and matrix.shape[1] == vector.shape[0]:
+                scores = matrix @ vector
+                best = int(np.argmax(scores))
+                similarity = float(scores[best])
+                if similarity >= self.threshold:
+                    with conn:
+                        row = conn.execute(
+                            "SELECT content, reasoning FROM semantic_entries WHERE id = ?", (int(ids[best]),)
+                        ).fetchone()
+                        if row is not None:
+                            conn.execute(
+                                "UPDATE semantic_entries SET last_used = ?, hits = hits + 1 WHERE id = ?",
+                                (time.time(), int(ids[best]))
+                            )
+        except sqlite3.Error as e:
+            print(f"读取语义缓存失败: {e}")
+            row = None
+
+        if row is None:
+            self._count("misses")
+            return False, None, None, similarity
+        self._count("hits")
+        return True, row[0], row[1], similarity
+
+    def add(self, scope: str, prompt: str, vector: np.ndarray, content: str, reasoning: Optional[str] = None):
+        """
+        写入条目，超出容量时淘汰最久未使用的条目
+
+        Args:
+            scope: make_scope 计算的作用域
+            prompt: 被编码的用户输入（用于统计展示）
+            vector: L2归一化的输入向量
+            content: 回复内容
+            reasoning: 推理内容（没有时为None）
+        """
+        now = time.time()
+        try:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "INSERT INTO semantic_entries (scope, prompt, embedding, content, reasoning, created_at, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (scope, prompt, np.asarray(vector, dtype=np.float32).tobytes(), content, reasoning, now, now)
+                )
+                excess = conn.execute("SELECT COUNT(*) FROM semantic_entries").fetchone()[0] - self.max_entries
+                if excess > 0:
+                    conn.execute(
+                        "DELETE FROM semantic_entries WHERE id IN "
+                        "(SELECT id FROM semantic_entries ORDER BY last_used LIMIT ?)", (excess,)
+                    )
+        except sqlite3.Error as e:
+            print(f"写入语义缓存失败: {e}")
+            return
+        self._count("writes")
+        self._count("evictions", max(excess, 0))
+
+    def entry_stats(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        返回命中次数最多的条目
+
+        Args:
+            limit: 返回条目数
+
+        Returns:
+            字典列表，包含 prompt / hits / created_at / last_used
+        """
+        if not os.path.exists(self.db_path):
+            return []
+        rows = self._connection().execute(
+            "SELECT prompt, hits, created_at, last_used FROM semantic_entries "
+            "ORDER BY hits DESC, last_used DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [
+            {"prompt": prompt, "hits": hits, "created_at": created_at, "last_used": last_used}
+            for prompt, hits, created_at, last_used in rows
+        ]
+
+    def clear(self) -> int:
+        """删除全部条目，返回删除的条目数"""
+        conn = self._connection()
+        with conn:
+            deleted = conn.execute("DELETE FROM semantic_entries").rowcount
+        with self._lock:
+            self._scopes.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """返回本进程的命中/未命中/写入/淘汰计数，以及数据库中的条目数和累计命中次数"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = stats["hits"] / lookups if lookups else 0.0
+
+        entries, total_hits = 0, 0
+        if os.path.exists(self.db_path):
+            try:
+                entries, total_hits = self._connection().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM semantic_entries"
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"读取语义缓存统计失败: {e}")
+        stats.update(entries=entries, total_hits=total_hits, threshold=self.threshold)
+        return stats
+
+
+_CACHE_LOCK = threading.Lock()
+_SEMANTIC_CACHE: Optional[SemanticCache] = None
+
+
+def get_semantic_cache() -> SemanticCache:
+    """返回按 LLM_CONFIG["semantic_cache"] 配置的进程级语义缓存"""
+    global _SEMANTIC_CACHE
+    with _CACHE_LOCK:
+        if _SEMANTIC_CACHE is None:
+            cache_config = LLM_CONFIG["semantic_cache"]
+            _SEMANTIC_CACHE = SemanticCache(
+                cache_config["db_path"],
+                threshold=cache_config["similarity_threshold"],
+                max_entries=cache_config["max_entries"]
+            )
+        return _SEMANTIC_CACHE
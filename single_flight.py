@@ -0,0 +1,90 @@
+"""单飞（single-flight）调用合并模块
+
+同一个键的计算正在进行时，后到的调用方不再重复计算，而是等待并共享第一个调用方（领头者）的结果；
+领头者抛出的异常同样传递给所有等待者。计算结束后键立即释放，之后的调用重新计算（通常已命中结果缓存）。
+
+等待使用 concurrent.futures.Future，可跨线程、跨事件循环共享
+（Streamlit 的每个会话线程各自用 asyncio.run 运行协程）。
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._stats = {"leaders": 0, "coalesced": 0}
+
+    def begin(self, key: Hashable) -> Tuple[bool, Future]:
+        """
+        登记一次调用
+
+        Returns:
+            (是否为领头者, 共享的Future)；领头者必须在计算结束后调用 finish
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self._stats["coalesced"] += 1
+                return False, future
+            future = Future()
+            self._calls[key] = future
+            self._stats["leaders"] += 1
+            return True, future
+
+    def finish(self, key: Hashable, future: Future, value: Any = None, error: BaseException = None):
+        """领头者发布结果（或异常），唤醒全部等待者并释放键"""
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(value)
+
+    def do(self, key: Hashable, compute: Callable[[], Any], timeout: float = None) -> Tuple[Any, bool]:
+        """
+        执行或加入同一个键的计算
+
+        Args:
+            key: 调用键（与结果缓存的键相同）
+            compute: 计算函数
+            timeout: 等待其他调用方结果的最长秒数，超时抛出 TimeoutError（None 表示一直等待）
+
+        Returns:
+            (计算结果, 是否共享了其他调用方的结果)；结果对象在调用方之间共享，不应修改
+        """
+        leader, future = self.begin(key)
+        if not leader:
+            return future.result(timeout), True
+        try:
+            value = compute()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, value)
+        return value, False
+
+    async def ado(self, key: Hashable, acompute: Callable[[], Awaitable[Any]],
+                  timeout: float = None) -> Tuple[Any, bool]:
+        """do 的异步版本，acompute() 返回协程；等待其他调用方时不阻塞事件循环"""
+        leader, future = self.begin(key)
+        if not leader:
+            # shield：等待方被取消或超时时不能取消共享的 Future，领头者还要向它发布结果
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout), True
+        try:
+            value = await acompute()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, value)
+        return value, False
+
+    def stats(self) -> Dict[str, int]:
+        """返回领头调用次数、被合并的调用次数和正在进行的计算数"""
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._calls))
@@ -8,7 +8,14 @@ import json
 import io
 import sys
 from contextlib import redirect_stdout, redirect_stderr
-from deepseek_utils import ChatBot
+from chat_sessions import ChatSessionManager
+from config import LLM_CONFIG
+from deepseek_utils import ChatBot, ReasoningDelta, find_blocked_terms
+from llm_errors import LlmError
+from text_matcher import get_matcher
+
+# 判断AI生成的代码是否与绘图相关的关键词
+_PLOT_CODE_MATCHER = get_matcher(['plotly', 'px.', 'go.', 'fig.', 'plot', 'chart'], ignore_case=True)
 
 # 数据库初始化
 def init_database():
@@ -132,6 +139,8 @@ def reset_team_data(team_name):
     cursor.execute('DELETE FROM code_history WHERE team_name = ?', (team_name,))
     conn.commit()
     conn.close()
+    # 聊天记录已清空，丢弃内存中的对话会话
+    _TEAM_SESSIONS.discard(team_name)
 
 def execute_plotly_code(code):
     """执行Plotly代码并返回图表"""
@@ -161,11 +170,9 @@ def execute_plotly_code(code):
     except Exception as e:
         return None, "", str(e)
 
-def get_ai_response(user_message, team_name, current_code=""):
-    """使用DeepSeek API获取AI响应"""
-    
-    # 初始prompt，专门针对化妆品销售数据分析
-    initial_prompt = """
+# AI助手的system prompt，专门针对化妆品销售数据分析
+# 所有团队的会话使用完全相同的system prompt，便于服务端复用提示词前缀缓存
+STAGE4_SYSTEM_PROMPT = """
 你是一个专业的数据分析师和Python编程助手，专门帮助用户使用Plotly分析化妆品销售数据。
 
 **任务背景：**
@@ -196,26 +203,57 @@ def get_ai_response(user_message, team_name, current_code=""):
 
 请根据用户的问题，提供具体的Python代码建议和数据分析指导。
 """
+
+def _create_team_chatbot(team_name):
+    """创建团队的第四阶段AI助手ChatBot实例（按团队限流）"""
+    return ChatBot(
+        system_prompt=STAGE4_SYSTEM_PROMPT,
+        temperature=0.7,
+        max_tokens=2048,
+        use_cache=True,  # 各团队常提相同的入门问题
+        rate_limit_key=team_name
+    )
+
+def _load_team_messages(team_name):
+    """把团队的聊天记录转换为ChatBot消息列表"""
+    return [
+        {"role": "user" if message_type == 'user' else "assistant", "content": message}
+        for message_type, message, _ in get_chat_history(team_name)
+    ]
+
+# 各团队的对话会话：首次提问时从 chat_history 表重建一次，之后在内存中追加
+_TEAM_SESSIONS = ChatSessionManager(
+    _create_team_chatbot, _load_team_messages, LLM_CONFIG["sessions"]["max_live_sessions"]
+)
+
+def stream_ai_response(user_message, team_name, current_code=""):
+    """使用DeepSeek API流式获取AI响应，逐段返回回答正文（不含推理内容）
+
+    团队的对话历史保存在会话中，追问时模型能看到之前的问答。
+    调用方应在流结束后再把本轮问答写入 chat_history 表。
+    调用失败时抛出 LlmError（迭代时），没有得到回复的问题不会留在会话历史中。
+    """
+    # 构建完整的用户消息，包含当前代码上下文
+    full_message = user_message
+    if current_code.strip():
+        full_message += f"\n\n当前代码框中的内容：\n```python\n{current_code}\n```\n\n请基于当前代码进行修改或优化。"
     
-    try:
-        # 创建ChatBot实例
-        chatbot = ChatBot(
-            system_prompt=initial_prompt,
-            temperature=0.7,
-            max_tokens=2048
-        )
-        
-        # 构建完整的用户消息，包含当前代码上下文
-        full_message = user_message
-        if current_code.strip():
-            full_message += f"\n\n当前代码框中的内容：\n```python\n{current_code}\n```\n\n请基于当前代码进行修改或优化。"
-        
-        # 获取AI响应
-        response = chatbot.chat(full_message)
-        return response
-        
-    except Exception as e:
-        return f"AI响应出错：{str(e)}\n\n请检查API配置或网络连接。"
+    with _TEAM_SESSIONS.session(team_name) as chatbot:
+        try:
+            # 代码框内容相同时，措辞相近的问题复用语义缓存中的回答
+            for delta in chatbot.chat_stream(full_message, semantic_text=user_message,
+                                             semantic_context=current_code):
+                if not isinstance(delta, ReasoningDelta):
+                    yield delta
+        finally:
+            # 失败或中途停止时移除没有得到回复的问题
+            chatbot.drop_unanswered_message()
+        # 历史中只保留原始问题（与 chat_history 表一致），代码上下文只随当轮发送
+        chatbot.set_last_user_message(user_message)
+
+def get_ai_response(user_message, team_name, current_code=""):
+    """使用DeepSeek API获取AI响应，调用失败时抛出 LlmError"""
+    return "".join(stream_ai_response(user_message, team_name, current_code))
 
 def stage4_coding_game():
     """第四阶段：代码撰写小游戏"""
@@ -283,39 +321,54 @@ def stage4_coding_game():
     # 用户输入
     user_input = st.chat_input("向AI助手提问...")
     if user_input:
-        # 保存用户消息
-        save_chat_message(selected_team, 'user', user_input)
-        
         # 获取当前代码内容
         current_code = st.session_state.get('code_editor', '')
         
-        # 获取AI响应
-        ai_response = get_ai_response(user_input, selected_team, current_code)
-        save_chat_message(selected_team, 'ai', ai_response)
+        # 提问中的屏蔽词只提示和记录，不阻止提问
+        blocked_terms = find_blocked_terms(user_input)
+        if blocked_terms:
+            print(f"第四阶段团队 {selected_team} 的提问包含屏蔽词: {blocked_terms}")
         
-        # 自动提取AI响应中的Python代码
-        import re
+        # 流式显示AI响应
+        ai_response = None
+        with chat_container:
+            st.chat_message("user").write(user_input)
+            if blocked_terms:
+                st.warning(f"⚠️ 提问中包含屏蔽词：{'、'.join(blocked_terms)}（已记录）")
+            with st.chat_message("assistant"):
+                try:
+                    ai_response = st.write_stream(stream_ai_response(user_input, selected_team, current_code))
+                except LlmError as e:
+                    # 调用失败时不保存本轮问答，错误信息也不会写入聊天记录
+                    st.error(f"AI响应出错：{e}\n\n请检查API配置或网络连接后重试。")
+        if ai_response is not None:
+            # 流结束后再保存本轮问答（会话首次重建时读取的记录不包含本轮问题）
+            save_chat_message(selected_team, 'user', user_input)
+            save_chat_message(selected_team, 'ai', ai_response)
         
-        # 使用正则表达式提取代码块
-        code_pattern = r'```(?:python)?\s*\n([\s\S]*?)\n```'
-        code_matches = re.findall(code_pattern, ai_response, re.IGNORECASE)
+            # 自动提取AI响应中的Python代码
+            import re
         
-        if code_matches:
-            # 取最后一个代码块（通常是最完整的）
-            extracted_code = code_matches[-1].strip()
+            # 使用正则表达式提取代码块
+            code_pattern = r'```(?:python)?\s*\n([\s\S]*?)\n```'
+            code_matches = re.findall(code_pattern, ai_response, re.IGNORECASE)
+        
+            if code_matches:
+                # 取最后一个代码块（通常是最完整的）
+                extracted_code = code_matches[-1].strip()
             
-            # 过滤掉明显不是Plotly相关的代码
-            if any(keyword in extracted_code.lower() for keyword in ['plotly', 'px.', 'go.', 'fig.', 'plot', 'chart']):
-                # 保存提取的代码到数据库
-                code_description = f"AI自动生成 - {user_input[:50]}..."
-                save_code(selected_team, extracted_code, code_description)
+                # 过滤掉明显不是Plotly相关的代码
+                if _PLOT_CODE_MATCHER.contains_any(extracted_code):
+                    # 保存提取的代码到数据库
+                    code_description = f"AI自动生成 - {user_input[:50]}..."
+                    save_code(selected_team, extracted_code, code_description)
                 
-                # 更新代码编辑器的内容
-                st.session_state['code_editor'] = extracted_code
+                    # 更新代码编辑器的内容
+                    st.session_state['code_editor'] = extracted_code
                 
-                st.success("✅ 已自动提取并保存AI生成的代码")
+                    st.success("✅ 已自动提取并保存AI生成的代码")
         
-        st.rerun()
+            st.rerun()
     
     st.divider()
     
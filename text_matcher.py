@@ -0,0 +1,109 @@
+"""多模式匹配模块
+
+Aho-Corasick自动机：对一组关键词只构建一次，
+扫描一遍文本即可找出全部关键词的出现位置，耗时与关键词数量无关。
+用于查询路由、重排序质量检查、答案评分和敏感词过滤。
+"""
+
+from collections import deque
+from functools import lru_cache
+from typing import Iterator, List, Sequence, Set, Tuple
+
+
+class AhoCorasick:
+    def __init__(self, patterns: Sequence[str], ignore_case: bool = False):
+        """
+        构建自动机
+
+        Args:
+            patterns: 关键词列表（空字符串会被忽略，重复关键词只保留一个）
+            ignore_case: 是否忽略英文大小写
+        """
+        self.ignore_case = ignore_case
+        self.patterns: List[str] = list(dict.fromkeys(p for p in patterns if p))
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[Tuple[int, ...]] = [()]
+
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in self._fold(pattern):
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(())
+                state = next_state
+            self._output[state] += (index,)
+
+        # 按层次遍历计算失败指针，并把失败状态的输出合并进来
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(ch, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def _fold(self, text: str) -> str:
+        return text.lower() if self.ignore_case else text
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str]]:
+        """
+        逐个返回关键词在文本中的出现
+
+        Yields:
+            (起始下标, 关键词)，按结束位置先后排列
+        """
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for end, ch in enumerate(self._fold(text or "")):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for index in output[state]:
+                yield end - len(patterns[index]) + 1, patterns[index]
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """返回全部 (起始下标, 关键词) 出现"""
+        return list(self.finditer(text))
+
+    def matched(self, text: str) -> Set[str]:
+        """返回文本中出现过的关键词集合"""
+        return {pattern for _, pattern in self.finditer(text)}
+
+    def first_by_priority(self, text: str):
+        """返回出现过的关键词中在 patterns 里排在最前面的一个，没有匹配时返回None"""
+        found = self.matched(text)
+        for pattern in self.patterns:
+            if pattern in found:
+                return pattern
+        return None
+
+    def contains_any(self, text: str) -> bool:
+        """文本中是否出现任一关键词（找到第一个即停止）"""
+        return next(self.finditer(text), None) is not None
+
+
+@lru_cache(maxsize=128)
+def _build(patterns: Tuple[str, ...], ignore_case: bool) -> AhoCorasick:
+    return AhoCorasick(patterns, ignore_case)
+
+
+def get_matcher(patterns: Sequence[str], ignore_case: bool = False) -> AhoCorasick:
+    """
+    获取关键词集合对应的自动机，同一组关键词在进程内只构建一次
+
+    Args:
+        patterns: 关键词列表
+        ignore_case: 是否忽略英文大小写
+
+    Returns:
+        AhoCorasick实例（只读，可跨线程共享）
+    """
+    return _build(tuple(patterns), ignore_case)
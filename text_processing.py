@@ -0,0 +1,82 @@
+"""文本处理模块
+
+为检索索引提供统一的中文分词函数，BM25索引与查询使用同一套切分规则；
+并提供查询规范化（全角/半角、空白、繁简折叠），检索前和生成缓存键时使用。
+"""
+
+import logging
+import unicodedata
+from typing import List
+
+import jieba
+
+jieba.setLogLevel(logging.WARNING)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    中英文混合分词
+
+    使用jieba搜索引擎模式切分，英文统一转为小写，丢弃空白和纯标点词元。
+
+    Args:
+        text: 输入文本
+
+    Returns:
+        词元列表
+    """
+    tokens = []
+    for token in jieba.cut_for_search(text):
+        token = token.strip().lower()
+        if token and any(ch.isalnum() for ch in token):
+            tokens.append(token)
+    return tokens
+
+
+# 常用繁体字 -> 简体字（覆盖化妆品/护肤领域查询的常见字；安装了opencc时使用完整转换）
+_TRADITIONAL = (
+    "膚護質紅華婦產體劑鹽維層類驗據對於與這個們為會來時後還說種麼嗎裡應該現實問題過無長開關經學發變點當從動國歲傷線"
+    "濕潤澤彈皺紋淨潔滲細營養補價錢買賣廣優療醫藥險風銷額報場級較選擇適膠視黃銅鐵鋅鈣鉀鈉氫氣溫熱陽陰傳統計劃畫備條"
+    "許認識別確請謝讓給東車門見聽書寫讀話語電腦網絡頁圖檢測試證標準規範轉換單雙幾萬億號碼項總結論議屬敘術構圍隨獲組"
+    "織純濃緊鬆彎鮮麗艷顏膩澀癢瘡腫斂麥蘆薈葉檸樹膽鹼鏈絲髮歡樂愛親厲舊雜盡區處亂齊儘嚴辦習聲態勢歷滿藍綠顯顆縮臉乾"
+    "齡曬隱脣"
+)
+_SIMPLIFIED = (
+    "肤护质红华妇产体剂盐维层类验据对于与这个们为会来时后还说种么吗里应该现实问题过无长开关经学发变点当从动国岁伤线"
+    "湿润泽弹皱纹净洁渗细营养补价钱买卖广优疗医药险风销额报场级较选择适胶视黄铜铁锌钙钾钠氢气温热阳阴传统计划画备条"
+    "许认识别确请谢让给东车门见听书写读话语电脑网络页图检测试证标准规范转换单双几万亿号码项总结论议属叙术构围随获组"
+    "织纯浓紧松弯鲜丽艳颜腻涩痒疮肿敛麦芦荟叶柠树胆碱链丝发欢乐爱亲厉旧杂尽区处乱齐尽严办习声态势历满蓝绿显颗缩脸干"
+    "龄晒隐唇"
+)
+_T2S_TABLE = str.maketrans(_TRADITIONAL, _SIMPLIFIED)
+
+try:
+    from opencc import OpenCC
+    _OPENCC = OpenCC('t2s')
+except Exception:
+    _OPENCC = None
+
+
+def to_simplified(text: str) -> str:
+    """繁体转简体（优先使用opencc，未安装时使用内置常用字表）"""
+    if _OPENCC is not None:
+        return _OPENCC.convert(text)
+    return text.translate(_T2S_TABLE)
+
+
+def normalize_query(text: str) -> str:
+    """
+    把查询规范化（检索和缓存键使用同一个规范化结果）
+
+    NFKC折叠全角字符（全角字母、数字、标点和空格转为半角），去掉首尾空白、
+    连续空白合并为一个空格，英文转小写，繁体转简体。
+
+    Args:
+        text: 原始查询
+
+    Returns:
+        规范化后的查询
+    """
+    text = unicodedata.normalize('NFKC', text or "")
+    text = " ".join(text.split()).lower()
+    return to_simplified(text)